@@ -0,0 +1,168 @@
+"""
+heartbeat_crud.get_server_stats 벤치마크
+
+7일치 SystemInfo 합성 데이터(5초 주기)를 벤치마크용 서버에 저장한 뒤
+기존 방식(24시간치 행을 모두 가져와 Python 에서 집계)과 SQL 집계 방식의 소요 시간을 비교합니다.
+POSTGRESQL_* 환경 변수로 지정된 DB 를 사용하며, 생성한 데이터는 종료 시 삭제합니다.
+
+usage:
+    python -m benchmarks.bench_server_stats [--days 7] [--interval 5] [--cores 8] [--repeat 5]
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from statistics import mean, median
+
+import numpy as np
+from sqlalchemy import func, insert
+
+from database import models
+from database.database import SessionLocal
+from crud import heartbeat_crud
+from schema.heartbeat_schema import TimeUnit, funcList
+
+PY_FUNCTIONS = {
+    funcList.MEAN: mean,
+    funcList.MEDIAN: median,
+    funcList.MAX: max,
+    funcList.P95: lambda values: float(np.percentile(values, 95))
+}
+
+
+def legacy_server_stats(db, server_id: int, time_unit: str, call_back):
+    """SQL 집계 도입 이전의 get_server_stats 구현 (비교용)"""
+    one_day_ago = datetime.now() - timedelta(days=1)
+
+    query = db.query(
+        func.date_trunc(time_unit, models.SystemInfo.timestamp).label('unit'),
+        models.SystemInfo.cpu_core_usage
+    ).filter(
+        models.SystemInfo.server_id == server_id,
+        models.SystemInfo.timestamp >= one_day_ago
+    ).order_by('unit').all()
+
+    result = {}
+    for record in query:
+        if record.unit not in result:
+            result[record.unit] = {f"cpu{i+1}": [] for i in range(len(record.cpu_core_usage))}
+        for i, usage in enumerate(record.cpu_core_usage):
+            result[record.unit][f"cpu{i+1}"].append(float(usage))
+
+    cpu_result = []
+    for unit, cpu_data in result.items():
+        unit_result = {"time": unit.isoformat()}
+        for cpu, values in cpu_data.items():
+            unit_result[cpu] = call_back(values)
+        cpu_result.append(unit_result)
+    cpu_result.sort(key=lambda x: x['time'])
+
+    query = db.query(
+        func.date_trunc(time_unit, models.SystemInfo.timestamp).label('unit'),
+        models.SystemInfo.net_recv_data_mb,
+        models.SystemInfo.net_send_data_mb
+    ).filter(
+        models.SystemInfo.server_id == server_id,
+        models.SystemInfo.timestamp >= one_day_ago
+    ).order_by('unit').all()
+
+    temp = {}
+    network_result = []
+    for record in query:
+        temp[record.unit] = temp.get(record.unit, {"recv_data_mb": [], "sent_data_mb": []})
+        temp[record.unit]["recv_data_mb"].append(record.net_recv_data_mb)
+        temp[record.unit]["sent_data_mb"].append(record.net_send_data_mb)
+    for unit, data in temp.items():
+        network_result.append({
+            "time": unit.isoformat(),
+            "recv_data_mb": call_back(data["recv_data_mb"]),
+            "sent_data_mb": call_back(data["sent_data_mb"])
+        })
+    network_result.sort(key=lambda x: x['time'])
+
+    return {"cpu": cpu_result, "network": network_result, "memory": [], "disk": []}
+
+
+def populate(db, server_id: int, days: int, interval: int, cores: int, batch_size: int = 5000):
+    end = datetime.now().astimezone()
+    timestamp = end - timedelta(days=days)
+    rows = []
+    total = 0
+    while timestamp < end:
+        rows.append({
+            "server_id": server_id,
+            "cpu_logic_core": cores,
+            "cpu_physic_core": cores,
+            "cpu_percent": random.uniform(0, 100),
+            "cpu_core_usage": [round(random.uniform(0, 100), 1) for _ in range(cores)],
+            "mem_total": 64.0,
+            "mem_used": random.uniform(8, 60),
+            "mem_percent": random.uniform(10, 95),
+            "disk_read_mb": random.uniform(0, 500),
+            "disk_write_mb": random.uniform(0, 500),
+            "disk_total": 1024.0,
+            "disk_used": random.uniform(100, 900),
+            "disk_percent": random.uniform(10, 90),
+            "net_recv_data_mb": random.uniform(0, 1000),
+            "net_send_data_mb": random.uniform(0, 1000),
+            "net_recv_packets": random.randint(0, 10 ** 6),
+            "net_send_packets": random.randint(0, 10 ** 6),
+            "net_recv_err": 0,
+            "net_send_err": 0,
+            "timestamp": timestamp
+        })
+        timestamp += timedelta(seconds=interval)
+        if len(rows) >= batch_size:
+            db.execute(insert(models.SystemInfo), rows)
+            total += len(rows)
+            rows = []
+    if rows:
+        db.execute(insert(models.SystemInfo), rows)
+        total += len(rows)
+    db.commit()
+    return total
+
+
+def measure(fn, repeat: int) -> float:
+    elapsed = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed.append((time.perf_counter() - started) * 1000)
+    return median(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--interval", type=int, default=5, help="heartbeat 주기 (초)")
+    parser.add_argument("--cores", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    server = models.Server(uuid=f"bench-{uuid.uuid4()}", name="bench-server-stats")
+    db.add(server)
+    db.commit()
+
+    try:
+        total = populate(db, server.id, args.days, args.interval, args.cores)
+        print(f"{total} SystemInfo rows ({args.days} days, {args.interval}s interval, {args.cores} cores)")
+        print(f"{'unit':<8}{'function':<10}{'legacy (ms)':>14}{'sql (ms)':>12}{'speedup':>10}")
+
+        for unit in (TimeUnit.MINUTE, TimeUnit.HOUR, TimeUnit.DAY):
+            for function in funcList:
+                legacy = measure(lambda: legacy_server_stats(db, server.id, unit.value, PY_FUNCTIONS[function]), args.repeat)
+                sql = measure(lambda: heartbeat_crud.get_server_stats(db, server.id, unit.value, function), args.repeat)
+                print(f"{unit.value:<8}{function.value:<10}{legacy:>14.1f}{sql:>12.1f}{legacy / sql:>9.1f}x")
+    finally:
+        db.rollback()
+        db.query(models.SystemInfo).filter(models.SystemInfo.server_id == server.id).delete()
+        db.query(models.Server).filter(models.Server.id == server.id).delete()
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
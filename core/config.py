@@ -0,0 +1,83 @@
+import os
+
+# ==================== Heartbeat ====================
+
+# heartbeat 저장 방식 - "sync": 요청마다 바로 저장, "buffered": 버퍼에 모아 일괄 저장
+HEARTBEAT_INGEST_MODE = os.getenv("HEARTBEAT_INGEST_MODE", "sync")
+# buffered 모드에서 버퍼에 보관할 수 있는 최대 heartbeat 수 (초과 시 503)
+HEARTBEAT_BUFFER_SIZE = int(os.getenv("HEARTBEAT_BUFFER_SIZE", "10000"))
+# buffered 모드에서 버퍼를 비우는 주기 (ms)
+HEARTBEAT_FLUSH_INTERVAL_MS = int(os.getenv("HEARTBEAT_FLUSH_INTERVAL_MS", "500"))
+# buffered 모드에서 한 번에 저장할 최대 heartbeat 수
+HEARTBEAT_FLUSH_BATCH_SIZE = int(os.getenv("HEARTBEAT_FLUSH_BATCH_SIZE", "500"))
+# buffered 모드에서 저장에 실패한 batch 를 다시 저장하는 최대 횟수 (모두 실패하면 저장할 수 없는 heartbeat 만 버림)
+HEARTBEAT_FLUSH_MAX_RETRIES = int(os.getenv("HEARTBEAT_FLUSH_MAX_RETRIES", "5"))
+
+# /heartbeat/stream 구독자별 이벤트 큐 크기 (가득 차면 가장 오래된 이벤트를 버림)
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+# /heartbeat/stream 에서 이벤트가 없을 때 keepalive 를 보내는 주기 (초)
+STREAM_KEEPALIVE_S = float(os.getenv("STREAM_KEEPALIVE_S", "15"))
+# SSE 클라이언트의 재연결 대기 시간 (ms)
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "3000"))
+# 재연결한 클라이언트에게 Last-Event-ID 이후의 이벤트를 다시 보내기 위해 보관하는 최근 이벤트 수
+STREAM_HISTORY_SIZE = int(os.getenv("STREAM_HISTORY_SIZE", "1000"))
+# 스트림 이벤트 전달 방식 - "local": 프로세스 안에서만 전달, "postgres": LISTEN/NOTIFY 로 모든 워커에 전달
+STREAM_FANOUT = os.getenv("STREAM_FANOUT", "local")
+# postgres 모드에서 사용할 NOTIFY 채널
+STREAM_NOTIFY_CHANNEL = os.getenv("STREAM_NOTIFY_CHANNEL", "heartbeat_stream")
+# NOTIFY 로 직접 보낼 수 있는 최대 메시지 크기 (byte). 더 크면 StreamEvent 테이블에 저장하고 id 만 전송 (postgres 제한 8000)
+STREAM_NOTIFY_MAX_BYTES = int(os.getenv("STREAM_NOTIFY_MAX_BYTES", "7900"))
+# StreamEvent 테이블에 저장된 이벤트의 보관 기간 (초)
+STREAM_EVENT_RETENTION_S = int(os.getenv("STREAM_EVENT_RETENTION_S", "300"))
+# postgres 모드에서 NOTIFY 를 기다리는 이벤트의 최대 수 (가득 차면 새 이벤트를 버림)
+STREAM_PUBLISH_QUEUE_SIZE = int(os.getenv("STREAM_PUBLISH_QUEUE_SIZE", "10000"))
+# postgres 모드에서 한 트랜잭션으로 NOTIFY 할 최대 이벤트 수
+STREAM_PUBLISH_BATCH_SIZE = int(os.getenv("STREAM_PUBLISH_BATCH_SIZE", "500"))
+
+# rollup 테이블(SystemInfoRollup, ContainerSysInfoRollup) 사용 여부
+ROLLUP_ENABLED = os.getenv("ROLLUP_ENABLED", "false").lower() == "true"
+# rollup compaction 실행 주기 (초)
+ROLLUP_COMPACT_INTERVAL_S = int(os.getenv("ROLLUP_COMPACT_INTERVAL_S", "60"))
+# 늦게 저장되는 heartbeat 를 기다리는 시간 (초). 이 시간이 지난 분 버킷만 rollup
+ROLLUP_LAG_S = int(os.getenv("ROLLUP_LAG_S", "60"))
+# rollup 을 처음 시작할 때 집계할 과거 데이터 기간 (일)
+ROLLUP_BACKFILL_DAYS = int(os.getenv("ROLLUP_BACKFILL_DAYS", "7"))
+# compaction 한 번에 처리할 원본 데이터의 최대 기간 (시간)
+ROLLUP_MAX_RANGE_HOURS = int(os.getenv("ROLLUP_MAX_RANGE_HOURS", "6"))
+# compaction 에서 원본/rollup 행을 DB 에서 한 번에 가져오는 행 수 (server-side cursor)
+ROLLUP_FETCH_SIZE = int(os.getenv("ROLLUP_FETCH_SIZE", "5000"))
+
+# ==================== Cache ====================
+
+# uuid/컨테이너 이름 -> id 캐시의 최대 항목 수 (캐시별)
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "100000"))
+# uuid/컨테이너 이름 -> id 캐시 항목의 최대 보관 시간 (초). 다른 워커에서 삭제/변경된 식별자는 이 시간 안에 반영됨
+IDENTITY_CACHE_TTL_S = float(os.getenv("IDENTITY_CACHE_TTL_S", "300"))
+# 서버/컨테이너별로 컴파일된 정책을 보관하는 캐시의 최대 항목 수
+POLICY_CACHE_SIZE = int(os.getenv("POLICY_CACHE_SIZE", "10000"))
+# 컴파일된 정책의 최대 보관 시간 (초). 다른 워커에서 변경된 정책은 이 시간 안에 반영됨
+POLICY_CACHE_TTL_S = float(os.getenv("POLICY_CACHE_TTL_S", "30"))
+# 태그 역색인을 DB 에서 다시 만드는 주기 (초). 다른 워커의 태그 변경과 새 컨테이너는 이 시간 안에 반영됨
+TAG_INDEX_REFRESH_S = float(os.getenv("TAG_INDEX_REFRESH_S", "60"))
+
+# ==================== Policy Apply ====================
+
+# 에이전트에 정책을 전달할 때 동시에 요청할 최대 서버 수
+POLICY_APPLY_CONCURRENCY = int(os.getenv("POLICY_APPLY_CONCURRENCY", "16"))
+# 에이전트 연결 timeout (초)
+AGENT_CONNECT_TIMEOUT_S = float(os.getenv("AGENT_CONNECT_TIMEOUT_S", "3"))
+# 에이전트 응답 timeout (초)
+AGENT_READ_TIMEOUT_S = float(os.getenv("AGENT_READ_TIMEOUT_S", "10"))
+# 연결 실패, timeout, 5xx 응답 시 재시도 횟수
+AGENT_MAX_RETRIES = int(os.getenv("AGENT_MAX_RETRIES", "2"))
+# 재시도 대기 시간의 기준값 (초). 재시도마다 두 배로 증가
+AGENT_RETRY_BACKOFF_S = float(os.getenv("AGENT_RETRY_BACKOFF_S", "0.5"))
+# 정책 전달 작업을 동시에 준비하는 작업 스레드 수
+POLICY_APPLY_JOB_WORKERS = int(os.getenv("POLICY_APPLY_JOB_WORKERS", "4"))
+# 상태 조회를 위해 보관하는 최근 정책 전달 작업 수
+POLICY_APPLY_JOB_HISTORY = int(os.getenv("POLICY_APPLY_JOB_HISTORY", "1000"))
+
+# ==================== Policy Upload ====================
+
+# 스트리밍 업로드에서 한 번에 검사하고 저장하는 컨테이너 정책 수
+POLICY_UPLOAD_BATCH_SIZE = int(os.getenv("POLICY_UPLOAD_BATCH_SIZE", "200"))
@@ -1,37 +1,101 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import ARRAY, BigInteger, String, cast, delete, exists, func, inspect, select, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array, array_agg
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from fastapi import HTTPException
 from starlette import status
 
 from schema import container_schema, server_schema
 from crud import server_crud
 from database import models
+from utils import identity_cache
 
-def get_tag_id_set(db: Session, tag_list: list[str]) -> set:
-    tag_id_set = set()
+# 여러 워커가 동시에 Tag.name 고유 인덱스를 만들지 않도록 사용하는 advisory lock id
+TAG_INDEX_LOCK_ID = 0x54414753  # "TAGS"
+
+def get_tag_id_set(db: Session, tag_list: list[str]) -> set[int]:
+    """
+    태그 이름의 id 집합을 반환합니다. 없는 태그는 추가합니다. commit 은 호출한 쪽에서 합니다.
+    동시에 같은 태그를 추가해도 Tag.name 고유 인덱스로 하나만 추가되며, 추가한 뒤 다시 조회하여 다른 트랜잭션이 추가한 태그의 id 도 반환합니다.
+    """
+    names = list(dict.fromkeys(tag_list))
+    if not names:
+        return set()
     
-    # get tag id list from data
-    for tag in tag_list:
-        tag_id = db.query(models.Tag).filter(models.Tag.name == tag).first()
+    db.execute(
+        pg_insert(models.Tag)
+        .values([{"name": name} for name in sorted(names)])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    return set(db.execute(select(models.Tag.id).where(models.Tag.name.in_(names))).scalars().all())
+
+def ensure_tag_name_index(db: Session):
+    """
+    Tag.name 고유 인덱스가 없는 기존 DB 에 인덱스를 만듭니다.
+    이름이 같은 태그가 이미 있으면 id 가 가장 작은 태그로 컨테이너 태그를 옮기고 나머지 태그는 삭제합니다.
+    """
+    index = next(index for index in models.Tag.__table__.indexes if index.name == "tag_name")
+    try:
+        db.execute(select(func.pg_advisory_xact_lock(TAG_INDEX_LOCK_ID)))
+        if any(existing["name"] == index.name for existing in inspect(db.connection()).get_indexes(models.Tag.__tablename__)):
+            db.rollback()
+            return
         
-        if tag_id is None:
-            db.add(models.Tag(name=tag))
-            db.commit()
-            
-        db.query(models.Tag).filter(models.Tag.name == tag).first() 
-            
-        tag_id_set.add(tag_id.id)
-                
-    return tag_id_set
+        keep = select(models.Tag.name, func.min(models.Tag.id).label("id"))\
+            .group_by(models.Tag.name)\
+            .having(func.count() > 1)\
+            .cte("keep")
+        duplicate = select(models.Tag.id, keep.c.id.label("keep_id"))\
+            .join(keep, keep.c.name == models.Tag.name)\
+            .where(models.Tag.id != keep.c.id)\
+            .cte("duplicate")
+        
+        db.execute(
+            pg_insert(models.ContainerTag).from_select(
+                ["container_id", "tag_id"],
+                select(models.ContainerTag.container_id, duplicate.c.keep_id)
+                .join(duplicate, duplicate.c.id == models.ContainerTag.tag_id)
+            ).on_conflict_do_nothing(index_elements=["container_id", "tag_id"])
+        )
+        db.execute(delete(models.ContainerTag).where(models.ContainerTag.tag_id.in_(select(duplicate.c.id))))
+        db.execute(delete(models.Tag).where(models.Tag.id.in_(select(duplicate.c.id))))
+        index.create(db.connection())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def _check_containers_exist(db: Session, container_ids: list[int]):
+    found = set(db.execute(
+        select(models.Container.id).where(models.Container.id.in_(set(container_ids)))
+    ).scalars().all())
+    
+    missing = set(container_ids) - found
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Containers not found: {missing}")
+
+def _insert_container_tags(db: Session, container_ids: list[int], tag_ids: set[int]):
+    """컨테이너 x 태그 쌍을 하나의 INSERT 로 추가합니다. 이미 있는 쌍은 건너뜁니다."""
+    if not container_ids or not tag_ids:
+        return
+    
+    containers = func.unnest(cast(array(sorted(set(container_ids))), ARRAY(BigInteger)))\
+        .table_valued("container_id").render_derived()
+    tags = func.unnest(cast(array(sorted(tag_ids)), ARRAY(BigInteger)))\
+        .table_valued("tag_id").render_derived()
     
+    db.execute(
+        pg_insert(models.ContainerTag).from_select(
+            ["container_id", "tag_id"],
+            select(containers.c.container_id, tags.c.tag_id).select_from(containers.join(tags, true()))
+        ).on_conflict_do_nothing(index_elements=["container_id", "tag_id"])
+    )
 
 def add_container(db:Session, container: container_schema.ContainerAddReq) -> models.Container:
-    host_server = db.query(models.Server).filter(models.Server.uuid == container.host_server).first()
+    host_server = server_crud.get_server_id_from_uuid(db, container.host_server)
     
     if host_server is None:
-        host_server = server_crud.create_server(db, server_schema.Server(uuid=container.host_server, name=container.host_server))
-    
-    host_server = host_server.id
+        host_server = server_crud.create_server(db, server_schema.Server(uuid=container.host_server, name=container.host_server)).id
     
     db.add(models.Container(
         host_server=host_server,
@@ -45,7 +109,16 @@ def add_container(db:Session, container: container_schema.ContainerAddReq) -> mo
         db.rollback()
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Container add failed")
     
-    return db.query(models.Container).filter(models.Container.name == container.name).first()
+    container_info = db.query(models.Container).filter(
+        models.Container.host_server == host_server,
+        models.Container.name == container.name
+    ).first()
+    identity_cache.put_container(container_info.host_server, container_info.name, container_info.id)
+    
+    return container_info
+
+def get_container(db: Session, container_id: int) -> models.Container | None:
+    return db.query(models.Container).filter(models.Container.id == container_id).first()
 
 def get_container_by_name(db: Session, container_name: str) -> bool:
     container = db.query(models.Container).filter(models.Container.name == container_name).first()
@@ -54,97 +127,129 @@ def get_container_by_name(db: Session, container_name: str) -> bool:
         return None
     return container
 
-def get_server_container_info(db: Session, server_id: int) -> container_schema.ServerContainerInfoRes:
-    server_check = db.query(models.Server).filter(models.Server.id == server_id).first()
+def get_container_keys_by_tags(db: Session, tag_list: list[str]) -> set[tuple[str, str]]:
+    """태그가 하나라도 붙은 컨테이너의 (서버 uuid, 컨테이너 이름) 집합을 반환합니다."""
+    rows = db.query(models.Server.uuid, models.Container.name)\
+        .join(models.Container, models.Container.host_server == models.Server.id)\
+        .join(models.ContainerTag, models.ContainerTag.container_id == models.Container.id)\
+        .join(models.Tag, models.Tag.id == models.ContainerTag.tag_id)\
+        .filter(models.Tag.name.in_(tag_list))\
+        .distinct()\
+        .all()
     
-    if not server_check:
-        raise HTTPException(status_code=404, detail="Server not found")
-    
-    LatestInternalId = db.query(
-        models.InternalContainerId.container_id,
-        func.max(models.InternalContainerId.reg_time).label("max_reg_time")
-    ).group_by(models.InternalContainerId.container_id).subquery()
+    return {(row.uuid, row.name) for row in rows}
 
-    container_list = db.query(
+def get_server_container_info(db: Session, server_id: int, limit: int, offset: int = 0,
+                              active: bool = False, runtime: str | None = None,
+                              tag: str | None = None) -> container_schema.ServerContainerInfoRes:
+    """
+    서버의 컨테이너 목록을 마지막 내부 id, 태그와 함께 하나의 쿼리로 조회합니다.
+    cnt 는 페이지와 관계없이 조건에 맞는 전체 컨테이너 수입니다.
+    """
+    # 컨테이너별 마지막 내부 id (서버의 컨테이너에 대해서만 조회)
+    latest_internal_id = select(
+        models.InternalContainerId.pid_id,
+        models.InternalContainerId.mnt_id,
+        models.InternalContainerId.cgroup_id,
+        models.InternalContainerId.reg_time
+    ).where(
+        models.InternalContainerId.container_id == models.Container.id
+    ).order_by(
+        models.InternalContainerId.reg_time.desc()
+    ).limit(1).lateral("latest_internal_id")
+    
+    tags = select(
+        func.coalesce(array_agg(aggregate_order_by(models.Tag.name, models.Tag.name)), cast(array([]), ARRAY(String)))
+    ).join(
+        models.ContainerTag, models.ContainerTag.tag_id == models.Tag.id
+    ).where(
+        models.ContainerTag.container_id == models.Container.id
+    ).scalar_subquery()
+    
+    conditions = [models.Container.host_server == server_id]
+    if active:
+        conditions.append(models.Container.removed_at.is_(None))
+    if runtime is not None:
+        conditions.append(models.Container.runtime == runtime)
+    if tag is not None:
+        conditions.append(
+            exists().where(
+                models.ContainerTag.container_id == models.Container.id,
+                models.ContainerTag.tag_id == models.Tag.id,
+                models.Tag.name == tag
+            )
+        )
+    
+    query = select(
         models.Container,
-        models.InternalContainerId
-    ).outerjoin(
-        LatestInternalId,
-        models.Container.id == LatestInternalId.c.container_id
+        latest_internal_id.c.pid_id,
+        latest_internal_id.c.mnt_id,
+        latest_internal_id.c.cgroup_id,
+        latest_internal_id.c.reg_time,
+        tags.label("tags"),
+        func.count().over().label("total")
     ).outerjoin(
-        models.InternalContainerId,
-        (models.Container.id == models.InternalContainerId.container_id) &
-        (models.InternalContainerId.reg_time == LatestInternalId.c.max_reg_time)
-    ).filter(
-        models.Container.host_server == server_id
-    ).all()
+        latest_internal_id, true()
+    ).where(*conditions)
     
-    if not container_list:
-        return container_schema.ServerContainerInfoRes(cnt=0, containers=[])
+    rows = db.execute(query.order_by(models.Container.id).limit(limit).offset(offset)).all()
     
-    res = container_schema.ServerContainerInfoRes(cnt=len(container_list), containers=[])
+    if not rows:
+        # 결과가 없을 때만 서버 존재 여부와 전체 수를 따로 확인
+        if not db.query(exists().where(models.Server.id == server_id)).scalar():
+            raise HTTPException(status_code=404, detail="Server not found")
+        total = db.execute(select(func.count()).select_from(models.Container).where(*conditions)).scalar() if offset else 0
+        return container_schema.ServerContainerInfoRes(cnt=total, containers=[])
     
-    for container in container_list:
-        container_tag_list = db.query(models.Tag).join(models.ContainerTag).filter(models.ContainerTag.container_id == container.Container.id).all()
-        
-        tag_list = [tag.name for tag in container_tag_list]
-        
-        container_info = container_schema.ContainerInfo(
-            id = container.Container.id,
-            host_server = container.Container.host_server,
-            runtime = container.Container.runtime,
-            name = container.Container.name,
-            pid_id = container.InternalContainerId.pid_id if container.InternalContainerId else None,
-            mnt_id = container.InternalContainerId.mnt_id if container.InternalContainerId else None,
-            cgroup_id = container.InternalContainerId.cgroup_id if container.InternalContainerId else None,
-            tag = tag_list,
-            created_at = container.Container.created_at,
-            removed_at = container.Container.removed_at,
-            req_time = container.InternalContainerId.reg_time if container.InternalContainerId else None
-        )
-        
-        res.containers.append(container_info)
-    
-    return res
+    return container_schema.ServerContainerInfoRes(
+        cnt=rows[0].total,
+        containers=[
+            container_schema.ContainerInfo(
+                id=row.Container.id,
+                host_server=row.Container.host_server,
+                runtime=row.Container.runtime,
+                name=row.Container.name,
+                pid_id=row.pid_id,
+                mnt_id=row.mnt_id,
+                cgroup_id=row.cgroup_id,
+                tag=row.tags,
+                created_at=row.Container.created_at,
+                removed_at=row.Container.removed_at,
+                req_time=row.reg_time
+            )
+            for row in rows
+        ]
+    )
 
 # ===================== Tag =====================
+
+def get_tag_index_rows(db: Session) -> tuple[list[int], list[tuple[str, int]]]:
+    """태그 역색인을 만들기 위한 전체 컨테이너 id 와 (태그 이름, 컨테이너 id) 쌍을 반환합니다."""
+    container_ids = db.execute(select(models.Container.id)).scalars().all()
+    pairs = db.execute(
+        select(models.Tag.name, models.ContainerTag.container_id)
+        .join(models.ContainerTag, models.ContainerTag.tag_id == models.Tag.id)
+    ).tuples().all()
+    return container_ids, pairs
     
 def update_container_tag(db: Session, data: container_schema.ContainerTagUpdate):
     try:
         # 모든 작업을 하나의 트랜잭션으로 처리
+        _check_containers_exist(db, data.containers)
         tag_id_set = get_tag_id_set(db, data.tags)
         
-        # 컨테이너 ID들을 한 번에 조회
-        container_query = db.query(models.Container).filter(
-            models.Container.id.in_(data.containers)
-        ).all()
-        
-        # 실제 존재하는 컨테이너 ID 집합
-        found_container_ids = {container.id for container in container_query}
-        
-        # 요청된 컨테이너 중 존재하지 않는 것이 있는지 확인
-        missing_containers = set(data.containers) - found_container_ids
-        if missing_containers:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Containers not found: {missing_containers}"
-            )
-        
         # 기존 태그 관계를 한 번에 삭제
         db.query(models.ContainerTag).filter(
-            models.ContainerTag.container_id.in_(data.containers)
+            models.ContainerTag.container_id.in_(set(data.containers))
         ).delete(synchronize_session=False)
         
         # 새로운 태그 관계를 한 번에 추가
-        new_container_tags = [
-            models.ContainerTag(container_id=container_id, tag_id=tag_id)
-            for container_id in data.containers
-            for tag_id in tag_id_set
-        ]
-        
-        db.bulk_save_objects(new_container_tags)
+        _insert_container_tags(db, data.containers, tag_id_set)
         db.commit()
         
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -155,20 +260,12 @@ def update_container_tag(db: Session, data: container_schema.ContainerTagUpdate)
     return None
 
 def add_container_tag(db: Session, data: container_schema.ContainerTagUpdate):
-    tag_id_set = get_tag_id_set(db, data.tags)
-        
-    # get container id list from data
-    for container in data.containers:
-        container_id = db.query(models.Container).filter(models.Container.id == container).first().id
-        
-        if container_id is None:
-            raise HTTPException(status_code=404, detail="Container not found")
-
-        for tag_id in tag_id_set:
-            db.add(models.ContainerTag(
-                container_id=container_id,
-                tag_id=tag_id
-            ))
-        
+    """컨테이너들에 태그를 추가합니다. 이미 붙어 있는 태그는 건너뜁니다."""
+    try:
+        _check_containers_exist(db, data.containers)
+        _insert_container_tags(db, data.containers, get_tag_id_set(db, data.tags))
         db.commit()
-    return
\ No newline at end of file
+    except Exception:
+        db.rollback()
+        raise
+    return
@@ -1,216 +1,534 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import Float, func
+from sqlalchemy import Float, cast, distinct, func, insert, select, true, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from fastapi import Request
-from statistics import mean
 from datetime import datetime, timedelta
+import numpy as np
 
-from schema import server_schema
+from core import config
 from schema import heartbeat_schema
 from database import models
-from crud.server_crud import get_server_info_from_uuid, create_server
+from crud import rollup_crud
+from utils import bucket_stats, identity_cache
+from utils.sketch import MetricAggregate
+
+def _system_info_row(server_id: int, heartbeat: heartbeat_schema.InfoReq) -> dict:
+    return {
+        "server_id": server_id,
+        "cpu_logic_core": heartbeat.host.cpu.CPU_logical_core,
+        "cpu_physic_core": heartbeat.host.cpu.CPU_physical_core,
+        "cpu_percent": heartbeat.host.cpu.CPU_percent,
+        "cpu_core_usage": heartbeat.host.cpu.core_usage,
+        "mem_total": heartbeat.host.memory.total_mem_GB,
+        "mem_used": heartbeat.host.memory.used_mem_GB,
+        "mem_percent": heartbeat.host.memory.mem_percent,
+        "disk_read_mb": heartbeat.host.disk.read_MB,
+        "disk_write_mb": heartbeat.host.disk.write_MB,
+        "disk_total": heartbeat.host.disk.usage.total_GB,
+        "disk_used": heartbeat.host.disk.usage.used_GB,
+        "disk_percent": heartbeat.host.disk.usage.percent,
+        "net_recv_data_mb": heartbeat.host.network.recv_data_MB,
+        "net_send_data_mb": heartbeat.host.network.sent_data_MB,
+        "net_recv_packets": heartbeat.host.network.recv_packets,
+        "net_send_packets": heartbeat.host.network.sent_packets,
+        "net_recv_err": heartbeat.host.network.recv_err,
+        "net_send_err": heartbeat.host.network.sent_err
+    }
+
+def _container_sys_info_row(container_id: int, container: heartbeat_schema.ContainerInfo) -> dict:
+    return {
+        "container_id": container_id,
+        "cpu_kernel": container.stats.cpu.kernel_usage,
+        "cpu_user": container.stats.cpu.user_usage,
+        "cpu_percent": container.stats.cpu.usage_percent,
+        "cpu_online": container.stats.cpu.online_cpus,
+        "disk_read_mb": container.stats.io.read_mb,
+        "disk_write_mb": container.stats.io.write_mb,
+        "mem_limit": container.stats.memory.limit_mb,
+        "mem_usage": container.stats.memory.usage_mb,
+        "mem_percent": container.stats.memory.usage_percent,
+        "net_recv_mb": container.stats.network.rx_mb,
+        "net_send_mb": container.stats.network.tx_mb,
+        "net_recv_packets": container.stats.network.rx_packets,
+        "net_send_packets": container.stats.network.tx_packets,
+        "proc_cnt": container.stats.proc_cnt
+    }
 
 def add_heartbeat(db: Session, req: Request, heartbeat: heartbeat_schema.InfoReq):
-    server = get_server_info_from_uuid(db, heartbeat.host_uuid) 
-    if not server:
-       server = create_server(db, server_schema.Server(
-           uuid = heartbeat.host_uuid,
-           name = str(heartbeat.host_uuid)
-       ))
-       
-    db.add(models.SystemInfo(
-        server_id = server.id,
-        cpu_logic_core = heartbeat.host.cpu.CPU_logical_core,
-        cpu_physic_core = heartbeat.host.cpu.CPU_physical_core,
-        cpu_percent = heartbeat.host.cpu.CPU_percent,
-        cpu_core_usage = heartbeat.host.cpu.core_usage,
-        mem_total = heartbeat.host.memory.total_mem_GB,
-        mem_used = heartbeat.host.memory.used_mem_GB,
-        mem_percent = heartbeat.host.memory.mem_percent,
-        disk_read_mb = heartbeat.host.disk.read_MB,
-        disk_write_mb = heartbeat.host.disk.write_MB,
-        disk_total = heartbeat.host.disk.usage.total_GB,
-        disk_used = heartbeat.host.disk.usage.used_GB,
-        disk_percent = heartbeat.host.disk.usage.percent,
-        net_recv_data_mb = heartbeat.host.network.recv_data_MB,
-        net_send_data_mb = heartbeat.host.network.sent_data_MB,
-        net_recv_packets = heartbeat.host.network.recv_packets,
-        net_send_packets = heartbeat.host.network.sent_packets,
-        net_recv_err = heartbeat.host.network.recv_err,
-        net_send_err = heartbeat.host.network.sent_err
-    ))
-    db.commit()
-    
-    # 기존 컨테이너 목록 조회
-    removed_container_ids = db.query(models.Container).filter(models.Container.host_server == server.id).all()
-    
-    removed_container_ids = [container.id for container in removed_container_ids]
-    
-    for container in heartbeat.containers:
-        container_info = db.query(models.Container).filter(models.Container.name == container.container_name).first()
+    add_heartbeats(db, [heartbeat_schema.HeartbeatEntry(
+        req_ip = req.client.host,
+        received_at = datetime.now().astimezone(),
+        heartbeat = heartbeat
+    )])
+    
+    return
+
+def add_heartbeats(db: Session, entries: list[heartbeat_schema.HeartbeatEntry]):
+    """여러 호스트의 heartbeat 를 하나의 트랜잭션, 테이블당 한 번의 INSERT 로 저장합니다.
+
+    Args:
+        db (Session): 데이터베이스 세션
+        entries (list[heartbeat_schema.HeartbeatEntry]): 수신 시각 순으로 정렬된 heartbeat 목록
+    """
+    if not entries:
+        return
+    
+    try:
+        _add_heartbeats(db, entries)
+    except IntegrityError:
+        # 다른 워커에서 삭제된 서버/컨테이너의 id 가 캐시에 남아 있으면 FK 오류가 발생하므로
+        # 이 heartbeat 들의 서버와 컨테이너를 캐시에서 지우고 DB 에서 다시 조회하여 한 번 더 시도
+        for uuid in {entry.heartbeat.host_uuid for entry in entries}:
+            identity_cache.invalidate_server(uuid, identity_cache.server_ids.pop(uuid))
+        names = {container.container_name for entry in entries for container in entry.heartbeat.containers}
+        identity_cache.container_ids.pop_where(lambda key, value: key[1] in names)
+        _add_heartbeats(db, entries)
+
+def _add_heartbeats(db: Session, entries: list[heartbeat_schema.HeartbeatEntry]):
+    try:
+        server_ids = _resolve_server_ids(db, {entry.heartbeat.host_uuid for entry in entries})
         
-        if container_info and container_info.id in removed_container_ids:
-            removed_container_ids.remove(container_info.id)
+        # 호스트별 마지막 heartbeat 가 현재 컨테이너 구성을 결정
+        latest_entries = {}
+        for entry in entries:
+            latest_entries[entry.heartbeat.host_uuid] = entry
         
-        if not container_info:
-            db.add(models.Container(
-                host_server = server.id,
-                runtime = container.runtime,
-                name = container.container_name
-            ))
-            db.commit()
-            
-        container_info = db.query(models.Container).filter(models.Container.name == container.container_name).first()
-        internal_container_id = db.query(models.InternalContainerId).filter(
-            models.InternalContainerId.container_id == container_info.id,
-        ).order_by(models.InternalContainerId.reg_time.desc()).first()
+        # 페이로드의 컨테이너를 한 번에 조회 (이름은 서버 내에서만 유일)
+        runtimes = {}
+        for entry in entries:
+            server_id = server_ids[entry.heartbeat.host_uuid]
+            for container in entry.heartbeat.containers:
+                runtimes.setdefault((server_id, container.container_name), container.runtime)
+        container_ids = _resolve_container_ids(db, runtimes)
         
-        if internal_container_id and (
-            internal_container_id.pid_id != container.namespace.pid 
-            or internal_container_id.mnt_id != container.namespace.mnt 
-            or internal_container_id.cgroup_id != container.cgroup_id):
-            db.add(models.InternalContainerId(
-                container_id = container_info.id,
-                pid_id = container.namespace.pid,
-                mnt_id = container.namespace.mnt,
-                cgroup_id = container.cgroup_id
-            ))
-            db.commit()
+        # 컨테이너별 최신 InternalContainerId 를 조회 (캐시에 없는 컨테이너만 한 번에 조회)
+        latest_internal_ids = _resolve_latest_internal_ids(db, set(container_ids.values()))
         
-        if not internal_container_id:
-            db.add(models.InternalContainerId(
-            container_id = container_info.id,
-            pid_id = container.namespace.pid,
-            mnt_id = container.namespace.mnt,
-            cgroup_id = container.cgroup_id
-            ))
-            db.commit()
+        system_info_rows = []
+        internal_id_rows = []
+        container_sys_info_rows = []
+        heartbeat_rows = []
+        for entry in entries:
+            heartbeat = entry.heartbeat
+            server_id = server_ids[heartbeat.host_uuid]
             
-        db.add(models.ContainerSysInfo(
-            container_id = container_info.id,
-            cpu_kernel = container.stats.cpu.kernel_usage,
-            cpu_user = container.stats.cpu.user_usage,
-            cpu_percent = container.stats.cpu.usage_percent,
-            cpu_online = container.stats.cpu.online_cpus,
-            disk_read_mb = container.stats.io.read_mb,
-            disk_write_mb = container.stats.io.write_mb,
-            mem_limit = container.stats.memory.limit_mb,
-            mem_usage = container.stats.memory.usage_mb,
-            mem_percent = container.stats.memory.usage_percent,
-            net_recv_mb = container.stats.network.rx_mb,
-            net_send_mb = container.stats.network.tx_mb,
-            net_recv_packets = container.stats.network.rx_packets,
-            net_send_packets = container.stats.network.tx_packets,
-            proc_cnt = container.stats.proc_cnt
-        ))
+            system_info_rows.append({
+                **_system_info_row(server_id, heartbeat),
+                "timestamp": entry.received_at
+            })
+            
+            for container in heartbeat.containers:
+                container_id = container_ids[(server_id, container.container_name)]
+                internal_id = (container.namespace.pid, container.namespace.mnt, container.cgroup_id)
+                
+                if latest_internal_ids.get(container_id) != internal_id:
+                    latest_internal_ids[container_id] = internal_id
+                    internal_id_rows.append({
+                        "container_id": container_id,
+                        "pid_id": container.namespace.pid,
+                        "mnt_id": container.namespace.mnt,
+                        "cgroup_id": container.cgroup_id
+                    })
+                
+                container_sys_info_rows.append({
+                    **_container_sys_info_row(container_id, container),
+                    "timestamp": entry.received_at
+                })
+            
+            heartbeat_rows.append({
+                "uuid": heartbeat.host_uuid,
+                "timestamp": entry.received_at,
+                "survival_container_cnt": len(heartbeat.containers),
+                "req_ip": entry.req_ip,
+                "endpoint": heartbeat.policy_endpoint
+            })
+        
+        db.execute(insert(models.SystemInfo), system_info_rows)
+        
+        if internal_id_rows:
+            db.execute(
+                pg_insert(models.InternalContainerId)
+                .values(internal_id_rows)
+                .on_conflict_do_nothing(index_elements=["container_id", "pid_id", "mnt_id", "cgroup_id"])
+            )
+        
+        if container_sys_info_rows:
+            db.execute(insert(models.ContainerSysInfo), container_sys_info_rows)
+        
+        # 호스트의 마지막 페이로드에 없는 컨테이너는 한 번의 UPDATE 로 removed_at 기록
+        alive_container_ids = [
+            container_ids[(server_ids[uuid], container.container_name)]
+            for uuid, entry in latest_entries.items()
+            for container in entry.heartbeat.containers
+        ]
+        db.query(models.Container).filter(
+            models.Container.host_server.in_([server_ids[uuid] for uuid in latest_entries]),
+            models.Container.removed_at.is_(None),
+            models.Container.id.not_in(alive_container_ids)
+        ).update({"removed_at": datetime.now()}, synchronize_session=False)
+        
+        db.execute(insert(models.Heartbeat), heartbeat_rows)
+        
         db.commit()
+    except Exception:
+        db.rollback()
+        raise
     
-    # 만약 사라진 컨테이너가 존재하면 removed_at 업데이트
-    for container_id in removed_container_ids:
-        db.query(models.Container).filter(models.Container.id == container_id).update({"removed_at": datetime.now()})
-        db.commit()
+    # 커밋된 식별자만 캐시에 반영
+    for uuid, server_id in server_ids.items():
+        identity_cache.server_ids.put(uuid, server_id)
+    for (server_id, name), container_id in container_ids.items():
+        identity_cache.put_container(server_id, name, container_id)
+    for container_id, internal_id in latest_internal_ids.items():
+        identity_cache.internal_ids.put(container_id, internal_id)
     
-    insert_data = models.Heartbeat(
-        uuid = heartbeat.host_uuid,
-        survival_container_cnt = len(heartbeat.containers),
-        req_ip = req.client.host,
-        endpoint = heartbeat.policy_endpoint
-    )
+    return
+
+def _resolve_server_ids(db: Session, uuids: set[str]) -> dict[str, int]:
+    server_ids = {}
+    for uuid in uuids:
+        server_id = identity_cache.server_ids.get(uuid)
+        if server_id is not None:
+            server_ids[uuid] = server_id
     
-    db.add(insert_data)
-    db.commit()
+    missing = [uuid for uuid in uuids if uuid not in server_ids]
+    if missing:
+        server_ids.update(dict(db.query(models.Server.uuid, models.Server.id).filter(
+            models.Server.uuid.in_(missing)
+        ).all()))
     
-    return
+    missing = [uuid for uuid in uuids if uuid not in server_ids]
+    if missing:
+        db.execute(
+            pg_insert(models.Server)
+            .values([{"uuid": uuid, "name": str(uuid)} for uuid in missing])
+            .on_conflict_do_nothing(index_elements=["uuid"])
+        )
+        server_ids.update(dict(db.query(models.Server.uuid, models.Server.id).filter(
+            models.Server.uuid.in_(missing)
+        ).all()))
+    
+    return server_ids
 
-def get_server_stats(db: Session, server_id: int, time_unit:str, call_back: callable = mean):
-    # 단위 시간 마다 cpu 코어들의 평균을 내서 시간과 값의 리스트 형식으로 반환
-    one_day_ago = datetime.now() - timedelta(days=1)
+def _resolve_container_ids(db: Session, runtimes: dict[tuple[int, str], str]) -> dict[tuple[int, str], int]:
+    if not runtimes:
+        return {}
     
-    # 단위 시간 마다 각 CPU 코어별 평균을 계산
-    query = db.query(
-        func.date_trunc(time_unit, models.SystemInfo.timestamp).label('unit'),
-        models.SystemInfo.cpu_core_usage
-    ).filter(
-        models.SystemInfo.server_id == server_id,
-        models.SystemInfo.timestamp >= one_day_ago
-    ).order_by('unit').all()
+    def query(keys):
+        return {
+            (row.host_server, row.name): row.id
+            for row in db.query(models.Container.host_server, models.Container.name, models.Container.id).filter(
+                tuple_(models.Container.host_server, models.Container.name).in_(keys)
+            ).all()
+        }
+    
+    container_ids = {}
+    for key in runtimes:
+        container_id = identity_cache.container_ids.get(key)
+        if container_id is not None:
+            container_ids[key] = container_id
+    
+    missing = [key for key in runtimes if key not in container_ids]
+    if missing:
+        container_ids.update(query(missing))
+    
+    # 처음 보고된 컨테이너는 한 번의 INSERT 로 추가
+    missing = [key for key in runtimes if key not in container_ids]
+    if missing:
+        db.execute(
+            pg_insert(models.Container)
+            .values([
+                {"host_server": server_id, "runtime": runtimes[(server_id, name)], "name": name}
+                for server_id, name in missing
+            ])
+            .on_conflict_do_nothing(index_elements=["host_server", "name"])
+        )
+        container_ids.update(query(missing))
+    
+    return container_ids
 
-    # 결과를 처리하여 원하는 형태로 변환
-    result = {}
-    for record in query:
-        unit = record.unit
-        cpu_usages = record.cpu_core_usage  # JSON 배열
+def _resolve_latest_internal_ids(db: Session, container_ids: set[int]) -> dict[int, tuple[int, int, int]]:
+    latest_internal_ids = {}
+    for container_id in container_ids:
+        internal_id = identity_cache.internal_ids.get(container_id)
+        if internal_id is not None:
+            latest_internal_ids[container_id] = internal_id
+    
+    missing = [container_id for container_id in container_ids if container_id not in latest_internal_ids]
+    if missing:
+        latest_internal_ids.update({
+            row.container_id: (row.pid_id, row.mnt_id, row.cgroup_id)
+            for row in db.query(
+                models.InternalContainerId.container_id,
+                models.InternalContainerId.pid_id,
+                models.InternalContainerId.mnt_id,
+                models.InternalContainerId.cgroup_id
+            ).filter(
+                models.InternalContainerId.container_id.in_(missing)
+            ).distinct(
+                models.InternalContainerId.container_id
+            ).order_by(
+                models.InternalContainerId.container_id,
+                models.InternalContainerId.reg_time.desc()
+            ).all()
+        })
+    
+    return latest_internal_ids
+
+# 분위수 집계 함수의 분위수
+QUANTILES = {
+    heartbeat_schema.funcList.MEDIAN: 0.5,
+    heartbeat_schema.funcList.P95: 0.95
+}
 
-        if unit not in result:
-            result[unit] = {f"cpu{i+1}": [] for i in range(len(cpu_usages))}
+def _aggregate(function: heartbeat_schema.funcList, column):
+    if function == heartbeat_schema.funcList.MAX:
+        return func.max(column)
+    if function in QUANTILES:
+        return func.percentile_cont(QUANTILES[function]).within_group(column)
+    return func.avg(column)
+
+def _aggregate_value(aggregate: MetricAggregate, function: heartbeat_schema.funcList) -> float | None:
+    if function == heartbeat_schema.funcList.MAX:
+        return aggregate.max
+    if function in QUANTILES:
+        return aggregate.quantile(QUANTILES[function])
+    return aggregate.mean()
+
+def get_server_stats(db: Session, server_id: int, time_unit: str, 
+                     function: heartbeat_schema.funcList = heartbeat_schema.funcList.MEAN):
+    """단위 시간(date_trunc) 마다 최근 24시간의 서버 지표를 집계합니다.
+
+    rollup 이 활성화되어 있으면 요청 단위를 만족하는 가장 굵은 rollup 에서 읽고,
+    아직 rollup 되지 않은 구간만 원본 행에서 집계합니다. 그렇지 않으면 원본 행을 DB 에서 집계합니다.
+    """
+    now = datetime.now().astimezone()
+    since = now - timedelta(days=1)
+    
+    buckets = None
+    if config.ROLLUP_ENABLED:
+        buckets = rollup_crud.load_buckets(db, rollup_crud.SYSTEM_INFO, server_id, time_unit, since, now)
+    if buckets is None:
+        return _get_server_stats_sql(db, server_id, time_unit, function, since)
+    
+    result = {
+        "cpu": [],
+        "network": [],
+        "memory": [],
+        "disk": []
+    }
+    for unit in sorted(buckets):
+        metrics = buckets[unit]
+        values = {metric: _aggregate_value(aggregate, function) for metric, aggregate in metrics.items()}
+        time = unit.isoformat()
         
-        # 각 CPU 코어의 사용률을 해당 시간의 리스트에 추가
-        for i, usage in enumerate(cpu_usages):
-            result[unit][f"cpu{i+1}"].append(float(usage))
-
-    # 각 시간대별로 CPU 코어의 평균 계산
-    cpu_result = []
-    for unit, cpu_data in result.items():
-        unit_result = {"time": unit.isoformat()}
-        for cpu, values in cpu_data.items():
-            unit_result[cpu] = call_back(values)
-        cpu_result.append(unit_result)
-
-    # 시간순으로 정렬
-    cpu_result.sort(key=lambda x: x['time'])
-    
-    network_result = []
-    # 단위시간마다 네트워크 사용량의 평균을 계산
-    query = db.query(
-        func.date_trunc(time_unit, models.SystemInfo.timestamp).label('unit'),
+        cores = sorted((int(metric[3:]), value) for metric, value in values.items() if metric.startswith("cpu"))
+        result["cpu"].append({
+            "time": time,
+            **{f"cpu{core}": value for core, value in cores}
+        })
+        result["network"].append({
+            "time": time,
+            "recv_data_mb": values.get("net_recv_data_mb"),
+            "sent_data_mb": values.get("net_send_data_mb")
+        })
+        result["memory"].append({
+            "time": time,
+            "used_gb": values.get("mem_used"),
+            "percent": values.get("mem_percent")
+        })
+        result["disk"].append({
+            "time": time,
+            "read_mb": values.get("disk_read_mb"),
+            "write_mb": values.get("disk_write_mb"),
+            "percent": values.get("disk_percent")
+        })
+    
+    return result
+
+def _get_server_stats_sql(db: Session, server_id: int, time_unit: str, 
+                          function: heartbeat_schema.funcList = heartbeat_schema.funcList.MEAN, since: datetime | None = None):
+    """단위 시간(date_trunc) 마다 서버 지표를 집계합니다. 집계는 모두 DB 에서 한 번의 쿼리로 수행되며 버킷당 한 행만 반환됩니다.
+
+    Args:
+        db (Session): 데이터베이스 세션
+        server_id (int): 서버 id
+        time_unit (str): date_trunc 단위 (minute, hour, day, week, month)
+        function (heartbeat_schema.funcList): 집계 함수 (mean: avg, max: max, median: percentile_cont(0.5))
+        since (datetime, optional): 집계 시작 시각. 기본값은 24시간 전
+
+    Returns:
+        dict: cpu, network, memory, disk 별 시간순 집계 결과
+    """
+    if since is None:
+        since = datetime.now() - timedelta(days=1)
+    
+    base = select(
+        func.date_trunc(time_unit, models.SystemInfo.timestamp).label("unit"),
+        models.SystemInfo.cpu_core_usage,
         models.SystemInfo.net_recv_data_mb,
-        models.SystemInfo.net_send_data_mb
-    ).filter(
+        models.SystemInfo.net_send_data_mb,
+        models.SystemInfo.mem_used,
+        models.SystemInfo.mem_percent,
+        models.SystemInfo.disk_read_mb,
+        models.SystemInfo.disk_write_mb,
+        models.SystemInfo.disk_percent
+    ).where(
         models.SystemInfo.server_id == server_id,
-        models.SystemInfo.timestamp >= one_day_ago
-    ).order_by('unit').all()
+        models.SystemInfo.timestamp >= since
+    ).cte("base")
+    
+    # cpu_core_usage JSON 배열을 코어 번호와 함께 펼쳐서 (버킷, 코어) 별로 집계한 뒤 버킷당 배열 하나로 모음
+    core_usage = func.json_array_elements_text(base.c.cpu_core_usage).table_valued("value", with_ordinality="idx").render_derived()
+    per_core = select(
+        base.c.unit,
+        core_usage.c.idx,
+        _aggregate(function, cast(core_usage.c.value, Float)).label("value")
+    ).select_from(base).join(core_usage, true()).group_by(base.c.unit, core_usage.c.idx).cte("per_core")
+    
+    cpu = select(
+        per_core.c.unit,
+        func.array_agg(aggregate_order_by(per_core.c.value, per_core.c.idx)).label("cores")
+    ).group_by(per_core.c.unit).cte("cpu")
     
+    scalars = select(
+        base.c.unit,
+        _aggregate(function, base.c.net_recv_data_mb).label("recv_data_mb"),
+        _aggregate(function, base.c.net_send_data_mb).label("sent_data_mb"),
+        _aggregate(function, base.c.mem_used).label("mem_used_gb"),
+        _aggregate(function, base.c.mem_percent).label("mem_percent"),
+        _aggregate(function, base.c.disk_read_mb).label("disk_read_mb"),
+        _aggregate(function, base.c.disk_write_mb).label("disk_write_mb"),
+        _aggregate(function, base.c.disk_percent).label("disk_percent")
+    ).group_by(base.c.unit).cte("scalars")
     
-    # 쿼리 결과를 record.unit를 기준으로 group_by 처리
-    temp = {}
-    network_result = []
+    query = db.execute(
+        select(scalars, cpu.c.cores)
+        .outerjoin(cpu, cpu.c.unit == scalars.c.unit)
+        .order_by(scalars.c.unit)
+    ).all()
+    
+    result = {
+        "cpu": [],
+        "network": [],
+        "memory": [],
+        "disk": []
+    }
     for record in query:
-        temp[record.unit] = temp.get(record.unit, {"recv_data_mb": [], "sent_data_mb": []})
-        temp[record.unit]["recv_data_mb"].append(record.net_recv_data_mb)
-        temp[record.unit]["sent_data_mb"].append(record.net_send_data_mb)
-    
-    for unit, data in temp.items():
-        network_result.append({
-            "time": unit.isoformat(),
-            "recv_data_mb": call_back(data["recv_data_mb"]),
-            "sent_data_mb": call_back(data["sent_data_mb"])
-        })
+        time = record.unit.isoformat()
         
-    network_result.sort(key=lambda x: x['time'])
+        result["cpu"].append({
+            "time": time,
+            **{f"cpu{i+1}": value for i, value in enumerate(record.cores or [])}
+        })
+        result["network"].append({
+            "time": time,
+            "recv_data_mb": record.recv_data_mb,
+            "sent_data_mb": record.sent_data_mb
+        })
+        result["memory"].append({
+            "time": time,
+            "used_gb": record.mem_used_gb,
+            "percent": record.mem_percent
+        })
+        result["disk"].append({
+            "time": time,
+            "read_mb": record.disk_read_mb,
+            "write_mb": record.disk_write_mb,
+            "percent": record.disk_percent
+        })
+    
+    return result
+    
+    
+def get_container_stats(db: Session, container_id: int, time_unit: str, 
+                        function: heartbeat_schema.funcList = heartbeat_schema.funcList.MEAN):
+    """단위 시간(date_trunc) 마다 최근 24시간의 컨테이너 지표(cpu, memory, disk, network, proc_cnt)를 집계합니다.
 
-    return {
-        "cpu": cpu_result,
-        "network": network_result,
+    rollup 이 활성화되어 있으면 요청 단위를 만족하는 가장 굵은 rollup 에서 읽고,
+    아직 rollup 되지 않은 구간만 원본 행에서 집계합니다.
+    그렇지 않으면 원본 행을 열 단위로 한 번에 읽어 NumPy 로 버킷별 집계합니다.
+    """
+    now = datetime.now().astimezone()
+    since = now - timedelta(days=1)
+    
+    buckets = None
+    if config.ROLLUP_ENABLED:
+        buckets = rollup_crud.load_buckets(db, rollup_crud.CONTAINER_SYS_INFO, container_id, time_unit, since, now)
+    
+    if buckets is not None:
+        units = sorted(buckets)
+        values = [
+            {metric: _aggregate_value(aggregate, function) for metric, aggregate in buckets[unit].items()}
+            for unit in units
+        ]
+    else:
+        units, values = _get_container_stats_columnar(db, container_id, time_unit, function, since)
+    
+    result = {
+        "cpu": [],
         "memory": [],
-        "disk": []
+        "disk": [],
+        "network": [],
+        "proc_cnt": []
     }
+    for unit, unit_values in zip(units, values):
+        time = unit.isoformat()
+        
+        result["cpu"].append({
+            "time": time,
+            "percent": unit_values.get("cpu_percent")
+        })
+        result["memory"].append({
+            "time": time,
+            "usage_mb": unit_values.get("mem_usage"),
+            "percent": unit_values.get("mem_percent")
+        })
+        result["disk"].append({
+            "time": time,
+            "read_mb": unit_values.get("disk_read_mb"),
+            "write_mb": unit_values.get("disk_write_mb")
+        })
+        result["network"].append({
+            "time": time,
+            "recv_mb": unit_values.get("net_recv_mb"),
+            "sent_mb": unit_values.get("net_send_mb")
+        })
+        result["proc_cnt"].append({
+            "time": time,
+            "value": unit_values.get("proc_cnt")
+        })
+    
+    return result
+
+def _get_container_stats_columnar(db: Session, container_id: int, time_unit: str, 
+                                  function: heartbeat_schema.funcList, since: datetime) -> tuple[list[datetime], list[dict]]:
+    # 지표별로 array_agg 하여 한 행에 열 배열로 받음 (행 단위 변환 비용 없이 바로 NumPy 배열로 변환)
+    timestamp = models.ContainerSysInfo.timestamp
+    unit = func.date_trunc(time_unit, timestamp)
+    columns = rollup_crud.CONTAINER_SYS_INFO.columns
+    record = db.execute(select(
+        func.array_agg(aggregate_order_by(distinct(unit), unit)).label("units"),
+        func.array_agg(aggregate_order_by(func.extract("epoch", unit), timestamp)).label("bucket_keys"),
+        *[func.array_agg(aggregate_order_by(column, timestamp)).label(column.key) for column in columns]
+    ).where(
+        models.ContainerSysInfo.container_id == container_id,
+        timestamp >= since
+    )).one()
     
+    if not record.units:
+        return [], []
     
-def get_container_stats(db: Session, container_id: int, time_unit: str, call_back: callable = mean):
-    one_day_ago = datetime.now() - timedelta(days=1)
+    bucket_keys = np.array(record.bucket_keys, dtype=np.float64)
+    values = np.column_stack([np.array(getattr(record, column.key), dtype=np.float64) for column in columns])
     
-    cpu_usage = []
-    query = db.query(
-        func.date_trunc(time_unit, models.ContainerSysInfo.timestamp).label('unit'),
-        models.ContainerSysInfo.cpu_percent
-    ).filter(
-        models.ContainerSysInfo.container_id == container_id,
-        models.ContainerSysInfo.timestamp >= one_day_ago
-    ).order_by('unit').all()
+    if function == heartbeat_schema.funcList.MAX:
+        aggregated = bucket_stats.bucket_reduce(bucket_keys, values, "max")
+    elif function in QUANTILES:
+        aggregated = bucket_stats.bucket_reduce(bucket_keys, values, "quantile", QUANTILES[function])
+    else:
+        aggregated = bucket_stats.bucket_reduce(bucket_keys, values, "mean")
     
-    # 쿼리 결과를 record.unit를 기준으로 group_by 처리
-    temp = {}
-    for record in query:
-        temp[record.unit] = temp.get(record.unit, [])
-        temp[record.unit].append(record.cpu_percent)
-        
-    
\ No newline at end of file
+    metrics = [column.key for column in columns]
+    return record.units, [dict(zip(metrics, row)) for row in aggregated.tolist()]
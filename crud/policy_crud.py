@@ -1,6 +1,11 @@
-import requests
+import hashlib
+import logging
+import struct
 from io import StringIO
-from sqlalchemy.orm import Session
+from typing import Callable, NamedTuple
+from sqlalchemy import BigInteger, Integer, JSON, SmallInteger, String, Text, cast, column, exists, func, insert, literal, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Query, Session
 from fastapi import Request
 from fastapi import HTTPException
 from starlette import status
@@ -9,257 +14,608 @@ from datetime import datetime
 from pydantic_yaml import parse_yaml_raw_as, to_yaml_str
 from ruamel.yaml import YAML
 
-from schema import server_schema, policy_schema, container_schema
+from core import config
+from schema import server_schema, policy_schema
 from database import models
-from crud import container_crud
+from crud import server_crud
 from crud.server_crud import get_server_info_from_uuid, create_server
+from utils import policy_bundle
+from utils.agent_client import agent_client
+from utils.identity_cache import LRUCache
+from utils.policy_cache import VersionedCache, invalidate_on_change
+from utils.policy_diff import diff_policy, policy_document, policy_hash
+from utils.policy_index import ConflictIndex
+from utils.policy_matcher import EVENT_FIELDS, PolicyMatcher
 
+logger = logging.getLogger(__name__)
 
-def create_custom_policy(db: Session, policy: policy_schema.ServerPolicy):
-    # TODO: 다중 서버 환경을 지원될 때 yaml 구조와 정책 적용 방식이 변경되어야 함
-    # ! 현재는 일단 13번 서버에 등록되어있는 컨테이너에 적용 예정
+
+# 한 번의 INSERT 에 담을 최대 행 수
+BULK_CHUNK_SIZE = 1000
+# 등록되지 않은 컨테이너를 추가할 서버
+# Todo 이후 서버 설정이 가능해 질 때 수정이 필요함.
+DEFAULT_HOST_SERVER = "192.168.0.1"
+
+def _chunks(rows: list, size: int = BULK_CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def validate_policies(containers: list[policy_schema.Policy], offset: int = 0) -> list[str]:
+    """DB 컬럼 제약을 벗어나는 정책 목록을 반환합니다. offset 은 오류 위치에 표시할 컨테이너 번호의 시작값입니다."""
+    def too_long(value: str, column) -> bool:
+        return len(value) > column.type.length
+    
+    errors = []
+    for index, container in enumerate(containers, start=offset):
+        prefix = f"containers[{index}]"
+        if too_long(container.container_name, models.Container.name):
+            errors.append(f"{prefix}.container_name: longer than {models.Container.name.type.length}")
+        if too_long(container.raw_tp, models.RawTracePointPolicy.state):
+            errors.append(f"{prefix}.raw_tp: longer than {models.RawTracePointPolicy.state.type.length}")
+        for i, tracepoint in enumerate(container.tracepoint_policy.tracepoints):
+            if too_long(tracepoint, models.TracepointPolicy.tracepoint):
+                errors.append(f"{prefix}.tracepoint_policy.tracepoints[{i}]: longer than {models.TracepointPolicy.tracepoint.type.length}")
+        for i, file_policy in enumerate(container.lsm_policies.file):
+            if too_long(file_policy.path, models.LsmFilePolicy.path):
+                errors.append(f"{prefix}.lsm_policies.file[{i}].path: longer than {models.LsmFilePolicy.path.type.length}")
+        for i, net_policy in enumerate(container.lsm_policies.network):
+            if too_long(net_policy.ip, models.LsmNetPolicy.ip):
+                errors.append(f"{prefix}.lsm_policies.network[{i}].ip: longer than {models.LsmNetPolicy.ip.type.length}")
+            if not 0 <= net_policy.port <= 65535:
+                errors.append(f"{prefix}.lsm_policies.network[{i}].port: out of range")
+            if not 0 <= net_policy.protocol <= 32767:
+                errors.append(f"{prefix}.lsm_policies.network[{i}].protocol: out of range")
+        for i, process_policy in enumerate(container.lsm_policies.process):
+            if too_long(process_policy.comm, models.LsmProcPolicy.comm):
+                errors.append(f"{prefix}.lsm_policies.process[{i}].comm: longer than {models.LsmProcPolicy.comm.type.length}")
+    return errors
+
+def _resolve_policy_containers(db: Session, names: list[str]) -> dict[str, int]:
+    """
+    이름으로 컨테이너 id 를 찾고, 없는 컨테이너는 DEFAULT_HOST_SERVER 에 추가합니다.
+    조회와 추가를 하나의 쿼리로 처리합니다.
+    """
+    server_id = server_crud.get_server_id_from_uuid(db, DEFAULT_HOST_SERVER)
+    if server_id is None:
+        server_id = db.execute(
+            pg_insert(models.Server)
+            .values(uuid=DEFAULT_HOST_SERVER, name=DEFAULT_HOST_SERVER)
+            .on_conflict_do_update(index_elements=["uuid"], set_={"name": DEFAULT_HOST_SERVER})
+            .returning(models.Server.id)
+        ).scalar_one()
+    
+    requested = values(column("name", String), name="requested").data([(name,) for name in names])
+    inserted = (
+        pg_insert(models.Container)
+        .from_select(
+            ["host_server", "runtime", "name"],
+            select(literal(server_id, BigInteger), literal("docker"), requested.c.name).where(
+                ~exists().where(models.Container.name == requested.c.name)
+            )
+        )
+        .on_conflict_do_nothing(index_elements=["host_server", "name"])
+        .returning(models.Container.name, models.Container.id)
+        .cte("inserted")
+    )
+    existing = select(models.Container.name, func.min(models.Container.id)) \
+        .where(models.Container.name.in_(names)) \
+        .group_by(models.Container.name)
     
-    # 기존 정책 확인
-    policy_data = db.query(models.Policy).filter(models.Policy.name == policy.name).first()
-    if policy_data:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f'Policy "{policy.name}" already exists')
-    else:
-        db.add(models.Policy(
-            name=policy.name,
-            api_version=policy.api_version
-        ))
-        db.commit()
-        
-        policy_data = db.query(models.Policy).filter(models.Policy.name == policy.name).first()
+    container_ids = dict(db.execute(select(inserted.c.name, inserted.c.id).union_all(existing)).all())
     
-    # 정책 생성
-    insert_failed_policy = {}
-    for container in policy.containers:
-        container_info = container_crud.get_container_by_name(db, container.container_name)
-        
-        if not container_info:
-            container_info = container_crud.add_container(
-                db, container_schema.ContainerAddReq(
-                    # Todo 이후 서버 설정이 가능해 질 때 수정이 필요함.
-                    host_server="192.168.0.1", 
-                    runtime="docker", 
-                    name=container.container_name
-                ))
-        
-        try:
-            if db.query(models.RawTracePointPolicy).filter(
-                models.RawTracePointPolicy.container_id == container_info.id
-            ).first():
-                raise Exception("Already exists")
-            
-            db.add(models.RawTracePointPolicy(
-                policy_id = policy_data.id,
-                container_id = container_info.id,
-                state = container.raw_tp
+    # 동시에 같은 컨테이너가 추가된 경우 다시 조회
+    missing = [name for name in names if name not in container_ids]
+    if missing:
+        container_ids.update(dict(db.execute(existing.where(models.Container.name.in_(missing))).all()))
+    
+    return container_ids
+
+def _insert_if_absent(db: Session, model, policy_id: int, key_columns: list[tuple[str, object]],
+                      extra_columns: list[tuple[str, object]], rows: list[tuple]) -> set[tuple]:
+    """
+    고유 인덱스가 없는 정책 테이블에 key_columns 가 같은 행이 없을 때만 추가합니다.
+    추가된 행의 key 를 반환합니다.
+    """
+    inserted = set()
+    columns = key_columns + extra_columns
+    for chunk in _chunks(rows):
+        requested = values(*[column(name, type_) for name, type_ in columns], name="requested").data(chunk)
+        statement = insert(model).from_select(
+            ["policy_id"] + [name for name, _ in columns],
+            select(literal(policy_id, BigInteger), *[cast(requested.c[name], type_) for name, type_ in columns]).where(
+                ~exists().where(*[getattr(model, name) == requested.c[name] for name, _ in key_columns])
+            )
+        ).returning(*[getattr(model, name) for name, _ in key_columns])
+        inserted.update(tuple(row) for row in db.execute(statement).all())
+    return inserted
+
+def _insert_on_conflict(db: Session, model, index_elements: list[str], rows: list[dict]) -> set[tuple]:
+    """고유 인덱스가 있는 정책 테이블에 추가하고, 충돌 없이 추가된 행의 index_elements 값을 반환합니다."""
+    inserted = set()
+    for chunk in _chunks(rows):
+        statement = pg_insert(model).values(chunk) \
+            .on_conflict_do_nothing(index_elements=index_elements) \
+            .returning(*[getattr(model, name) for name in index_elements])
+        inserted.update(tuple(row) for row in db.execute(statement).all())
+    return inserted
+
+def add_policy_rules(db: Session, policy_id: int, containers: list[policy_schema.Policy]) -> dict:
+    """
+    컨테이너별 정책을 policy_id 정책으로 일괄 추가합니다. commit 은 호출한 쪽에서 합니다.
+    raw_tp 는 컨테이너에 이미 있으면 상태만 바꾸고, 나머지 정책은 이미 같은 정책이 있으면 추가하지 않고 실패 목록에 담습니다.
+
+    Returns:
+        dict: 컨테이너 이름 -> {"tracepoint", "lsm_file", "lsm_network", "lsm_process"} 추가에 실패한 정책 목록
+    """
+    if not containers:
+        return {}
+    
+    container_ids = _resolve_policy_containers(db, list(dict.fromkeys(container.container_name for container in containers)))
+    
+    # 같은 key 의 정책은 처음 것만 추가하고 나머지는 실패로 처리
+    raw_tp_states = {}
+    tracepoint_rows, file_rows, net_rows, proc_rows = {}, {}, {}, {}
+    for container in containers:
+        container_id = container_ids[container.container_name]
+        raw_tp_states[container_id] = container.raw_tp
+        for tracepoint in container.tracepoint_policy.tracepoints:
+            tracepoint_rows.setdefault((container_id, tracepoint), (container_id, tracepoint))
+        for file_policy in container.lsm_policies.file:
+            file_rows.setdefault((container_id, file_policy.path), {
+                "policy_id": policy_id,
+                "container_id": container_id,
+                "path": file_policy.path,
+                "flags": file_policy.flags,
+                "uid": file_policy.uid
+            })
+        for net_policy in container.lsm_policies.network:
+            net_rows.setdefault((container_id, net_policy.ip, net_policy.port, net_policy.protocol), (
+                container_id, net_policy.ip, net_policy.port, net_policy.protocol, net_policy.flags, net_policy.uid
             ))
-            db.commit()
-        except Exception as e:
-            db.query(models.RawTracePointPolicy) \
-                .filter(models.RawTracePointPolicy.container_id == container_info.id) \
-                .update({"state": container.raw_tp})
-        
+        for process_policy in container.lsm_policies.process:
+            proc_rows.setdefault((container_id, process_policy.comm), {
+                "policy_id": policy_id,
+                "container_id": container_id,
+                "comm": process_policy.comm,
+                "flags": process_policy.flags,
+                "uid": process_policy.uid
+            })
+    
+    # raw_tp 는 있으면 상태만 변경하고 없는 컨테이너만 추가
+    raw_tp_rows = list(raw_tp_states.items())
+    updated = set()
+    for chunk in _chunks(raw_tp_rows):
+        requested = values(column("container_id", BigInteger), column("state", String), name="requested").data(chunk)
+        updated.update(db.execute(
+            update(models.RawTracePointPolicy)
+            .where(models.RawTracePointPolicy.container_id == requested.c.container_id)
+            .values(state=requested.c.state)
+            .returning(models.RawTracePointPolicy.container_id)
+        ).scalars().all())
+    missing_raw_tp = [
+        {"policy_id": policy_id, "container_id": container_id, "state": state}
+        for container_id, state in raw_tp_rows if container_id not in updated
+    ]
+    if missing_raw_tp:
+        db.execute(insert(models.RawTracePointPolicy), missing_raw_tp)
+    
+    inserted_tracepoints = _insert_if_absent(
+        db, models.TracepointPolicy, policy_id,
+        [("container_id", BigInteger), ("tracepoint", String)], [],
+        list(tracepoint_rows.values())
+    )
+    inserted_files = _insert_on_conflict(db, models.LsmFilePolicy, ["container_id", "path"], list(file_rows.values()))
+    inserted_nets = _insert_if_absent(
+        db, models.LsmNetPolicy, policy_id,
+        [("container_id", BigInteger), ("ip", String), ("port", Integer), ("protocol", SmallInteger)],
+        [("flags", JSON), ("uid", JSON)],
+        list(net_rows.values())
+    )
+    inserted_procs = _insert_on_conflict(db, models.LsmProcPolicy, ["container_id", "comm"], list(proc_rows.values()))
+    
+    # 반환된 key 에 없는 정책은 이미 존재하던 정책
+    insert_failed_policy = {}
+    def failed(container_name: str, kind: str, item):
+        insert_failed_policy.setdefault(container_name, {
+            "tracepoint": [], "lsm_file": [], "lsm_network": [], "lsm_process": []
+        })[kind].append(item)
+    
+    for container in containers:
+        container_id = container_ids[container.container_name]
         for tracepoint in container.tracepoint_policy.tracepoints:
-            try:
-                if db.query(models.TracepointPolicy).filter(
-                    models.TracepointPolicy.container_id == container_info.id,
-                    models.TracepointPolicy.tracepoint == tracepoint
-                ).first():
-                    raise Exception("Already exists")
-                
-                db.add(models.TracepointPolicy(
-                    policy_id = policy_data.id,
-                    container_id = container_info.id,
-                    tracepoint = tracepoint
-                ))
-                db.commit()
-            except Exception as e:
-                insert_failed_policy.setdefault(container.container_name, {}).setdefault("tracepoint", []).append(tracepoint)
-        
+            if (container_id, tracepoint) in inserted_tracepoints:
+                inserted_tracepoints.discard((container_id, tracepoint))
+            else:
+                failed(container.container_name, "tracepoint", tracepoint)
         for file_policy in container.lsm_policies.file:
-            try:
-                if db.query(models.LsmFilePolicy).filter(
-                    models.LsmFilePolicy.container_id == container_info.id,
-                    models.LsmFilePolicy.path == file_policy.path
-                ).first():
-                    raise Exception("Already exists")
-                
-                db.add(models.LsmFilePolicy(
-                    policy_id = policy_data.id,
-                    container_id = container_info.id,
-                    path = file_policy.path,
-                    flags = file_policy.flags,
-                    uid = file_policy.uid
-                ))
-                db.commit()
-            except Exception as e:
-                insert_failed_policy.setdefault(container.container_name, {}).setdefault("lsm_file", []).append(file_policy)
-        
+            if (container_id, file_policy.path) in inserted_files:
+                inserted_files.discard((container_id, file_policy.path))
+            else:
+                failed(container.container_name, "lsm_file", file_policy)
         for net_policy in container.lsm_policies.network:
-            try:
-                if db.query(models.LsmNetPolicy).filter(
-                    models.LsmNetPolicy.container_id == container_info.id,
-                    models.LsmNetPolicy.ip == net_policy.ip,
-                    models.LsmNetPolicy.port == net_policy.port,
-                    models.LsmNetPolicy.protocol == net_policy.protocol
-                ).first():
-                    raise Exception("Already exists")
-                
-                db.add(models.LsmNetPolicy(
-                    policy_id = policy_data.id,
-                    container_id = container_info.id,
-                    ip = net_policy.ip,
-                    port = net_policy.port,
-                    protocol = net_policy.protocol,
-                    flags = net_policy.flags,
-                    uid = net_policy.uid
-                ))
-                db.commit()
-            except Exception as e:
-                insert_failed_policy.setdefault(container.container_name, {}).setdefault("lsm_network", []).append(net_policy)
-                
+            key = (container_id, net_policy.ip, net_policy.port, net_policy.protocol)
+            if key in inserted_nets:
+                inserted_nets.discard(key)
+            else:
+                failed(container.container_name, "lsm_network", net_policy)
         for process_policy in container.lsm_policies.process:
-            try:
-                if db.query(models.LsmProcPolicy).filter(
-                    models.LsmProcPolicy.container_id == container_info.id,
-                    models.LsmProcPolicy.comm == process_policy.comm
-                ).first():
-                    raise Exception("Already exists")
-                
-                db.add(models.LsmProcPolicy(
-                    policy_id = policy_data.id,
-                    container_id = container_info.id,
-                    comm = process_policy.comm,
-                    flags = process_policy.flags,
-                    uid = process_policy.uid
-                ))
-                db.commit()
-            except Exception as e:
-                insert_failed_policy.setdefault(container.container_name, {}).setdefault("lsm_process", []).append(process_policy)
-                                                                                                                   
+            if (container_id, process_policy.comm) in inserted_procs:
+                inserted_procs.discard((container_id, process_policy.comm))
+            else:
+                failed(container.container_name, "lsm_process", process_policy)
+    
     return insert_failed_policy
 
+def create_policy(db: Session, name: str, api_version: str) -> int:
+    """정책을 추가하고 id 를 반환합니다. 같은 이름의 정책이 있으면 409 를 반환합니다. commit 은 호출한 쪽에서 합니다."""
+    policy_id = db.execute(
+        pg_insert(models.Policy)
+        .values(name=name, api_version=api_version)
+        .on_conflict_do_nothing(index_elements=["name"])
+        .returning(models.Policy.id)
+    ).scalar_one_or_none()
+    
+    if policy_id is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f'Policy "{name}" already exists')
+    return policy_id
+
+def create_empty_policy(db: Session, name: str, api_version: str) -> int:
+    """규칙 없이 정책만 추가하고 commit 합니다. 스트리밍 업로드에서 규칙은 add_policy_batch 로 나누어 추가합니다."""
+    try:
+        policy_id = create_policy(db, name, api_version)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return policy_id
+
+def create_custom_policy(db: Session, policy: policy_schema.ServerPolicy):
+    # TODO: 다중 서버 환경을 지원될 때 yaml 구조와 정책 적용 방식이 변경되어야 함
+    # ! 현재는 일단 DEFAULT_HOST_SERVER 에 등록되어있는 컨테이너에 적용 예정
+    
+    # 저장 전에 전체 정책을 검사
+    errors = validate_policies(policy.containers)
+    if errors:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+    
+    # 정책, 컨테이너, 정책 테이블별 INSERT 를 하나의 트랜잭션으로 처리
+    try:
+        policy_id = create_policy(db, policy.name, policy.api_version)
+        insert_failed_policy = add_policy_rules(db, policy_id, policy.containers)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    
+    return insert_failed_policy
+
+def add_policy_batch(db: Session, policy_id: int, batch: list[tuple[int, policy_schema.Policy]]) -> tuple[dict, list[str]]:
+    """
+    스트리밍 업로드에서 읽은 컨테이너 정책 일부를 검사하고 추가한 뒤 commit 합니다.
+    검사에 실패한 컨테이너는 추가하지 않습니다.
+
+    Args:
+        batch (list): (yaml 에서의 순번, 컨테이너 정책) 목록
+
+    Returns:
+        tuple: (추가에 실패한 정책 목록, 검사 오류 목록)
+    """
+    containers, errors = [], []
+    for index, container in batch:
+        container_errors = validate_policies([container], offset=index)
+        if container_errors:
+            errors += container_errors
+        else:
+            containers.append(container)
+    
+    try:
+        insert_failed_policy = add_policy_rules(db, policy_id, containers)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    
+    return insert_failed_policy, errors
+
+def create_policy_template(db: Session, template: policy_schema.PolicyTemplateCreate) -> models.PolicyTemplate:
+    """정책 템플릿을 추가합니다. 같은 이름의 템플릿이 있으면 409 를 반환합니다."""
+    errors = validate_policies([policy_schema.Policy(container_name="", **template.rules.model_dump())])
+    if errors:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=[
+            error.replace("containers[0]", "rules", 1) for error in errors
+        ])
+    
+    template_id = db.execute(
+        pg_insert(models.PolicyTemplate)
+        .values(
+            name=template.name,
+            api_version=template.api_version,
+            selector=template.selector.model_dump(),
+            rules=template.rules.model_dump()
+        )
+        .on_conflict_do_nothing(index_elements=["name"])
+        .returning(models.PolicyTemplate.id)
+    ).scalar_one_or_none()
+    
+    if template_id is None:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f'Policy template "{template.name}" already exists')
+    db.commit()
+    return db.get(models.PolicyTemplate, template_id)
+
+def get_policy_templates(db: Session) -> list[models.PolicyTemplate]:
+    return db.query(models.PolicyTemplate).order_by(models.PolicyTemplate.id).all()
+
+def delete_policy_template(db: Session, template_id: int):
+    deleted = db.query(models.PolicyTemplate).filter(models.PolicyTemplate.id == template_id).delete()
+    if not deleted:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Policy template not found")
+    db.commit()
+
 def get_policy_list(db: Session):
     return db.query(models.Policy).all()
     
-def get_policy_by_policy_id(db, policy_id: int) -> policy_schema.ServerPolicy:
+# 컨테이너 정책을 구성하는 테이블
+POLICY_MODELS = (
+    models.RawTracePointPolicy,
+    models.TracepointPolicy,
+    models.LsmFilePolicy,
+    models.LsmNetPolicy,
+    models.LsmProcPolicy
+)
+
+def _empty_policy_rows() -> dict:
+    return {"raw_tp": None, "tracepoints": [], "file": [], "network": [], "process": []}
+
+def _load_policy_rows(db: Session, filter_query: Callable[[Query, type], Query]) -> dict[tuple[int, int], dict]:
+    """
+    정책 테이블 5개를 각각 한 번씩 조회하여 (policy_id, container_id) 별로 묶습니다.
+    filter_query 는 (쿼리, 정책 테이블 모델) 을 받아 조회 조건을 추가한 쿼리를 반환합니다.
+    """
+    rows: dict[tuple[int, int], dict] = {}
+    
+    for model in POLICY_MODELS:
+        for row in filter_query(db.query(model), model).order_by(model.id).all():
+            policy_rows = rows.setdefault((row.policy_id, row.container_id), _empty_policy_rows())
+            
+            if model is models.RawTracePointPolicy:
+                policy_rows["raw_tp"] = row.state
+            elif model is models.TracepointPolicy:
+                policy_rows["tracepoints"].append(row.tracepoint)
+            elif model is models.LsmFilePolicy:
+                policy_rows["file"].append({"path": row.path, "flags": row.flags, "uid": row.uid})
+            elif model is models.LsmNetPolicy:
+                policy_rows["network"].append({
+                    "ip": row.ip,
+                    "port": row.port,
+                    "protocol": row.protocol,
+                    "flags": row.flags,
+                    "uid": row.uid
+                })
+            else:
+                policy_rows["process"].append({"comm": row.comm, "flags": row.flags, "uid": row.uid})
+    
+    return rows
+
+def _build_policy(container_name: str, policy_rows: dict) -> policy_schema.Policy:
+    return policy_schema.Policy(
+        container_name=container_name,
+        raw_tp=policy_rows["raw_tp"] or "off",
+        tracepoint_policy=policy_schema.TracepointPolicy(
+            tracepoints=policy_rows["tracepoints"]
+        ),
+        lsm_policies=policy_schema.LSMPolicies(
+            file=policy_rows["file"],
+            network=policy_rows["network"],
+            process=policy_rows["process"]
+        )
+    )
+
+def get_policy_by_policy_id(db: Session, policy_id: int) -> policy_schema.ServerPolicy:
     # 정책 존재 여부 확인
     policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
     if not policy:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Policy not found")
     
-    # 해당 정책과 연관된 모든 컨테이너 ID 수집
-    container_set = set()
-    container_set.update([c.container_id for c in db.query(models.RawTracePointPolicy).filter(models.RawTracePointPolicy.policy_id == policy.id).all()])
-    container_set.update([c.container_id for c in db.query(models.TracepointPolicy).filter(models.TracepointPolicy.policy_id == policy.id).all()])
-    container_set.update([c.container_id for c in db.query(models.LsmFilePolicy).filter(models.LsmFilePolicy.policy_id == policy.id).all()])
-    container_set.update([c.container_id for c in db.query(models.LsmNetPolicy).filter(models.LsmNetPolicy.policy_id == policy.id).all()])
-    container_set.update([c.container_id for c in db.query(models.LsmProcPolicy).filter(models.LsmProcPolicy.policy_id == policy.id).all()])
+    # 정책 테이블별로 한 번씩 조회 후 컨테이너별로 묶음
+    policy_rows = _load_policy_rows(db, lambda query, model: query.filter(model.policy_id == policy.id))
+    
+    # 연관된 컨테이너는 한 번에 조회
+    container_ids = sorted(container_id for _, container_id in policy_rows)
+    container_names = dict(
+        db.query(models.Container.id, models.Container.name).filter(models.Container.id.in_(container_ids)).all()
+    ) if container_ids else {}
     
-    # 기본 정책 데이터 구조 생성
-    policy_data = policy_schema.ServerPolicy(
+    return policy_schema.ServerPolicy(
         api_version=policy.api_version,
         name=policy.name,
-        containers=[]
+        containers=[
+            _build_policy(container_names[container_id], policy_rows[(policy.id, container_id)])
+            for container_id in container_ids
+        ]
     )
-    
-    # 각 컨테이너에 대한 정책 정보 수집
-    for container_id in container_set:
-        container = db.query(models.Container).filter(models.Container.id == container_id).first()
-        
-        # Raw Tracepoint Policy 조회
-        raw_tp = db.query(models.RawTracePointPolicy).filter(
-            models.RawTracePointPolicy.policy_id == policy.id,
-            models.RawTracePointPolicy.container_id == container_id
-        ).first()
-        
-        # Tracepoint Policies 조회
-        tracepoints = db.query(models.TracepointPolicy).filter(
-            models.TracepointPolicy.policy_id == policy.id,
-            models.TracepointPolicy.container_id == container_id
-        ).all()
-        
-        # LSM File Policies 조회
-        file_policies = db.query(models.LsmFilePolicy).filter(
-            models.LsmFilePolicy.policy_id == policy.id,
-            models.LsmFilePolicy.container_id == container_id
-        ).all()
-        
-        # LSM Network Policies 조회
-        net_policies = db.query(models.LsmNetPolicy).filter(
-            models.LsmNetPolicy.policy_id == policy.id,
-            models.LsmNetPolicy.container_id == container_id
-        ).all()
-        
-        # LSM Process Policies 조회
-        proc_policies = db.query(models.LsmProcPolicy).filter(
-            models.LsmProcPolicy.policy_id == policy.id,
-            models.LsmProcPolicy.container_id == container_id
-        ).all()
-        
-        # 컨테이너별 정책 데이터 구성
-        policy_data.containers.append(
-            policy_schema.Policy(
-                container_name=container.name,
-                raw_tp=raw_tp.state if raw_tp else "off",
-                tracepoint_policy=policy_schema.TracepointPolicy(
-                    tracepoints=[tp.tracepoint for tp in tracepoints]
-                ),
-                lsm_policies=policy_schema.LSMPolicies(
-                    file=[
-                        {
-                            "path": fp.path,
-                            "flags": fp.flags,
-                            "uid": fp.uid
-                        } for fp in file_policies
-                    ],
-                    network=[
-                        {
-                            "ip": np.ip,
-                            "port": np.port,
-                            "protocol": np.protocol,
-                            "flags": np.flags,
-                            "uid": np.uid
-                        } for np in net_policies
-                    ],
-                    process=[
-                        {
-                            "comm": pp.comm,
-                            "flags": pp.flags,
-                            "uid": pp.uid
-                        } for pp in proc_policies
-                    ]
-                )
-            )
+
+def _container_policies(db: Session, policy_rows: dict[tuple[int, int], dict],
+                        container_names: dict[int, str]) -> list[policy_schema.ContainerPolicy]:
+    """(policy_id, container_id) 별 정책 데이터를 컨테이너, 정책 id 순의 ContainerPolicy 목록으로 변환합니다."""
+    policy_ids = {policy_id for policy_id, _ in policy_rows}
+    policies = {
+        policy.id: policy
+        for policy in db.query(models.Policy).filter(models.Policy.id.in_(policy_ids)).all()
+    } if policy_ids else {}
+    
+    return [
+        policy_schema.ContainerPolicy(
+            api_version=policies[policy_id].api_version,
+            name=policies[policy_id].name,
+            policy=_build_policy(container_names[container_id], policy_rows[(policy_id, container_id)])
         )
-    
-    return policy_data
+        for policy_id, container_id in sorted(policy_rows, key=lambda key: (key[1], key[0]))
+    ]
+
+def _selector_match(selector: dict, tags: set[str]) -> bool:
+    return (
+        tags.issuperset(selector.get("all_of", []))
+        and (not selector.get("any_of") or not tags.isdisjoint(selector["any_of"]))
+        and tags.isdisjoint(selector.get("none_of", []))
+    )
 
-def get_server_policy(db: Session, server_id: int) -> policy_schema.ServerPolicy:
+def _template_policies(db: Session, container_names: dict[int, str]) -> list[policy_schema.ContainerPolicy]:
+    """
+    태그 조건에 맞는 컨테이너별로 정책 템플릿을 ContainerPolicy 로 펼칩니다.
+    템플릿은 컨테이너별 행으로 저장하지 않으며, 컨테이너의 태그는 선택자에 쓰인 태그만 한 번의 join 으로 조회합니다.
+    """
+    templates = db.query(models.PolicyTemplate).order_by(models.PolicyTemplate.id).all()
+    if not templates or not container_names:
+        return []
+    
+    selector_tags = {
+        tag
+        for template in templates
+        for key in ("all_of", "any_of", "none_of")
+        for tag in template.selector.get(key, [])
+    }
+    container_tags: dict[int, set[str]] = {}
+    if selector_tags:
+        rows = db.query(models.ContainerTag.container_id, models.Tag.name) \
+            .join(models.Tag, models.Tag.id == models.ContainerTag.tag_id) \
+            .filter(models.ContainerTag.container_id.in_(list(container_names)), models.Tag.name.in_(selector_tags)) \
+            .all()
+        for container_id, tag in rows:
+            container_tags.setdefault(container_id, set()).add(tag)
+    
+    return [
+        policy_schema.ContainerPolicy(
+            api_version=template.api_version,
+            name=template.name,
+            policy=policy_schema.Policy(container_name=container_name, **template.rules)
+        )
+        for container_id, container_name in sorted(container_names.items())
+        for template in templates
+        if _selector_match(template.selector, container_tags.get(container_id, set()))
+    ]
+
+def _server_container_policies(db: Session, server_id: int) -> list[policy_schema.ContainerPolicy]:
+    container_names = dict(
+        db.query(models.Container.id, models.Container.name).filter(models.Container.host_server == server_id).all()
+    )
+    if not container_names:
+        return []
+    
+    # 정책 테이블별로 서버의 컨테이너에 적용된 정책을 한 번씩 조회
+    policy_rows = _load_policy_rows(
+        db,
+        lambda query, model: query
+            .join(models.Container, models.Container.id == model.container_id)
+            .filter(models.Container.host_server == server_id)
+    )
+    return _container_policies(db, policy_rows, container_names) + _template_policies(db, container_names)
+
+class CompiledPolicy:
+    """
+    서버 또는 컨테이너에 적용된 정책을 컴파일한 결과입니다.
+    etag 는 응답 전체의 해시이며, hash 는 정책 문서(utils.policy_diff)의 해시로 서버에 전달하는 정책 이름과
+    마지막으로 전달한 정책과의 비교에 사용합니다.
+    서버에 전달할 ServerPolicy, yaml, bundle 은 처음 필요할 때 한 번만 만듭니다.
+    """
+    def __init__(self, policies: policy_schema.PolicyRes, built_at: datetime):
+        self.policies = policies
+        self.built_at = built_at
+        self.document = policy_document([container_policy.policy for container_policy in policies.policies])
+        self.hash = policy_hash(self.document)
+        self.etag = f'"{hashlib.sha256(policies.model_dump_json().encode()).hexdigest()[:32]}"'
+        self._server_policy = None
+        self._yaml = None
+        self._bundle = None
+        self._bundle_built = False
+        self._conflict_index = None
+        self._matcher = None
+
+    @property
+    def server_policy(self) -> policy_schema.ServerPolicy:
+        if self._server_policy is None:
+            self._server_policy = policy_schema.ServerPolicy(
+                api_version="api_version:",
+                # 내용이 같으면 이름도 같도록 생성 시각 대신 해시를 사용
+                name=f"policy_{self.hash[:16]}",
+                containers=[container_policy.policy for container_policy in self.policies.policies]
+            )
+        return self._server_policy
+
+    @property
+    def yaml(self) -> str:
+        if self._yaml is None:
+            self._yaml = to_yaml_str(self.server_policy)
+        return self._yaml
+
+    @property
+    def bundle(self) -> bytes | None:
+        """bundle 로 표현할 수 없는 정책(flag 종류가 MAX_FLAGS 를 넘거나 uid 가 범위를 벗어나는 경우)이면 None"""
+        if not self._bundle_built:
+            try:
+                self._bundle = policy_bundle.build_bundle(self.policies.policies)
+            except (ValueError, struct.error) as e:
+                logger.warning("Policy %s cannot be built as a bundle: %s", self.hash[:16], e)
+            self._bundle_built = True
+        return self._bundle
+
+    def content(self, policy_format: str) -> tuple[str, str | bytes]:
+        """정책을 policy_format 으로 변환하여 (형식, 내용) 으로 반환합니다. bundle 로 변환할 수 없으면 yaml 로 반환합니다."""
+        if policy_format == policy_bundle.FORMAT and self.bundle is not None:
+            return policy_format, self.bundle
+        return "yaml", self.yaml
+
+    @property
+    def conflict_index(self) -> ConflictIndex:
+        if self._conflict_index is None:
+            self._conflict_index = ConflictIndex(self.policies.policies)
+        return self._conflict_index
+
+    @property
+    def matcher(self) -> PolicyMatcher:
+        if self._matcher is None:
+            self._matcher = PolicyMatcher(self.policies.policies)
+        return self._matcher
+
+
+# ("server", server_id) / ("container", container_id) -> CompiledPolicy
+policy_cache = VersionedCache(config.POLICY_CACHE_SIZE, config.POLICY_CACHE_TTL_S)
+
+# 정책 테이블, 정책 템플릿, 컨테이너 태그는 모든 변경, Container/Policy/Server/Tag 는 추가, 삭제와 정책 내용에 영향을 주는 컬럼의 수정만 캐시를 무효화
+# (새 컨테이너는 태그 선택자 템플릿의 대상이 될 수 있으므로 추가도 변경으로 취급)
+invalidate_on_change(policy_cache, {
+    **{model.__tablename__: None for model in POLICY_MODELS},
+    models.Container.__tablename__: {"name", "host_server"},
+    models.Policy.__tablename__: {"name", "api_version"},
+    models.Server.__tablename__: set(),
+    models.PolicyTemplate.__tablename__: None,
+    models.ContainerTag.__tablename__: None,
+    models.Tag.__tablename__: {"name"}
+})
+
+def get_compiled_server_policy(db: Session, server_id: int) -> CompiledPolicy:
+    compiled = policy_cache.get(("server", server_id))
+    if compiled is not None:
+        return compiled
+    
+    version = policy_cache.version
     server = db.query(models.Server).filter(models.Server.id == server_id).first()
     if not server:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server not found")
     
-    container_list_in_server = db.query(models.Container).filter(models.Container.host_server == server_id).all()
-    
-    ret = {
-        "policies": []
-    }
-    
-    for container in container_list_in_server:
-        policy = get_container_policy(db, container.id)
-        if len(policy["policies"]) == 0:
-            continue
-        ret["policies"].extend(policy["policies"])
-    
-    return ret
+    compiled = CompiledPolicy(
+        policy_schema.PolicyRes(policies=_server_container_policies(db, server_id)),
+        datetime.now().astimezone()
+    )
+    policy_cache.put(("server", server_id), compiled, version)
+    return compiled
 
-def get_container_policy(db: Session, container_id: int) -> policy_schema.ContainerPolicy:
-    # 컨테이너와 연관된 정책들을 함께 조회
+def get_compiled_container_policy(db: Session, container_id: int) -> CompiledPolicy:
+    compiled = policy_cache.get(("container", container_id))
+    if compiled is not None:
+        return compiled
+    
+    version = policy_cache.version
     container = db.query(models.Container).filter(
         models.Container.id == container_id
     ).first()
@@ -267,177 +623,240 @@ def get_container_policy(db: Session, container_id: int) -> policy_schema.Contai
     if not container:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Container not found")
     
-    # 컨테이너와 연관된 모든 정책들을 그룹화하여 조회
-    policies_data = []
+    # 컨테이너에 적용된 모든 정책을 정책 테이블별로 한 번씩 조회
+    policy_rows = _load_policy_rows(db, lambda query, model: query.filter(model.container_id == container_id))
     
-    # 컨테이너에 연결된 고유한 정책 ID들을 수집
-    policy_ids = set()
-    policy_ids.update([p.policy_id for p in container.RawTracePointPolicy])
-    policy_ids.update([p.policy_id for p in container.TracepointPolicy])
-    policy_ids.update([p.policy_id for p in container.LsmFilePolicy])
-    policy_ids.update([p.policy_id for p in container.LsmNetPolicy])
-    policy_ids.update([p.policy_id for p in container.LsmProcPolicy])
+    compiled = CompiledPolicy(
+        policy_schema.PolicyRes(policies=(
+            _container_policies(db, policy_rows, {container.id: container.name})
+            + _template_policies(db, {container.id: container.name})
+        )),
+        datetime.now().astimezone()
+    )
+    policy_cache.put(("container", container_id), compiled, version)
+    return compiled
+
+def get_server_policy(db: Session, server_id: int) -> policy_schema.PolicyRes:
+    return get_compiled_server_policy(db, server_id).policies
+
+def get_container_policy(db: Session, container_id: int) -> policy_schema.PolicyRes:
+    return get_compiled_container_policy(db, container_id).policies
     
-    # 각 정책 ID에 대해 모든 관련 정책 정보를 수집
-    for policy_id in policy_ids:
-        policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
+def check_conflict(db: Session, server_id: int, policy: policy_schema.ServerPolicy,
+                   container_id: int | None = None) -> policy_schema.PolicyConflictRes:
+    """
+    policy 의 규칙과 충돌하는 서버의 기존 규칙을 찾습니다.
+    container_id 가 주어지면 policy 의 모든 컨테이너 규칙을 해당 컨테이너의 기존 규칙과 비교합니다.
+    """
+    if container_id is None:
+        compiled = get_compiled_server_policy(db, server_id)
+        conflicts = [
+            conflict
+            for container in policy.containers
+            for conflict in compiled.conflict_index.check(container)
+        ]
+    else:
+        server = db.query(models.Server).filter(models.Server.id == server_id).first()
+        if not server:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server not found")
         
-        # Raw Tracepoint Policy
-        raw_tp = db.query(models.RawTracePointPolicy).filter(
-            models.RawTracePointPolicy.policy_id == policy_id,
-            models.RawTracePointPolicy.container_id == container_id
+        container = db.query(models.Container).filter(
+            models.Container.id == container_id,
+            models.Container.host_server == server_id
         ).first()
+        if not container:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Container not found")
         
-        # Tracepoint Policies
-        tracepoints = db.query(models.TracepointPolicy).filter(
-            models.TracepointPolicy.policy_id == policy_id,
-            models.TracepointPolicy.container_id == container_id
-        ).all()
-        
-        # LSM File Policies
-        file_policies = db.query(models.LsmFilePolicy).filter(
-            models.LsmFilePolicy.policy_id == policy_id,
-            models.LsmFilePolicy.container_id == container_id
-        ).all()
-        
-        # LSM Network Policies
-        net_policies = db.query(models.LsmNetPolicy).filter(
-            models.LsmNetPolicy.policy_id == policy_id,
-            models.LsmNetPolicy.container_id == container_id
-        ).all()
-        
-        # LSM Process Policies
-        proc_policies = db.query(models.LsmProcPolicy).filter(
-            models.LsmProcPolicy.policy_id == policy_id,
-            models.LsmProcPolicy.container_id == container_id
-        ).all()
-        
-        # 정책 데이터 구성
-        policy_data = {
-            "api_version": policy.api_version,
-            "name": policy.name,
-            "policy": {
-                "container_name": container.name,
-                "raw_tp": raw_tp.state if raw_tp else "off",
-                "tracepoint_policy": {
-                    "tracepoints": [tp.tracepoint for tp in tracepoints]
-                },
-                "lsm_policies": {
-                    "file": [
-                        {
-                            "path": fp.path,
-                            "flags": fp.flags,
-                            "uid": fp.uid
-                        } for fp in file_policies
-                    ],
-                    "network": [
-                        {
-                            "ip": np.ip,
-                            "port": np.port,
-                            "protocol": np.protocol,
-                            "flags": np.flags,
-                            "uid": np.uid
-                        } for np in net_policies
-                    ],
-                    "process": [
-                        {
-                            "comm": pp.comm,
-                            "flags": pp.flags,
-                            "uid": pp.uid
-                        } for pp in proc_policies
-                    ]
-                }
-            }
-        }
-        
-        policies_data.append(policy_data)
-    
-    return {
-        "policies": policies_data
-    }
-    
-def check_conflict(db: Session, server_id: int, container_id: int | None = None):
-    server = db.query(models.Server).filter(models.Server.id == server_id).first()
-    if not server:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server not found")
-    
-    container = db.query(models.Container).filter(models.Container.id == container_id).first()
-    if not container:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Container not found")
+        compiled = get_compiled_container_policy(db, container_id)
+        conflicts = [
+            conflict
+            for item in policy.containers
+            for conflict in compiled.conflict_index.check(item, container.name)
+        ]
     
-    return {
-        "conflict": False
-    }
+    return policy_schema.PolicyConflictRes(conflict=bool(conflicts), conflicts=conflicts)
     
 
-def send_policy_to_server(endpoint: str, data: policy_schema.ServerPolicy) -> int:
-    """Send policy to server
+def evaluate_policy(db: Session, container_id: int, events: list[policy_schema.PolicyEvent]) -> policy_schema.PolicyEvaluateRes:
+    """컨테이너에 적용된 정책으로 이벤트를 평가합니다. 컴파일한 matcher 는 정책이 바뀔 때까지 캐시됩니다."""
+    errors = [
+        f"events[{index}]: {field} is required for {event.type} event"
+        for index, event in enumerate(events)
+        for field in EVENT_FIELDS[event.type]
+        if getattr(event, field) is None
+    ]
+    if errors:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+    
+    matcher = get_compiled_container_policy(db, container_id).matcher
+    return policy_schema.PolicyEvaluateRes(results=[matcher.evaluate(event) for event in events])
 
-    Args:
-        endpoint (str): 서버 주소
-        data (policy_schema.ServerPolicy): 정책
+def get_server_endpoints(db: Session, server_ids: list[int]) -> dict[int, str]:
+    """서버별 마지막 heartbeat 의 정책 endpoint 를 한 번에 조회합니다."""
+    rows = db.query(models.Server.id, models.Heartbeat.endpoint) \
+        .join(models.Heartbeat, models.Heartbeat.uuid == models.Server.uuid) \
+        .filter(models.Server.id.in_(server_ids)) \
+        .distinct(models.Server.id) \
+        .order_by(models.Server.id, models.Heartbeat.timestamp.desc()) \
+        .all()
+    return dict(rows)
+
+def get_tag_server_ids(db: Session, tag: str) -> list[int]:
+    """태그가 붙은 컨테이너가 있는 서버 id 목록을 반환합니다."""
+    rows = db.query(models.Container.host_server) \
+        .join(models.ContainerTag, models.ContainerTag.container_id == models.Container.id) \
+        .join(models.Tag, models.Tag.id == models.ContainerTag.tag_id) \
+        .filter(models.Tag.name == tag) \
+        .distinct() \
+        .all()
+    return [row.host_server for row in rows]
+
+# 에이전트에 보낼 수 있는 정책 형식 (policy_formats 를 알리지 않은 에이전트는 yaml)
+POLICY_FORMATS = (policy_bundle.FORMAT, "yaml")
+# 바뀐 부분만 받을 수 있는 에이전트가 policy_formats 에 함께 알리는 값
+DELTA_FORMAT = "delta-v1"
+
+# 에이전트 uuid -> 이 워커가 마지막으로 저장한 정책 형식
+_known_policy_formats = LRUCache(config.IDENTITY_CACHE_SIZE)
+
+def remember_policy_formats(db: Session, uuid: str, policy_formats: list[str] | None):
+    """
+    heartbeat 로 알린 에이전트의 정책 형식을 저장합니다.
+    이 워커가 마지막으로 저장한 값과 같으면 DB 에 접근하지 않으며, DB 의 값과 같으면 행을 수정하지 않습니다.
+    """
+    if policy_formats is None or _known_policy_formats.get(uuid) == tuple(policy_formats):
+        return
+    
+    statement = pg_insert(models.AgentCapability).values(uuid=uuid, policy_formats=policy_formats)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[models.AgentCapability.uuid],
+        set_={"policy_formats": statement.excluded.policy_formats, "updated_at": func.now()},
+        # json 타입은 비교 연산자가 없으므로 문자열로 비교
+        where=cast(models.AgentCapability.policy_formats, Text) != cast(statement.excluded.policy_formats, Text)
+    ))
+    db.commit()
+    _known_policy_formats.put(uuid, tuple(policy_formats))
+
+def get_policy_formats(db: Session, server_ids: list[int]) -> dict[int, list[str]]:
+    """서버별로 에이전트가 heartbeat 로 알린 정책 형식 목록을 반환합니다."""
+    rows = db.query(models.Server.id, models.AgentCapability.policy_formats) \
+        .join(models.AgentCapability, models.AgentCapability.uuid == models.Server.uuid) \
+        .filter(models.Server.id.in_(server_ids)) \
+        .all()
+    return dict(rows)
+
+def preferred_policy_format(policy_formats: list[str]) -> str:
+    """에이전트가 지원하는 형식 중 가장 선호하는 형식을 반환합니다."""
+    return next((policy_format for policy_format in policy_formats if policy_format in POLICY_FORMATS), "yaml")
+
+class PolicyTarget(NamedTuple):
+    """
+    서버에 전달할 정책과 서버에 마지막으로 전달한 정책 (없으면 base_hash, base_document 가 None)
+    delta 는 에이전트가 바뀐 부분만 받을 수 있는지 여부이며, 전체 정책은 보낼 때 policy 에서 format 으로 변환합니다.
+    """
+    endpoint: str
+    format: str
+    delta: bool
+    policy: CompiledPolicy
+    hash: str
+    document: dict
+    base_hash: str | None
+    base_document: dict | None
+
+def prepare_policy_targets(db: Session, data: policy_schema.PolicyApplyReq) -> tuple[dict[int, PolicyTarget], dict[int, str]]:
+    """
+    정책을 전달할 서버별 endpoint, 정책과 마지막으로 전달한 정책을 준비합니다.
 
     Returns:
-        int: 정책 적용 결과 (HTTP Status Code)
+        tuple: (server_id -> PolicyTarget, server_id -> 전달할 수 없는 이유)
     """
-    # make pydantic model to yaml
-    yaml_content = to_yaml_str(data)
-    files = {
-        'files': ('policy.yaml', yaml_content, 'text/yaml')
-    }
+    server_ids = list(dict.fromkeys(data.server_ids + (get_tag_server_ids(db, data.tag) if data.tag else [])))
+    if not server_ids:
+        return {}, {}
     
-    # request to server yaml file
-    res = requests.post(
-        endpoint, 
-        files=files
-    )
-    print(res.json())
-    res.raise_for_status()
-    return res.json()
+    existing = {
+        row.id for row in db.query(models.Server.id).filter(models.Server.id.in_(server_ids)).all()
+    }
+    endpoints = get_server_endpoints(db, list(existing))
+    applied = {
+        row.server_id: row for row in db.query(models.AppliedPolicy)
+            .filter(models.AppliedPolicy.server_id.in_(list(endpoints)))
+            .all()
+    }
+    policy_formats = get_policy_formats(db, list(endpoints))
+    
+    targets = {}
+    failures = {}
+    for server_id in server_ids:
+        if server_id not in existing:
+            failures[server_id] = "Server not found"
+        elif server_id not in endpoints:
+            failures[server_id] = "Server endpoint not found"
+        else:
+            # 변경이 없으면 캐시된 정책을 그대로 사용
+            compiled = get_compiled_server_policy(db, server_id)
+            base = applied.get(server_id)
+            agent_formats = policy_formats.get(server_id) or []
+            policy_format = preferred_policy_format(agent_formats)
+            targets[server_id] = PolicyTarget(
+                endpoint=endpoints[server_id],
+                format=policy_format,
+                delta=DELTA_FORMAT in agent_formats,
+                policy=compiled,
+                hash=compiled.hash,
+                document=compiled.document,
+                base_hash=base.hash if base else None,
+                base_document=base.document if base else None
+            )
     
+    return targets, failures
+
+def push_policy_target(target: PolicyTarget) -> dict:
+    """
+    서버에 정책을 전달합니다.
 
+    마지막으로 전달한 정책과 같으면 전달하지 않고 skipped 를 반환합니다.
+    에이전트가 delta-v1 을 알렸고 마지막으로 전달한 정책이 있으면 바뀐 부분만 보내며,
+    에이전트가 2xx 외의 응답을 하거나 응답하지 않으면 전체 정책을 보냅니다.
 
-def apply_policy(db: Session, server_id: int):
-    # server 존재 확인
-    server = db.query(models.Server).filter(models.Server.id == server_id).first()
-    
-    if not server:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server not found")
-    
-    # server id 의 정책을 가져옵니다
-    policies = get_server_policy(db, server_id)["policies"]
-    
+    전체 정책은 에이전트가 heartbeat 로 알린 형식(yaml 또는 bundle)으로 보내며, bundle 로 변환할 수 없는 정책은 yaml 로 보냅니다.
+
+    Returns:
+        dict: agent_client.post_policy 결과와 mode("full" | "delta" | None), format (전체 정책을 보낸 경우)
+    """
+    if target.base_hash == target.hash:
+        return {"status": "skipped", "mode": None}
+    
+    if target.delta and target.base_document is not None:
+        delta = diff_policy(target.base_document, target.document)
+        result = agent_client.post_policy_delta(target.endpoint, delta, target.base_hash, target.hash)
+        if result["status"] == "success":
+            return {**result, "mode": "delta"}
+        attempts, elapsed_ms = result["attempts"], result["elapsed_ms"]
+    else:
+        attempts, elapsed_ms = 0, 0
     
-    server_policy = policy_schema.ServerPolicy(
-        api_version="api_version:",
-        name=f"{datetime.now().isoformat()}_build_policy",
-        containers=[]
+    # 전체 정책이 필요할 때만 변환 (bundle 로 변환할 수 없으면 yaml 로 보냄)
+    policy_format, content = target.policy.content(target.format)
+    if policy_format == policy_bundle.FORMAT:
+        result = agent_client.post_policy_bundle(target.endpoint, content, target.hash)
+    else:
+        result = agent_client.post_policy(target.endpoint, content, target.hash)
+    return {
+        **result,
+        "attempts": result["attempts"] + attempts,
+        "elapsed_ms": round(result["elapsed_ms"] + elapsed_ms, 1),
+        "mode": "full",
+        "format": policy_format
+    }
+
+def record_applied_policy(db: Session, server_id: int, target: PolicyTarget):
+    """서버에 마지막으로 전달에 성공한 정책을 저장합니다."""
+    statement = pg_insert(models.AppliedPolicy).values(
+        server_id=server_id, hash=target.hash, document=target.document
     )
-    
-    for policy in policies:
-        policy_data = policy_schema.Policy(
-            container_name=policy["policy"]["container_name"],
-            raw_tp=policy["policy"]["raw_tp"],
-            tracepoint_policy=policy_schema.TracepointPolicy(
-                tracepoints=policy["policy"]["tracepoint_policy"]["tracepoints"]
-            ),
-            lsm_policies=policy_schema.LSMPolicies(
-                file=policy["policy"]["lsm_policies"]["file"],
-                network=policy["policy"]["lsm_policies"]["network"],
-                process=policy["policy"]["lsm_policies"]["process"]
-            )
-        )
-        server_policy.containers.append(policy_data)
-        
-    server_heartbeat = db.query(models.Heartbeat).filter(models.Heartbeat.uuid == server.uuid).order_by(models.Heartbeat.timestamp.desc()).first()
-    
-    if not server_heartbeat:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server endpoint not found")
-    
-    endpoint = server_heartbeat.endpoint
-    
-    ret = send_policy_to_server(endpoint, server_policy)
-    
-    return ret
-    
-    
\ No newline at end of file
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[models.AppliedPolicy.server_id],
+        set_={"hash": statement.excluded.hash, "document": statement.excluded.document, "applied_at": func.now()}
+    ))
+    db.commit()
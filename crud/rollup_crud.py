@@ -0,0 +1,364 @@
+from datetime import datetime, timedelta
+from typing import Callable, Iterable
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from core import config
+from database import models
+from utils.sketch import MetricAggregate
+
+# 집계 단위. 앞의 단위가 뒤의 단위보다 세밀함
+ROLLUP_UNITS = ("minute", "hour", "day")
+
+# 여러 워커가 동시에 compaction 하지 않도록 사용하는 advisory lock id
+ROLLUP_LOCK_ID = 0x524F4C4C  # "ROLL"
+
+# 요청된 TimeUnit 에 사용할 수 있는 rollup 단위 (굵은 단위 우선)
+ROLLUP_LEVELS = {
+    "minute": ("minute",),
+    "hour": ("hour", "minute"),
+    "day": ("day", "hour", "minute"),
+    "week": ("day", "hour", "minute"),
+    "month": ("day", "hour", "minute")
+}
+
+
+class RollupSource:
+    """
+    원본 테이블과 rollup 테이블의 대응 관계와 행에서 지표를 꺼내는 방법을 정의합니다.
+    """
+    def __init__(self, name: str, raw_model, rollup_model, key: str, columns: list, metrics: Callable[[object], Iterable[tuple[str, float]]]):
+        self.name = name
+        self.raw_model = raw_model
+        self.rollup_model = rollup_model
+        self.key = key
+        self.columns = columns
+        self.metrics = metrics
+
+    @property
+    def raw_key(self):
+        return getattr(self.raw_model, self.key)
+
+    @property
+    def rollup_key(self):
+        return getattr(self.rollup_model, self.key)
+
+
+def _system_metrics(row):
+    for i, usage in enumerate(row.cpu_core_usage):
+        yield f"cpu{i+1}", float(usage)
+    yield "net_recv_data_mb", row.net_recv_data_mb
+    yield "net_send_data_mb", row.net_send_data_mb
+    yield "mem_used", row.mem_used
+    yield "mem_percent", row.mem_percent
+    yield "disk_read_mb", row.disk_read_mb
+    yield "disk_write_mb", row.disk_write_mb
+    yield "disk_percent", row.disk_percent
+
+def _container_metrics(row):
+    yield "cpu_percent", row.cpu_percent
+    yield "mem_usage", row.mem_usage
+    yield "mem_percent", row.mem_percent
+    yield "disk_read_mb", row.disk_read_mb
+    yield "disk_write_mb", row.disk_write_mb
+    yield "net_recv_mb", row.net_recv_mb
+    yield "net_send_mb", row.net_send_mb
+    yield "proc_cnt", row.proc_cnt
+
+
+SYSTEM_INFO = RollupSource(
+    name="SystemInfo",
+    raw_model=models.SystemInfo,
+    rollup_model=models.SystemInfoRollup,
+    key="server_id",
+    columns=[
+        models.SystemInfo.cpu_core_usage,
+        models.SystemInfo.net_recv_data_mb,
+        models.SystemInfo.net_send_data_mb,
+        models.SystemInfo.mem_used,
+        models.SystemInfo.mem_percent,
+        models.SystemInfo.disk_read_mb,
+        models.SystemInfo.disk_write_mb,
+        models.SystemInfo.disk_percent
+    ],
+    metrics=_system_metrics
+)
+
+CONTAINER_SYS_INFO = RollupSource(
+    name="ContainerSysInfo",
+    raw_model=models.ContainerSysInfo,
+    rollup_model=models.ContainerSysInfoRollup,
+    key="container_id",
+    columns=[
+        models.ContainerSysInfo.cpu_percent,
+        models.ContainerSysInfo.mem_usage,
+        models.ContainerSysInfo.mem_percent,
+        models.ContainerSysInfo.disk_read_mb,
+        models.ContainerSysInfo.disk_write_mb,
+        models.ContainerSysInfo.net_recv_mb,
+        models.ContainerSysInfo.net_send_mb,
+        models.ContainerSysInfo.proc_cnt
+    ],
+    metrics=_container_metrics
+)
+
+ROLLUP_SOURCES = (SYSTEM_INFO, CONTAINER_SYS_INFO)
+
+
+# ==================== Watermark ====================
+
+def _watermark_name(source: RollupSource, unit: str) -> str:
+    return f"{source.name}:{unit}"
+
+def get_watermarks(db: Session, source: RollupSource) -> dict[str, datetime]:
+    """단위별로 rollup 이 완료된 시각을 반환합니다. 해당 시각 이전의 버킷은 모두 닫혀 있습니다."""
+    names = {_watermark_name(source, unit): unit for unit in ROLLUP_UNITS}
+    rows = db.query(models.RollupWatermark).filter(models.RollupWatermark.name.in_(names)).all()
+    return {names[row.name]: row.watermark for row in rows}
+
+def _set_watermark(db: Session, source: RollupSource, unit: str, watermark: datetime):
+    stmt = pg_insert(models.RollupWatermark).values(name=_watermark_name(source, unit), watermark=watermark)
+    db.execute(stmt.on_conflict_do_update(index_elements=["name"], set_={"watermark": stmt.excluded.watermark}))
+
+
+# ==================== Compaction ====================
+
+def _truncate(db: Session, unit: str, value: datetime) -> datetime:
+    # 버킷 경계는 조회 쿼리와 같은 기준(DB 세션 타임존)으로 계산
+    return db.scalar(select(func.date_trunc(unit, value)))
+
+def _upsert(db: Session, source: RollupSource, unit: str, buckets: dict, batch_size: int = 1000):
+    rows = [
+        {
+            source.key: key,
+            "unit": unit,
+            "bucket": bucket,
+            "cnt": cnt,
+            "stats": {metric: aggregate.to_dict() for metric, aggregate in metrics.items()}
+        }
+        for (key, bucket), (cnt, metrics) in buckets.items()
+    ]
+    for i in range(0, len(rows), batch_size):
+        stmt = pg_insert(source.rollup_model).values(rows[i:i + batch_size])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[source.key, "unit", "bucket"],
+            set_={"cnt": stmt.excluded.cnt, "stats": stmt.excluded.stats}
+        ))
+
+def _stream_buckets(db: Session, stmt, add: Callable[[tuple, object], None], flush: Callable[[], None]):
+    """
+    bucket 순으로 정렬된 stmt 의 결과를 ROLLUP_FETCH_SIZE 행씩 읽으면서 add 로 집계합니다.
+    bucket 이 바뀔 때마다 flush 를 호출하므로, 닫힌 bucket 은 조회가 끝나기 전에 저장할 수 있습니다.
+    """
+    result = db.execute(stmt.execution_options(yield_per=config.ROLLUP_FETCH_SIZE))
+    current = None
+    for row in result:
+        if row.bucket != current:
+            flush()
+            current = row.bucket
+        add(row)
+
+class _BucketWriter:
+    """집계 중인 버킷을 모아 두었다가 batch_size 개 이상이 되면 rollup 테이블에 저장합니다."""
+    def __init__(self, db: Session, source: RollupSource, unit: str, batch_size: int = 1000):
+        self._db = db
+        self._source = source
+        self._unit = unit
+        self._batch_size = batch_size
+        self.buckets = {}
+
+    def flush(self, force: bool = False):
+        if self.buckets and (force or len(self.buckets) >= self._batch_size):
+            _upsert(self._db, self._source, self._unit, self.buckets, self._batch_size)
+            self.buckets = {}
+
+def _compact_raw(db: Session, source: RollupSource, start: datetime, end: datetime):
+    # 전체 서버의 원본 행을 한 번에 읽지 않도록 시간 순으로 나누어 읽고, 분 버킷이 닫히면 바로 저장
+    writer = _BucketWriter(db, source, "minute")
+
+    def add(row):
+        cnt, metrics = writer.buckets.get((row.key, row.bucket), (0, {}))
+        for metric, value in source.metrics(row):
+            metrics.setdefault(metric, MetricAggregate()).add(value)
+        writer.buckets[(row.key, row.bucket)] = (cnt + 1, metrics)
+
+    _stream_buckets(db, select(
+        source.raw_key.label("key"),
+        func.date_trunc("minute", source.raw_model.timestamp).label("bucket"),
+        *source.columns
+    ).where(
+        source.raw_model.timestamp >= start,
+        source.raw_model.timestamp < end
+    ).order_by(source.raw_model.timestamp), add, writer.flush)
+    writer.flush(force=True)
+
+def _compact_rollup(db: Session, source: RollupSource, unit: str, from_unit: str, start: datetime, end: datetime):
+    model = source.rollup_model
+    writer = _BucketWriter(db, source, unit)
+
+    def add(row):
+        cnt, metrics = writer.buckets.get((row.key, row.bucket), (0, {}))
+        merge_stats(metrics, row.stats)
+        writer.buckets[(row.key, row.bucket)] = (cnt + row.cnt, metrics)
+
+    _stream_buckets(db, select(
+        source.rollup_key.label("key"),
+        func.date_trunc(unit, model.bucket).label("bucket"),
+        model.cnt,
+        model.stats
+    ).where(
+        model.unit == from_unit,
+        model.bucket >= start,
+        model.bucket < end
+    ).order_by(model.bucket), add, writer.flush)
+    writer.flush(force=True)
+
+def _compact_source(db: Session, source: RollupSource, now: datetime):
+    watermarks = get_watermarks(db, source)
+    backfill_start = now - timedelta(days=config.ROLLUP_BACKFILL_DAYS)
+
+    # 분 단위: 원본 행에서 집계. 늦게 저장되는 heartbeat 를 고려해 ROLLUP_LAG_S 이전까지만 닫힌 것으로 봄
+    start = watermarks.get("minute") or _truncate(db, "minute", backfill_start)
+    end = min(
+        _truncate(db, "minute", now - timedelta(seconds=config.ROLLUP_LAG_S)),
+        start + timedelta(hours=config.ROLLUP_MAX_RANGE_HOURS)
+    )
+    if start < end:
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(hours=1), end)
+            _compact_raw(db, source, chunk_start, chunk_end)
+            chunk_start = chunk_end
+        _set_watermark(db, source, "minute", end)
+        watermarks["minute"] = end
+
+    # 시간/일 단위: 한 단계 세밀한 rollup 을 병합
+    for unit, from_unit in zip(ROLLUP_UNITS[1:], ROLLUP_UNITS[:-1]):
+        if from_unit not in watermarks:
+            break
+        start = watermarks.get(unit) or _truncate(db, unit, backfill_start)
+        end = _truncate(db, unit, watermarks[from_unit])
+        if start < end:
+            _compact_rollup(db, source, unit, from_unit, start, end)
+            _set_watermark(db, source, unit, end)
+            watermarks[unit] = end
+
+def compact_rollups(db: Session, now: datetime | None = None) -> bool:
+    """닫힌 버킷을 rollup 테이블에 반영합니다.
+
+    한 번 실행에 최대 ROLLUP_MAX_RANGE_HOURS 만큼의 원본 데이터를 처리하며, 나머지는 다음 실행에서 이어서 처리합니다.
+    다른 워커가 실행 중이면 아무 작업도 하지 않고 False 를 반환합니다.
+    """
+    if now is None:
+        now = datetime.now().astimezone()
+
+    try:
+        if not db.scalar(select(func.pg_try_advisory_xact_lock(ROLLUP_LOCK_ID))):
+            db.rollback()
+            return False
+
+        for source in ROLLUP_SOURCES:
+            _compact_source(db, source, now)
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return True
+
+
+# ==================== Query ====================
+
+def merge_stats(metrics: dict[str, MetricAggregate], stats: dict):
+    for metric, data in stats.items():
+        aggregate = MetricAggregate.from_dict(data)
+        if metric in metrics:
+            metrics[metric].merge(aggregate)
+        else:
+            metrics[metric] = aggregate
+
+def load_buckets(db: Session, source: RollupSource, key: int, time_unit: str, since: datetime, now: datetime) -> dict | None:
+    """[since, now) 구간을 가능한 가장 굵은 rollup 으로 채운 time_unit 버킷별 집계값을 반환합니다.
+
+    각 단위의 rollup 으로 채운 구간의 앞뒤는 한 단계 세밀한 단위로 채우고,
+    분 단위 rollup 으로도 채울 수 없는 구간(아직 닫히지 않은 버킷 등)은 원본 행에서 집계합니다.
+
+    Returns:
+        dict | None: time_unit 버킷 -> 지표 -> MetricAggregate. rollup 이 한 번도 실행되지 않았다면 None
+    """
+    watermarks = get_watermarks(db, source)
+    if not watermarks:
+        return None
+
+    model = source.rollup_model
+    buckets = {}
+    raw_ranges = []
+
+    def cover(start: datetime, end: datetime, levels: tuple[str, ...]):
+        if start >= end:
+            return
+        if not levels:
+            raw_ranges.append((start, end))
+            return
+
+        unit = levels[0]
+        limit = min(end, watermarks[unit]) if unit in watermarks else start
+        rows = []
+        if start < limit:
+            rows = db.execute(select(
+                model.bucket,
+                func.date_trunc(time_unit, model.bucket).label("unit"),
+                model.stats
+            ).where(
+                source.rollup_key == key,
+                model.unit == unit,
+                model.bucket >= start,
+                model.bucket < limit
+            )).all()
+        if not rows:
+            cover(start, end, levels[1:])
+            return
+
+        for row in rows:
+            merge_stats(buckets.setdefault(row.unit, {}), row.stats)
+
+        # limit 이전의 이 단위 버킷은 모두 닫혀 있으므로, 조회된 첫 버킷 이전과 limit 이후만 세밀한 단위로 채움
+        cover(start, min(row.bucket for row in rows), levels[1:])
+        cover(limit, end, levels[1:])
+
+    cover(since, now, ROLLUP_LEVELS[time_unit])
+
+    for unit, metrics in load_raw_buckets(db, source, key, time_unit, raw_ranges).items():
+        merged = buckets.setdefault(unit, {})
+        for metric, aggregate in metrics.items():
+            if metric in merged:
+                merged[metric].merge(aggregate)
+            else:
+                merged[metric] = aggregate
+
+    return buckets
+
+def load_raw_buckets(db: Session, source: RollupSource, key: int, time_unit: str, ranges: list[tuple[datetime, datetime]]) -> dict:
+    """원본 행을 한 번의 쿼리로 읽어 time_unit 버킷별 집계값을 반환합니다."""
+    if not ranges:
+        return {}
+
+    timestamp = source.raw_model.timestamp
+    rows = db.execute(select(
+        func.date_trunc(time_unit, timestamp).label("unit"),
+        *source.columns
+    ).where(
+        source.raw_key == key,
+        or_(*[(timestamp >= start) & (timestamp < end) for start, end in ranges])
+    )).all()
+
+    buckets = {}
+    for row in rows:
+        metrics = buckets.setdefault(row.unit, {})
+        for metric, value in source.metrics(row):
+            metrics.setdefault(metric, MetricAggregate()).add(value)
+
+    return buckets
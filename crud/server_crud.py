@@ -1,12 +1,27 @@
 from sqlalchemy.orm import Session
-from fastapi import Request
 from schema import server_schema
-from schema import heartbeat_schema
 from database import models
+from utils import identity_cache
 
 def get_server_info_from_uuid(db: Session, uuid: str) -> models.Server | None:
     return db.query(models.Server).filter(models.Server.uuid == uuid).first()
 
+def get_server_id_from_uuid(db: Session, uuid: str) -> int | None:
+    server_id = identity_cache.server_ids.get(uuid)
+    if server_id is not None:
+        return server_id
+    
+    server = get_server_info_from_uuid(db, uuid)
+    if not server:
+        return None
+    
+    identity_cache.server_ids.put(uuid, server.id)
+    return server.id
+
+def get_server_uuids(db: Session, server_ids: list[int]) -> list[str]:
+    rows = db.query(models.Server.uuid).filter(models.Server.id.in_(server_ids)).all()
+    return [row.uuid for row in rows]
+
 def create_server(db: Session, server: server_schema.Server) -> server_schema.ServerInfo:
     insert_data = models.Server(
         uuid=server.uuid,
@@ -17,6 +32,7 @@ def create_server(db: Session, server: server_schema.Server) -> server_schema.Se
     db.commit()
     
     insert_data = db.query(models.Server).filter(models.Server.uuid == server.uuid).first()
+    identity_cache.server_ids.put(insert_data.uuid, insert_data.id)
     
     return server_schema.ServerInfo(
         id=insert_data.id,
@@ -26,6 +42,9 @@ def create_server(db: Session, server: server_schema.Server) -> server_schema.Se
         last_heartbeat=insert_data.created_at
     )
 
+def get_server(db: Session, server_id: int) -> models.Server | None:
+    return db.query(models.Server).filter(models.Server.id == server_id).first()
+
 def get_server_info(db: Session, server_id: int) -> server_schema.ServerInfo:
     server_info = db.query(models.Server).filter(models.Server.id == server_id).first()
     last_heartbeat = db.query(models.Heartbeat).filter(models.Heartbeat.uuid == server_info.uuid).order_by(models.Heartbeat.timestamp.desc()).first() 
@@ -57,7 +76,13 @@ def update_server_name(db: Session, server_id: int, data: server_schema.ServerNa
     return get_server_info(db, server_id)
 
 def delete_server(db: Session, server_id: int) -> None:
+    server = db.query(models.Server).filter(models.Server.id == server_id).first()
+    if not server:
+        return
+    
     db.query(models.Server).filter(models.Server.id == server_id).delete()
     db.commit()
     
+    identity_cache.invalidate_server(server.uuid, server.id)
+    
     return
\ No newline at end of file
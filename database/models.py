@@ -63,6 +63,7 @@ class Tag(Base):
     __tablename__ = 'Tag'
     __table_args__ = (
         PrimaryKeyConstraint('id', name='Tag_pkey'),
+        Index('tag_name', 'name', unique=True)
     )
 
     id = mapped_column(BigInteger)
@@ -277,3 +278,98 @@ class TracepointPolicy(Base):
 
     container: Mapped['Container'] = relationship('Container', back_populates='TracepointPolicy')
     policy: Mapped['Policy'] = relationship('Policy', back_populates='TracepointPolicy')
+
+
+class SystemInfoRollup(Base):
+    __tablename__ = 'SystemInfoRollup'
+    __table_args__ = (
+        ForeignKeyConstraint(['server_id'], ['Server.id'], name='FK_SystemInfoRollup_Server'),
+        PrimaryKeyConstraint('server_id', 'unit', 'bucket', name='SystemInfoRollup_pkey')
+    )
+
+    server_id = mapped_column(BigInteger, nullable=False)
+    unit = mapped_column(String(10), nullable=False)
+    bucket = mapped_column(DateTime(True), nullable=False)
+    cnt = mapped_column(Integer, nullable=False)
+    stats = mapped_column(JSON, nullable=False)
+
+
+class ContainerSysInfoRollup(Base):
+    __tablename__ = 'ContainerSysInfoRollup'
+    __table_args__ = (
+        ForeignKeyConstraint(['container_id'], ['Container.id'], name='FK_ContainerSysInfoRollup_Container'),
+        PrimaryKeyConstraint('container_id', 'unit', 'bucket', name='ContainerSysInfoRollup_pkey')
+    )
+
+    container_id = mapped_column(BigInteger, nullable=False)
+    unit = mapped_column(String(10), nullable=False)
+    bucket = mapped_column(DateTime(True), nullable=False)
+    cnt = mapped_column(Integer, nullable=False)
+    stats = mapped_column(JSON, nullable=False)
+
+
+class RollupWatermark(Base):
+    __tablename__ = 'RollupWatermark'
+    __table_args__ = (
+        PrimaryKeyConstraint('name', name='RollupWatermark_pkey'),
+    )
+
+    name = mapped_column(String(100))
+    watermark = mapped_column(DateTime(True), nullable=False)
+
+
+class StreamEvent(Base):
+    __tablename__ = 'StreamEvent'
+    __table_args__ = (
+        PrimaryKeyConstraint('id', name='StreamEvent_pkey'),
+        Index('stream_event_created_at', 'created_at')
+    )
+
+    # NOTIFY 로 보내는 모든 스트림 이벤트의 id 도 이 시퀀스에서 발급
+    id = mapped_column(BigInteger, Sequence('streamEvent_id_seq'))
+    name = mapped_column(String(100), nullable=False)
+    key = mapped_column(String(255), nullable=False)
+    payload = mapped_column(JSON, nullable=False)
+    created_at = mapped_column(DateTime(True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+
+class AppliedPolicy(Base):
+    __tablename__ = 'AppliedPolicy'
+    __table_args__ = (
+        ForeignKeyConstraint(['server_id'], ['Server.id'], ondelete='CASCADE', name='FK_AppliedPolicy_Server'),
+        PrimaryKeyConstraint('server_id', name='AppliedPolicy_pkey'),
+    )
+
+    # 서버에 마지막으로 전달에 성공한 정책 (utils.policy_diff 문서와 해시)
+    server_id = mapped_column(BigInteger)
+    hash = mapped_column(String(64), nullable=False)
+    document = mapped_column(JSON, nullable=False)
+    applied_at = mapped_column(DateTime(True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+
+class PolicyTemplate(Base):
+    __tablename__ = 'PolicyTemplate'
+    __table_args__ = (
+        PrimaryKeyConstraint('id', name='PolicyTemplate_pkey'),
+        Index('policy_template_name', 'name', unique=True)
+    )
+
+    # selector 의 태그 조건에 맞는 모든 컨테이너에 rules 를 적용 (정책 컴파일 시점에 계산)
+    id = mapped_column(BigInteger)
+    name = mapped_column(String(255), nullable=False)
+    api_version = mapped_column(String(255), nullable=False)
+    selector = mapped_column(JSON, nullable=False)
+    rules = mapped_column(JSON, nullable=False)
+    created_at = mapped_column(DateTime(True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
+
+
+class AgentCapability(Base):
+    __tablename__ = 'AgentCapability'
+    __table_args__ = (
+        PrimaryKeyConstraint('uuid', name='AgentCapability_pkey'),
+    )
+
+    # 에이전트가 heartbeat 로 알린 정책 형식 (선호 순서)
+    uuid = mapped_column(String(255))
+    policy_formats = mapped_column(JSON, nullable=False)
+    updated_at = mapped_column(DateTime(True), nullable=False, server_default=text('CURRENT_TIMESTAMP'))
@@ -5,16 +5,55 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 
-# from database.database import engine
-# from database import models
+from core import config
+from database.database import engine, SessionLocal
+from database import models
+from crud import container_crud
 from routes import routers
+from routes.heartbeat_router import heartbeat_buffer, rollup_compactor, stream_fanout, stream_event_cleaner
+from routes.policy_route import apply_jobs
+from routes.container_route import tag_index_refresher
 
 API_VERSION = "v1"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # models.Base.metadata.create_all(bind=engine)
+    # 서버별로 마지막에 전달한 정책, 정책 템플릿, 에이전트 정책 형식 (기존 스키마에 없으므로 없을 때만 생성)
+    models.Base.metadata.create_all(bind=engine['project'], tables=[
+        models.AppliedPolicy.__table__,
+        models.PolicyTemplate.__table__,
+        models.AgentCapability.__table__
+    ])
+    # Tag.name 고유 인덱스 (기존 스키마에 없으므로 없을 때만 생성)
+    db = SessionLocal()
+    try:
+        container_crud.ensure_tag_name_index(db)
+    finally:
+        db.close()
+    await tag_index_refresher.start()
+    if config.HEARTBEAT_INGEST_MODE == "buffered":
+        await heartbeat_buffer.start()
+    if config.ROLLUP_ENABLED:
+        # rollup 테이블은 기존 스키마에 없으므로 없을 때만 생성
+        models.Base.metadata.create_all(bind=engine['project'], tables=[
+            models.SystemInfoRollup.__table__,
+            models.ContainerSysInfoRollup.__table__,
+            models.RollupWatermark.__table__
+        ])
+        await rollup_compactor.start()
+    if config.STREAM_FANOUT == "postgres":
+        models.Base.metadata.create_all(bind=engine['project'], tables=[models.StreamEvent.__table__])
+        await stream_fanout.start()
+        await stream_event_cleaner.start()
     yield
+    await stream_event_cleaner.stop()
+    await stream_fanout.stop()
+    await rollup_compactor.stop()
+    await tag_index_refresher.stop()
+    # 종료 전 버퍼에 남은 heartbeat 를 모두 저장
+    await heartbeat_buffer.stop()
+    apply_jobs.shutdown()
 
 app = FastAPI(root_path=f"/api/{API_VERSION}", lifespan=lifespan)
 
@@ -1,13 +1,16 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from starlette import status
 from sqlalchemy.orm import Session
 
-from database.database import get_db
+from core import config
+from database.database import get_db, SessionLocal
 
 from schema import container_schema
 from crud import container_crud
+from utils.periodic import PeriodicTask
+from utils.tag_index import TagIndex, parse_tag_expression
 
 
 router = APIRouter(
@@ -15,6 +18,27 @@ router = APIRouter(
     tags=["Container"]
 )
 
+# 태그 -> 컨테이너 id bitset 역색인 (GET /container/tag/query)
+tag_index = TagIndex()
+
+def rebuild_tag_index():
+    db = SessionLocal()
+    tag_index.begin_rebuild()
+    try:
+        tag_index.finish_rebuild(*container_crud.get_tag_index_rows(db))
+    except Exception:
+        tag_index.abort_rebuild()
+        raise
+    finally:
+        db.close()
+
+# 시작할 때 색인을 만들고, 다른 워커의 변경을 반영하기 위해 주기적으로 다시 만듦
+tag_index_refresher = PeriodicTask(
+    func=rebuild_tag_index,
+    interval_s=config.TAG_INDEX_REFRESH_S,
+    name="tag-index-refresh"
+)
+
 # Create
 @router.post("/")
 def add_container(data: container_schema.ContainerAddReq, db=Depends(get_db)) -> container_schema.ContainerAddRes:
@@ -32,19 +56,66 @@ def add_container(data: container_schema.ContainerAddReq, db=Depends(get_db)) ->
             HTTPException: 422 - 잘못된 요청
     """
     
-    return container_crud.add_container(db, data)
+    container = container_crud.add_container(db, data)
+    tag_index.add_containers([container.id])
+    return container
 
 # Read
+@router.get("/tag/query")
+def query_container_tag(q: str = Query(min_length=1, max_length=1000),
+                        limit: int = Query(default=1000, ge=1, le=100000),
+                        offset: int = Query(default=0, ge=0)) -> container_schema.TagQueryRes:
+    """
+    태그 식에 맞는 전체 서버의 컨테이너 id 를 반환합니다
+    DB 를 조회하지 않고 메모리의 태그 역색인에서 집합 연산으로 계산합니다.
+
+        Args:
+            q (str): 태그 식. AND, OR, NOT, 괄호를 사용할 수 있으며 우선순위는 NOT > AND > OR 입니다.
+                공백이나 키워드가 포함된 태그는 큰따옴표로 감쌉니다.
+                ex) prod AND (web OR api) AND NOT canary
+            limit (int): 최대 컨테이너 수 (1 ~ 100000)
+            offset (int): 건너뛸 컨테이너 수
+
+        Returns:
+            container_schema.TagQueryRes: 식에 맞는 전체 컨테이너 수와 id 순으로 정렬된 컨테이너 id 목록
+            
+        Raises:
+            HTTPException: 422 - 잘못된 태그 식
+            HTTPException: 503 - 태그 색인이 아직 준비되지 않음
+    """
+    try:
+        expression = parse_tag_expression(q)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    
+    if not tag_index.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Tag index is not ready")
+    
+    cnt, container_ids = tag_index.query(expression, offset, limit)
+    return container_schema.TagQueryRes(cnt=cnt, containers=container_ids)
+
 @router.get("/{server_id}")
-def container_info_to_server(server_id: int, db=Depends(get_db)) -> container_schema.ServerContainerInfoRes:
+def container_info_to_server(server_id: int,
+                             active: bool = False,
+                             runtime: str | None = None,
+                             tag: str | None = None,
+                             limit: int = Query(default=100, ge=1, le=1000),
+                             offset: int = Query(default=0, ge=0),
+                             db=Depends(get_db)) -> container_schema.ServerContainerInfoRes:
     """
     서버에 저장된 컨테이너 정보를 가져옵니다
+    컨테이너, 마지막 내부 id, 태그를 하나의 쿼리로 조회하며 id 순으로 limit 개씩 반환합니다.
 
         Args:
             server_id (int): servrer_id
+            active (bool): true 이면 삭제되지 않은(removed_at 이 없는) 컨테이너만
+            runtime (str, optional): 컨테이너 런타임
+            tag (str, optional): 이 태그가 붙은 컨테이너만
+            limit (int): 최대 컨테이너 수 (1 ~ 1000)
+            offset (int): 건너뛸 컨테이너 수
 
         Returns:
-            container_schema.ContainerInfo: 서버에 속한 컨테이너 정보
+            container_schema.ServerContainerInfoRes: 조건에 맞는 전체 컨테이너 수와 서버에 속한 컨테이너 정보
         
         Raises:
             HTTPException: 404 - 서버를 찾을 수 없음
@@ -52,7 +123,7 @@ def container_info_to_server(server_id: int, db=Depends(get_db)) -> container_sc
             HTTPException: 500 - 서버 내부 오류
     """
     
-    return container_crud.get_server_container_info(db, server_id)
+    return container_crud.get_server_container_info(db, server_id, limit, offset, active, runtime, tag)
 
 
 # Update
@@ -77,6 +148,7 @@ def update_container_tag(
             HTTPException: 500 - 서버 내부 오류
         """
     container_crud.update_container_tag(db, data)
+    tag_index.set_tags(data.containers, data.tags)
     return {"message": "Container tags updated successfully"}
 
 
@@ -98,6 +170,7 @@ def add_container_tag(data: container_schema.ContainerTagUpdate, db=Depends(get_
         HTTPException: 500 - 서버 내부 오류
         
     """
-    return container_crud.add_container_tag(db, data)
+    container_crud.add_container_tag(db, data)
+    tag_index.add_tags(data.containers, data.tags)
 
 # Delete
\ No newline at end of file
@@ -1,29 +1,91 @@
+import logging
 from typing import List
+from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from starlette import status
 from sqlalchemy.orm import Session
-from statistics import mean, median
 
 from schema.heartbeat_schema import TimeUnit, funcList
 from schema import server_schema, heartbeat_schema
-from database.database import get_db
-from crud import server_crud, heartbeat_crud
+from core import config
+from database.database import get_db, SessionLocal, DB_URL, engine
+from crud import server_crud, container_crud, heartbeat_crud, policy_crud, rollup_crud
+from utils import identity_cache
+from utils.broadcaster import Broadcaster, format_sse, SSE_KEEPALIVE, SSE_RESET
+from utils.heartbeat_buffer import HeartbeatBuffer
+from utils.heartbeat_stream import HeartbeatFilter
+from utils.periodic import PeriodicTask
+from utils.stream_fanout import PgNotifyFanout
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/heartbeat",
     tags=["Heartbeat"]
 )
 
-func_dict = {
-    funcList.MAX: max,
-    funcList.MEDIAN: median,
-    funcList.MEAN: mean
-}
+# /stream 구독자에게 heartbeat 를 전달하는 브로드캐스터
+heartbeat_broadcaster = Broadcaster(queue_size=config.STREAM_QUEUE_SIZE, history_size=config.STREAM_HISTORY_SIZE)
 
-queue = list()
+# STREAM_FANOUT 이 postgres 인 경우 모든 워커의 heartbeat_broadcaster 로 이벤트를 전달
+stream_fanout = PgNotifyFanout(
+    engine=engine['project'],
+    dsn=DB_URL,
+    broadcaster=heartbeat_broadcaster,
+    channel=config.STREAM_NOTIFY_CHANNEL,
+    max_bytes=config.STREAM_NOTIFY_MAX_BYTES,
+    queue_size=config.STREAM_PUBLISH_QUEUE_SIZE,
+    batch_size=config.STREAM_PUBLISH_BATCH_SIZE
+)
+
+stream_event_cleaner = PeriodicTask(
+    func=lambda: stream_fanout.delete_expired(config.STREAM_EVENT_RETENTION_S),
+    interval_s=config.STREAM_EVENT_RETENTION_S,
+    name="stream-event-cleanup"
+)
+
+def publish_heartbeat(heartbeat: heartbeat_schema.InfoReq):
+    payload = heartbeat.model_dump(mode="json")
+    if config.STREAM_FANOUT != "postgres":
+        heartbeat_broadcaster.publish("heartbeat", heartbeat.host_uuid, payload)
+        return
+    
+    try:
+        stream_fanout.publish("heartbeat", heartbeat.host_uuid, payload)
+    except Exception:
+        # 스트림 전달 실패로 heartbeat 수신이 실패하지 않도록 기록만 함
+        logger.exception("Failed to publish heartbeat to stream")
+
+def flush_heartbeats(entries: list[heartbeat_schema.HeartbeatEntry]):
+    db = SessionLocal()
+    try:
+        heartbeat_crud.add_heartbeats(db, entries)
+    finally:
+        db.close()
+
+heartbeat_buffer = HeartbeatBuffer(
+    flush=flush_heartbeats,
+    maxsize=config.HEARTBEAT_BUFFER_SIZE,
+    flush_interval_ms=config.HEARTBEAT_FLUSH_INTERVAL_MS,
+    batch_size=config.HEARTBEAT_FLUSH_BATCH_SIZE,
+    max_retries=config.HEARTBEAT_FLUSH_MAX_RETRIES
+)
+
+def compact_rollups():
+    db = SessionLocal()
+    try:
+        rollup_crud.compact_rollups(db)
+    finally:
+        db.close()
+
+rollup_compactor = PeriodicTask(
+    func=compact_rollups,
+    interval_s=config.ROLLUP_COMPACT_INTERVAL_S,
+    name="rollup-compaction"
+)
 
 @router.get("/server/{server_id}")
 def get_server_stats(server_id: int, unit:heartbeat_schema.TimeUnit, 
@@ -45,8 +107,8 @@ def get_server_stats(server_id: int, unit:heartbeat_schema.TimeUnit,
             HTTPException: 500 - 서버 내부 오류
 
         Returns:
-            dict: 서버의 상태 정보를 반환합니다.
-            ex)
+            dict: 서버의 상태 정보를 cpu, network, memory, disk 별로 반환합니다. 집계는 DB 에서 수행됩니다.
+            ex) cpu
             [
                 {
                     "time": "2024-11-06T00:00:00+09:00",
@@ -84,15 +146,14 @@ def get_server_stats(server_id: int, unit:heartbeat_schema.TimeUnit,
     if unit not in TimeUnit:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid time unit")
 
-    return heartbeat_crud.get_server_stats(db, server_id, unit.value, func_dict[function_name])
+    return heartbeat_crud.get_server_stats(db, server_id, unit.value, function_name)
 
 
 @router.get("/container/{container_id}")
 def get_container_stats(container_id: int, unit:heartbeat_schema.TimeUnit, 
                     function_name: heartbeat_schema.funcList, db: Session=Depends(get_db)):
     """
-    (작업중 변경 사항 발생 가능성 있음)
-    컨테이너의 상태 정보를 반환합니다.
+    컨테이너의 상태 정보(cpu, memory, disk, network, proc_cnt)를 반환합니다.
 
         Args:
             container_id (int): 컨테이너의 id를 입력합니다.
@@ -101,12 +162,20 @@ def get_container_stats(container_id: int, unit:heartbeat_schema.TimeUnit,
             db (_type_, optional): 서버에서 DI하는 정보입니다. Defaults to Depends(get_db).
             
         Returns:
-            server_schema.ContainerInfo: 컨테이너의 상태 정보를 반환합니다.
+            dict: 지표별 시간순 집계 결과를 반환합니다.
+            ex)
+            {
+                "cpu": [{"time": "2024-11-06T00:00:00+09:00", "percent": 12.5}],
+                "memory": [{"time": "2024-11-06T00:00:00+09:00", "usage_mb": 512.0, "percent": 25.0}],
+                "disk": [{"time": "2024-11-06T00:00:00+09:00", "read_mb": 1.2, "write_mb": 0.4}],
+                "network": [{"time": "2024-11-06T00:00:00+09:00", "recv_mb": 3.1, "sent_mb": 2.7}],
+                "proc_cnt": [{"time": "2024-11-06T00:00:00+09:00", "value": 14}]
+            }
         
         Raises:
             HTTPException: 404 - 컨테이너를 찾을 수 없음
     """
-    container = server_crud.get_container_info(db, container_id)
+    container = container_crud.get_container(db, container_id)
     if not container:
         raise HTTPException(status_code=404, detail="Container not found")
     
@@ -116,7 +185,7 @@ def get_container_stats(container_id: int, unit:heartbeat_schema.TimeUnit,
     if unit not in TimeUnit:
         raise HTTPException(status_code=422, detail="Invalid time unit")
     
-    return heartbeat_crud.get_container_stats(db, container_id, unit.value, func_dict[function_name])
+    return heartbeat_crud.get_container_stats(db, container_id, unit.value, function_name)
 
 
 
@@ -124,6 +193,8 @@ def get_container_stats(container_id: int, unit:heartbeat_schema.TimeUnit,
 def add_heartbeat(req: Request, heartbeat: heartbeat_schema.InfoReq, db:Session=Depends(get_db)) -> str:
     """
     서버의 현재 상태를 기록합니다.
+    HEARTBEAT_INGEST_MODE 가 buffered 인 경우 버퍼에 추가한 뒤 바로 응답하며, 저장은 백그라운드에서 일괄 처리됩니다.
+    (Session 은 실제 쿼리 시점에 커넥션을 가져오므로 buffered 모드에서는 DB 커넥션을 점유하지 않습니다.)
 
         Args:
             heartbeat (heartbeat_schema.Heartbeat): 서버의 상태 정보로 ip, status를 포함합니다.
@@ -135,35 +206,138 @@ def add_heartbeat(req: Request, heartbeat: heartbeat_schema.InfoReq, db:Session=
         Raises:
             HTTPException: 422 - 잘못된 요청
             HTTPException: 500 - 서버 내부 오류
+            HTTPException: 503 - 버퍼가 가득 참 (buffered 모드)
     """
-    heartbeat_crud.add_heartbeat(db, req, heartbeat)
-    queue.append(heartbeat)
+    if config.HEARTBEAT_INGEST_MODE == "buffered":
+        accepted = heartbeat_buffer.put(heartbeat_schema.HeartbeatEntry(
+            req_ip=req.client.host,
+            received_at=datetime.now().astimezone(),
+            heartbeat=heartbeat
+        ))
+        if not accepted:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Heartbeat buffer is full",
+                headers={"Retry-After": "1"}
+            )
+    else:
+        heartbeat_crud.add_heartbeat(db, req, heartbeat)
+    publish_heartbeat(heartbeat)
+    
+    try:
+        # 정책 형식이 바뀐 경우에만 저장
+        policy_crud.remember_policy_formats(db, heartbeat.host_uuid, heartbeat.policy_formats)
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to save policy formats of %s", heartbeat.host_uuid)
     
     return {"req_ip": req.client.host}
 
+@router.get("/metrics", response_model=dict)
+def get_ingest_metrics() -> dict:
+    """
+    heartbeat 버퍼의 상태를 반환합니다.
+
+        Returns:
+            dict: 수신/저장/실패 건수, 마지막/최대/평균 flush 소요 시간(ms), 배치 크기, 대기 중인 heartbeat 수,
+                  식별자 캐시의 크기와 hit/miss 횟수, 스트림 구독자 수와 버려진 이벤트 수
+    """
+    return {
+        "mode": config.HEARTBEAT_INGEST_MODE,
+        **heartbeat_buffer.metrics(),
+        "identity_cache": identity_cache.stats(),
+        "stream": {
+            "fanout": config.STREAM_FANOUT,
+            **heartbeat_broadcaster.stats(),
+            **(stream_fanout.stats() if config.STREAM_FANOUT == "postgres" else {})
+        }
+    }
+
+def build_stream_filter(server: list[int] | None, container: list[str] | None,
+                        tag: list[str] | None, fields: list[str] | None) -> HeartbeatFilter | None:
+    if not (server or container or tag or fields):
+        return None
+    
+    for field in fields or []:
+        if field.split(".")[0] not in heartbeat_schema.InfoReq.model_fields:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Unknown field: {field}")
+    
+    host_uuids = container_keys = None
+    if server or tag:
+        db = SessionLocal()
+        try:
+            if server:
+                host_uuids = set(server_crud.get_server_uuids(db, server))
+            if tag:
+                container_keys = container_crud.get_container_keys_by_tags(db, tag)
+        finally:
+            db.close()
+    
+    return HeartbeatFilter(
+        host_uuids=host_uuids,
+        container_names=set(container) if container else None,
+        container_keys=container_keys,
+        fields=fields
+    )
+
 # Read server stats info with streaming
 @router.get("/stream", response_class=StreamingResponse)
-async def get_server_stats():
+async def stream_heartbeat(request: Request,
+                           server: list[int] | None = Query(None),
+                           container: list[str] | None = Query(None),
+                           tag: list[str] | None = Query(None),
+                           fields: list[str] | None = Query(None),
+                           max_rate: float | None = Query(None, gt=0)):
     """
-        서버와 내부의 컨테이너의 상태 정보를 스트리밍합니다.
+        서버와 내부의 컨테이너의 상태 정보를 SSE(Server-Sent Events)로 스트리밍합니다.
+        
+        heartbeat 가 수신될 때마다 `event: heartbeat` 이벤트를 전송하며,
+        이벤트가 없을 때는 STREAM_KEEPALIVE_S 초마다 keepalive 주석을 전송합니다.
+        구독자가 느려 큐(STREAM_QUEUE_SIZE)가 가득 차면 가장 오래된 이벤트부터 버립니다.
+        
+        max_rate 를 지정하면 서버별로 초당 max_rate 번까지만 전송하며, 그 사이에 들어온 heartbeat 는 가장 최신 것만 전송합니다.
+        서버/태그 조건은 구독 시점에 한 번만 조회합니다.
+        
+        재연결 시 `Last-Event-ID` 헤더를 보내면 그 이후의 이벤트(최근 STREAM_HISTORY_SIZE 개 이내)를 먼저 전송합니다.
+        놓친 이벤트가 이미 보관 범위를 벗어났다면 `event: reset` 을 먼저 전송하므로, 클라이언트는 이때만 통계를 다시 조회하면 됩니다.
         
         Args:
-            None
+            server (list[int], optional): 받을 서버의 id 목록
+            container (list[str], optional): 받을 컨테이너 이름 목록
+            tag (list[str], optional): 받을 컨테이너의 태그 목록 (container 와 합집합)
+            fields (list[str], optional): 받을 필드 목록 (예: host.cpu, containers.stats.memory). host_uuid, timestamp 는 항상 포함됩니다.
+            max_rate (float, optional): 서버별 초당 최대 전송 횟수
         
         Returns:
             StreamingResponse: 서버와 내부 컨테이너 상태 정보를 스트리밍합니다.
         
         Raises:
-            None
+            HTTPException: 알 수 없는 필드를 지정한 경우 (422)
     """
-    def generate():
-        while True:
-            if queue:
-                print("tast")
-                yield f"{str(queue.pop().__dict__)}"
-            else:
-                yield ""
+    event_filter = await run_in_threadpool(build_stream_filter, server, container, tag, fields)
+    last_event_id = request.headers.get("last-event-id")
+    subscription = heartbeat_broadcaster.subscribe(
+        event_filter,
+        1 / max_rate if max_rate else 0,
+        int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    )
+    
+    async def generate():
+        try:
+            yield f"retry: {config.STREAM_RETRY_MS}\n\n"
+            if not subscription.resumed:
+                yield SSE_RESET
+            while not await request.is_disconnected():
+                event = await subscription.get(config.STREAM_KEEPALIVE_S)
+                yield format_sse(event) if event else SSE_KEEPALIVE
+        finally:
+            heartbeat_broadcaster.unsubscribe(subscription)
+    
     return StreamingResponse(
         generate(),
-        media_type="text/event-stream"
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
     )
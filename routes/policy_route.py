@@ -1,21 +1,100 @@
+import json
 import os
-from typing import List
+from typing import BinaryIO, List
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from starlette import status
 from sqlalchemy.orm import Session
 from pydantic_yaml import parse_yaml_raw_as, to_yaml_str
 from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
 
-from database.database import get_db
+from core import config
+from database.database import get_db, SessionLocal
 from schema import policy_schema
-from crud import policy_crud
+from crud import policy_crud, server_crud
+from utils.apply_jobs import ApplyJobManager
+from utils.policy_stream import iter_policy_batches, spool_policy_upload
 
 router = APIRouter(
     prefix="/policy",
     tags=["Policy"]
 )
 
+def prepare_apply_targets(data: policy_schema.PolicyApplyReq):
+    # 작업 스레드에서 실행되므로 별도 세션을 사용하고, 에이전트에 요청하기 전에 닫음
+    db = SessionLocal()
+    try:
+        return policy_crud.prepare_policy_targets(db, data)
+    finally:
+        db.close()
+
+def push_apply_target(server_id: int, target: policy_crud.PolicyTarget) -> dict:
+    result = policy_crud.push_policy_target(target)
+    if result["status"] == "success":
+        # 다음 전달 때 바뀐 부분만 보낼 수 있도록 전달한 정책을 저장
+        db = SessionLocal()
+        try:
+            policy_crud.record_applied_policy(db, server_id, target)
+        finally:
+            db.close()
+    return result
+
+apply_jobs = ApplyJobManager(
+    prepare=prepare_apply_targets,
+    push=push_apply_target,
+    workers=config.POLICY_APPLY_JOB_WORKERS,
+    concurrency=config.POLICY_APPLY_CONCURRENCY,
+    max_jobs=config.POLICY_APPLY_JOB_HISTORY
+)
+
+def submit_apply_job(data: policy_schema.PolicyApplyReq, request: Request, response: Response) -> dict:
+    job = apply_jobs.submit(data)
+    response.headers["Location"] = str(request.url_for("get_apply_job", job_id=job.id))
+    return job.snapshot()
+
+def ndjson(message: dict) -> str:
+    return json.dumps(message, ensure_ascii=False, default=str) + "\n"
+
+def stream_policy_upload(spool: BinaryIO, policy_id: int):
+    # 응답을 보내는 동안 사용하므로 요청의 세션 대신 별도 세션을 사용
+    db = SessionLocal()
+    total = error_count = 0
+    try:
+        for read, batch, errors in iter_policy_batches(spool, config.POLICY_UPLOAD_BATCH_SIZE):
+            failed = {}
+            if batch:
+                failed, validation_errors = policy_crud.add_policy_batch(db, policy_id, batch)
+                errors = errors + validation_errors
+            total += read
+            error_count += len(errors)
+            yield ndjson({
+                "event": "batch",
+                "read": read,
+                "total": total,
+                "failed": policy_schema.ContainerPolicyCreateRes(containers=failed).model_dump()["containers"],
+                "errors": errors
+            })
+        yield ndjson({"event": "done", "policy_id": policy_id, "total": total, "errors": error_count})
+    except HTTPException as e:
+        yield ndjson({"event": "error", "total": total, "detail": e.detail})
+    except Exception as e:
+        # 이미 저장된 batch 는 유지되고 실패한 batch 만 취소됨
+        yield ndjson({"event": "error", "total": total, "detail": str(e)})
+    finally:
+        db.close()
+        spool.close()
+
+def cached_policy_response(request: Request, response: Response, compiled: policy_crud.CompiledPolicy):
+    # 클라이언트가 가진 정책과 같으면 본문 없이 304 반환
+    if request.headers.get("if-none-match") == compiled.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": compiled.etag})
+    
+    response.headers["ETag"] = compiled.etag
+    return compiled.policies
+
 # Create
 @router.post("/custom", status_code=status.HTTP_201_CREATED, response_model=policy_schema.ContainerPolicyCreateRes)
 def create_policy(policy: policy_schema.ServerPolicy, db: Session = Depends(get_db)):
@@ -57,22 +136,120 @@ async def create_upload_policy(file: UploadFile, db: Session = Depends(get_db)):
     
     return {"containers": policy_crud.create_custom_policy(db, policy)}
 
-@router.post("/apply/{server_id}")
-def apply_policy(server_id: int, db: Session=Depends(get_db)):
+@router.post(
+    "/upload/stream",
+    response_class=StreamingResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {"application/yaml": {"schema": {"type": "string"}}}}}
+)
+async def create_upload_policy_stream(request: Request, db: Session = Depends(get_db)):
     """
-    정책을 server_id 서버에 전달합니다.
+    Create a custom policy using a large yaml.
+    
+    요청 본문으로 정책 yaml 을 그대로 받습니다. (multipart 가 아님)
+    containers 항목을 읽는 대로 POLICY_UPLOAD_BATCH_SIZE 개씩 검사하고 저장하며, batch 마다 진행 상황을 NDJSON 으로 보냅니다.
+    batch 별로 commit 하므로 도중에 실패해도 앞서 저장된 batch 는 유지됩니다.
+    검사에 실패한 컨테이너는 저장하지 않고 errors 에 담습니다.
+
+        Args:
+            request (Request): 정책 yaml 본문 (containers 는 블록 형식의 목록)
 
-    Args:
-        server_id (int): 정책을 전달 받을 서버의 id
-        db (Session, optional): Defaults to Depends(get_db).
+        Returns:
+            StreamingResponse: {"event": "batch", "read", "total", "failed", "errors"} 를 batch 마다,
+                마지막에 {"event": "done", "policy_id", "total", "errors"} 또는 {"event": "error", "total", "detail"}
+            
+        Raises:
+            HTTPException: 409 Conflict : 기존 정책이 존재하는 경우
+            HTTPException: 422 - 잘못된 요청 (name, api_version 이 없거나 yaml 형식이 잘못된 경우)
+            HTTPException: 500 - 서버 내부 오류
     """
-    return policy_crud.apply_policy(db, server_id)
+    try:
+        spool, header = await spool_policy_upload(request.stream())
+    except (ValueError, YAMLError) as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    
+    try:
+        if not isinstance(header.get("name"), str) or not isinstance(header.get("api_version"), str):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="name and api_version are required")
+        
+        policy_id = await run_in_threadpool(policy_crud.create_empty_policy, db, header["name"], header["api_version"])
+    except Exception:
+        spool.close()
+        raise
+    
+    return StreamingResponse(stream_policy_upload(spool, policy_id), media_type="application/x-ndjson")
+
+@router.post("/apply/{server_id}", status_code=status.HTTP_202_ACCEPTED, response_model=policy_schema.ApplyJobRes)
+def apply_policy(server_id: int, request: Request, response: Response, db: Session=Depends(get_db)):
+    """
+    정책을 server_id 서버에 전달하는 작업을 등록합니다.
+    전달은 백그라운드에서 진행되며, 진행 상태는 GET /policy/apply/jobs/{job_id} 로 확인합니다.
+
+        Args:
+            server_id (int): 정책을 전달 받을 서버의 id
+            db (Session, optional): Defaults to Depends(get_db).
+
+        Returns:
+            policy_schema.ApplyJobRes: 등록된 작업
+            
+        Raises:
+            HTTPException: 404 Not Found : 서버가 존재하지 않는 경우
+            HTTPException: 422 - 잘못된 요청
+            HTTPException: 500 - 서버 내부 오류
+    """
+    if not server_crud.get_server(db, server_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Server not found")
+    
+    return submit_apply_job(policy_schema.PolicyApplyReq(server_ids=[server_id]), request, response)
+
+@router.post("/apply", status_code=status.HTTP_202_ACCEPTED, response_model=policy_schema.ApplyJobRes)
+def apply_policies(data: policy_schema.PolicyApplyReq, request: Request, response: Response):
+    """
+    정책을 여러 서버에 전달하는 작업을 등록합니다.
+    
+    전달은 백그라운드에서 진행되며, 진행 상태는 GET /policy/apply/jobs/{job_id} 로 확인합니다.
+    모든 작업을 합쳐 POLICY_APPLY_CONCURRENCY 개의 서버까지 동시에 요청하며, 서버별로 timeout 과 재시도를 적용합니다.
+    일부 서버에 전달하지 못해도 나머지 서버에는 전달합니다.
+    마지막으로 전달한 정책과 같은 서버는 건너뛰고(skipped), 달라진 서버에는 바뀐 부분만 보냅니다(delta).
+
+        Args:
+            data (policy_schema.PolicyApplyReq): 정책을 전달할 서버 id 목록 또는 태그
+
+        Returns:
+            policy_schema.ApplyJobRes: 등록된 작업
+            
+        Raises:
+            HTTPException: 422 - 잘못된 요청
+            HTTPException: 500 - 서버 내부 오류
+    """
+    return submit_apply_job(data, request, response)
+
+@router.get("/apply/jobs/{job_id}", response_model=policy_schema.ApplyJobRes)
+def get_apply_job(job_id: str):
+    """
+    정책 전달 작업의 상태를 반환합니다. 서버별 상태, 시도 횟수, 소요 시간을 포함합니다.
+    (작업 정보는 작업을 등록한 워커에 최근 POLICY_APPLY_JOB_HISTORY 개까지 보관됩니다)
+
+        Args:
+            job_id (str): 작업 id
+
+        Returns:
+            policy_schema.ApplyJobRes: 작업 상태
+            
+        Raises:
+            HTTPException: 404 Not Found : 작업이 존재하지 않는 경우
+    """
+    job = apply_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    
+    return job.snapshot()
 
 # Read
 @router.get("/server/{server_id}", response_model=policy_schema.PolicyRes)
-def get_server_policy(server_id: int, db: Session = Depends(get_db)) -> policy_schema.ServerPolicy:
+def get_server_policy(server_id: int, request: Request, response: Response, db: Session = Depends(get_db)) -> policy_schema.PolicyRes:
     """
     Get the policy applied to the server.
+    응답의 ETag 를 If-None-Match 헤더로 보내면 정책이 바뀌지 않은 경우 304 를 반환합니다.
 
         Args:
             server_id (int): 정책을 조회할 서버의 id
@@ -86,12 +263,13 @@ def get_server_policy(server_id: int, db: Session = Depends(get_db)) -> policy_s
             HTTPException: 422 - 잘못된 요청
             HTTPException: 500 - 서버 내부 오류
     """
-    return policy_crud.get_server_policy(db, server_id)
+    return cached_policy_response(request, response, policy_crud.get_compiled_server_policy(db, server_id))
 
 @router.get("/container/{container_id}", response_model=policy_schema.PolicyRes)
-def get_container_policy(container_id: int, db: Session = Depends(get_db)) -> policy_schema.ContainerPolicy:
+def get_container_policy(container_id: int, request: Request, response: Response, db: Session = Depends(get_db)) -> policy_schema.PolicyRes:
     """
     Get the policy applied to the container.
+    응답의 ETag 를 If-None-Match 헤더로 보내면 정책이 바뀌지 않은 경우 304 를 반환합니다.
 
         Args:
             container_id (int): 정책을 조회할 컨테이너의 id
@@ -105,7 +283,55 @@ def get_container_policy(container_id: int, db: Session = Depends(get_db)) -> po
             HTTPException: 422 - 잘못된 요청
             HTTPException: 500 - 서버 내부 오류
     """
-    return policy_crud.get_container_policy(db, container_id)
+    return cached_policy_response(request, response, policy_crud.get_compiled_container_policy(db, container_id))
+
+@router.post("/template", status_code=status.HTTP_201_CREATED, response_model=policy_schema.PolicyTemplateRes)
+def create_policy_template(template: policy_schema.PolicyTemplateCreate, db: Session = Depends(get_db)):
+    """
+    태그 조건에 맞는 컨테이너에 적용되는 정책 템플릿을 추가합니다.
+    템플릿은 컨테이너별로 저장하지 않고 서버/컨테이너 정책을 컴파일할 때 컨테이너의 태그로 적용 여부를 판단합니다.
+
+        Args:
+            template (policy_schema.PolicyTemplateCreate): 추가할 정책 템플릿
+            db (Session, optional): Defaults to Depends(get_db).
+
+        Returns:
+            policy_schema.PolicyTemplateRes: 추가된 정책 템플릿
+            
+        Raises:
+            HTTPException: 409 Conflict : 같은 이름의 템플릿이 존재하는 경우
+            HTTPException: 422 - 잘못된 요청
+            HTTPException: 500 - 서버 내부 오류
+    """
+    return policy_crud.create_policy_template(db, template)
+
+@router.get("/template", response_model=List[policy_schema.PolicyTemplateRes])
+def get_policy_templates(db: Session = Depends(get_db)):
+    """
+    정책 템플릿 목록을 반환합니다.
+
+        Args:
+            db (Session, optional): Defaults to Depends(get_db).
+
+        Returns:
+            List[policy_schema.PolicyTemplateRes]: 정책 템플릿 목록
+    """
+    return policy_crud.get_policy_templates(db)
+
+@router.delete("/template/{template_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_policy_template(template_id: int, db: Session = Depends(get_db)):
+    """
+    정책 템플릿을 삭제합니다. 이후 컴파일되는 정책에서 제외됩니다.
+
+        Args:
+            template_id (int): 삭제할 정책 템플릿의 id
+            db (Session, optional): Defaults to Depends(get_db).
+            
+        Raises:
+            HTTPException: 404 Not Found : 템플릿이 존재하지 않는 경우
+            HTTPException: 500 - 서버 내부 오류
+    """
+    policy_crud.delete_policy_template(db, template_id)
 
 @router.get("/")
 def get_policy_list(db: Session = Depends(get_db)):
@@ -124,19 +350,35 @@ def get_policy_list(db: Session = Depends(get_db)):
     return policy_crud.get_policy_list(db)
 
 @router.get("/{policy_id}", response_model=policy_schema.ServerPolicy)
-def get_policy_by_policy_id(policy_name: str, db: Session = Depends(get_db)):
-    return policy_crud.get_policy_by_policy_id(db, policy_name)
+def get_policy_by_policy_id(policy_id: int, db: Session = Depends(get_db)):
+    """
+    Get the policy by policy id.
+
+        Args:
+            policy_id (int): 조회할 정책의 id
+            db (Session, optional): Defaults to Depends(get_db).
+
+        Returns:
+            policy_schema.ServerPolicy: 정책이 적용된 컨테이너별 정책
+            
+        Raises:
+            HTTPException: 404 Not Found : 정책이 존재하지 않는 경우
+            HTTPException: 422 - 잘못된 요청
+            HTTPException: 500 - 서버 내부 오류
+    """
+    return policy_crud.get_policy_by_policy_id(db, policy_id)
 
 
 # @router.patch("/rawtp/{server_id}/{container_id}")
 # def update_raw_tracepoint(server_id: int, container_id: int):
 #     return {"container": container_id}
 
-@router.post("/conflict/{server_id}")
+@router.post("/conflict/{server_id}", response_model=policy_schema.PolicyConflictRes)
 def check_conflict(server_id: int, policy: policy_schema.ServerPolicy, db: Session = Depends(get_db)):
     """
-    (작업중 변경 사항 발생 가능성 있음)
     입력된 정책이 해당 서버에 기존 적용된 정책과 충돌하는지 확인합니다.
+    같은 컨테이너에서 대상(파일 경로의 상위/하위 경로, 같은 protocol/port 의 겹치는 IP 대역, 같은 comm)이 겹치지만
+    flags 나 uid 가 다른 규칙을 충돌로 판단합니다.
 
         Args:
             server_id (int): 비교를 진행할 서버의 id
@@ -144,39 +386,60 @@ def check_conflict(server_id: int, policy: policy_schema.ServerPolicy, db: Sessi
             db (Session, optional): Defaults to Depends(get_db).
 
         Returns:
-            dict: 충돌하는 기존 정책 목록 - 작업 중
+            policy_schema.PolicyConflictRes: 충돌 여부와 충돌하는 기존 규칙 목록
         
         Raises:
             HTTPException: 404 Not Found : 서버가 존재하지 않는 경우
-            HTTPException: 409 Conflict : 정책이 충돌하는 경우
             HTTPException: 422 - 잘못된 요청
             HTTPException: 500 - 서버 내부 오류
     """
-    
-    return policy_crud.check_conflict(db, server_id)
+    return policy_crud.check_conflict(db, server_id, policy)
 
 
-@router.post("/conflict/{server_id}/{container_id}")
-def check_conflict(server_id: int, container_id: int, db: Session = Depends(get_db)):
+@router.post("/conflict/{server_id}/{container_id}", response_model=policy_schema.PolicyConflictRes)
+def check_container_conflict(server_id: int, container_id: int, policy: policy_schema.ServerPolicy,
+                             db: Session = Depends(get_db)):
     """
-    (작업 전 변동사항 있을 수 있음음)
-    Check if the input policy conflicts with the existing policy applied to the server.
+    Check if the input policy conflicts with the existing policy applied to the container.
+    입력된 정책의 모든 컨테이너 규칙을 해당 컨테이너의 기존 규칙과 비교합니다.
 
         Args:
             server_id (int): 정책을 비교할 서버의 id
             container_id (int): 정책을 비교할 컨테이너의 id
+            policy (policy_schema.ServerPolicy): 비교할 정책
             db (Session, optional): Defaults to Depends(get_db).
 
         Returns:
-            dict: 충돌하는 기존 정책 목록
+            policy_schema.PolicyConflictRes: 충돌 여부와 충돌하는 기존 규칙 목록
             
         Raises:
             HTTPException: 404 Not Found : 서버 또는 컨테이너가 존재하지 않는 경우
-            HTTPException: 409 Conflict : 정책이 충돌하는 경우
             HTTPException: 422 - 잘못된 요청
             HTTPException: 500 - 서버 내부 오류
     """
-    return policy_crud.check_conflict(db, server_id, container_id)
+    return policy_crud.check_conflict(db, server_id, policy, container_id)
+
+
+@router.post("/evaluate/{container_id}", response_model=policy_schema.PolicyEvaluateRes)
+def evaluate_policy(container_id: int, data: policy_schema.PolicyEvaluateReq, db: Session = Depends(get_db)):
+    """
+    컨테이너에 적용된 정책으로 이벤트 목록을 평가합니다.
+    이벤트마다 일치하는 규칙과 결과(block, trace, allow)를 반환하며, 파일은 가장 깊은 경로, 네트워크는 가장 긴 prefix 의 규칙이 우선합니다.
+
+        Args:
+            container_id (int): 정책을 평가할 컨테이너의 id
+            data (policy_schema.PolicyEvaluateReq): 평가할 이벤트 목록
+            db (Session, optional): Defaults to Depends(get_db).
+
+        Returns:
+            policy_schema.PolicyEvaluateRes: 이벤트별 평가 결과 (요청 순서와 같음)
+            
+        Raises:
+            HTTPException: 404 Not Found : 컨테이너가 존재하지 않는 경우
+            HTTPException: 422 - 잘못된 요청 (이벤트 종류에 필요한 필드가 없는 경우 포함)
+            HTTPException: 500 - 서버 내부 오류
+    """
+    return policy_crud.evaluate_policy(db, container_id, data.events)
 
 
 # # Update
@@ -36,3 +36,7 @@ class ServerContainerInfoRes(BaseModel):
 class ContainerTagUpdate(BaseModel):
     tags: list[str]
     containers: list[int]
+
+class TagQueryRes(BaseModel):
+    cnt: int
+    containers: list[int] = []
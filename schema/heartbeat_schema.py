@@ -13,6 +13,7 @@ class funcList(Enum):
     MEAN = 'mean'
     MEDIAN = 'median'
     MAX = "max"
+    P95 = "p95"
 
 class ContainerCpu(BaseModel):
     kernel_usage: float
@@ -99,3 +100,11 @@ class InfoReq(BaseModel):
     host_uuid: str
     policy_endpoint: str
     timestamp: datetime
+    # 에이전트가 받을 수 있는 정책 형식 (선호 순서, 예: ["bundle-v1", "yaml", "delta-v1"]). 없으면 yaml
+    # delta-v1 을 알린 에이전트에만 바뀐 부분을 보냄
+    policy_formats: list[str] | None = None
+
+class HeartbeatEntry(BaseModel):
+    req_ip: str
+    received_at: datetime
+    heartbeat: InfoReq
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -84,4 +86,132 @@ class ContainerPolicyCreateRes(BaseModel):
             )
         return cls(containers=containers)
 
-    
+class TagSelector(BaseModel):
+    """
+    정책 템플릿을 적용할 컨테이너의 태그 조건 (모든 조건을 만족해야 함)
+
+    all_of: list[str] - 모두 붙어 있어야 하는 태그
+    any_of: list[str] - 하나 이상 붙어 있어야 하는 태그 (비어 있으면 조건 없음)
+    none_of: list[str] - 붙어 있으면 안 되는 태그
+    """
+    all_of: list[str] = []
+    any_of: list[str] = []
+    none_of: list[str] = []
+
+class PolicyTemplateRules(BaseModel):
+    raw_tp: str
+    tracepoint_policy: TracepointPolicy
+    lsm_policies: LSMPolicies
+
+class PolicyTemplateCreate(BaseModel):
+    """
+    태그 조건에 맞는 컨테이너에 적용되는 정책 템플릿
+
+    selector 의 조건이 모두 비어 있으면 모든 컨테이너에 적용됩니다.
+    """
+    api_version: str
+    name: str
+    selector: TagSelector
+    rules: PolicyTemplateRules
+
+class PolicyTemplateRes(PolicyTemplateCreate):
+    id: int
+    created_at: datetime
+
+class PolicyConflict(BaseModel):
+    """
+    새 규칙과 충돌하는 기존 규칙
+
+    type: str - file, network, process
+    rule - 새 정책의 규칙
+    policy_name: str - 기존 규칙이 속한 정책 이름
+    existing - 기존 규칙
+    """
+    container_name: str
+    type: str
+    rule: LSMFilePolicy | LSMNetworkPolicy | LSMProcessPolicy
+    policy_name: str
+    existing: LSMFilePolicy | LSMNetworkPolicy | LSMProcessPolicy
+
+class PolicyConflictRes(BaseModel):
+    conflict: bool
+    conflicts: list[PolicyConflict] = []
+
+class PolicyEvent(BaseModel):
+    """
+    정책 평가에 사용할 이벤트
+
+    type: str - file (path), network (ip, port, protocol), process (comm), tracepoint (tracepoint)
+    uid: int | None - 이벤트를 발생시킨 uid (없으면 uid 와 관계없이 평가)
+    flag: str | None - 이벤트의 동작 (없으면 동작과 관계없이 평가)
+    """
+    type: Literal["file", "network", "process", "tracepoint"]
+    path: str | None = None
+    ip: str | None = None
+    port: int | None = None
+    protocol: int | None = None
+    comm: str | None = None
+    tracepoint: str | None = None
+    uid: int | None = None
+    flag: str | None = None
+
+class PolicyEvaluateReq(BaseModel):
+    events: list[PolicyEvent]
+
+class PolicyDecision(BaseModel):
+    """
+    이벤트 평가 결과
+
+    decision: str - block (LSM 규칙과 일치), trace (tracepoint 와 일치), allow
+    policy_name: str | None - 일치한 규칙이 속한 정책 이름
+    rule - 일치한 규칙
+    """
+    decision: str
+    policy_name: str | None = None
+    rule: LSMFilePolicy | LSMNetworkPolicy | LSMProcessPolicy | str | None = None
+
+class PolicyEvaluateRes(BaseModel):
+    results: list[PolicyDecision]
+
+class PolicyApplyReq(BaseModel):
+    """
+    정책을 전달할 서버 목록
+
+    server_ids: list[int] - 서버 id 목록
+    tag: str | None - 이 태그가 붙은 컨테이너가 있는 서버 (server_ids 와 합집합)
+    """
+    server_ids: list[int] = []
+    tag: str | None = None
+
+class ServerApplyState(BaseModel):
+    """
+    서버별 정책 전달 상태
+
+    state: str - queued, running, success, failed, skipped (마지막으로 전달한 정책과 같은 경우)
+    mode: str | None - full (전체 정책), delta (바뀐 부분만)
+    format: str | None - 전체 정책을 보낸 형식 (yaml, bundle-v1)
+    """
+    state: str
+    mode: str | None = None
+    format: str | None = None
+    attempts: int = 0
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    elapsed_ms: float | None = None
+    status_code: int | None = None
+    response: dict | list | str | None = None
+    error: str | None = None
+
+class ApplyJobRes(BaseModel):
+    """
+    정책 전달 작업 상태
+
+    state: str - queued, running, done, failed (서버 목록을 준비하지 못한 경우)
+    """
+    job_id: str
+    state: str
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    servers: dict[int, ServerApplyState] = {}
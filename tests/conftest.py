@@ -0,0 +1,13 @@
+import os
+import sys
+
+# database.database 는 import 시 접속 정보를 요구하므로 테스트용 값을 지정 (실제로 접속하지는 않음)
+for name, value in {
+    "POSTGRESQL_USERNAME": "test",
+    "POSTGRESQL_PASSWORD": "test",
+    "POSTGRESQL_HOST": "localhost",
+    "POSTGRESQL_DB": "test"
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
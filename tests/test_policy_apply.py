@@ -0,0 +1,157 @@
+import json
+import re
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crud import policy_crud
+from schema import policy_schema
+from utils import policy_bundle
+from utils.agent_client import AgentClient
+
+
+class StubAgent(ThreadingHTTPServer):
+    """받은 정책 파일 이름과 헤더를 기록하고, statuses 에 담긴 상태 코드로 차례로 응답하는 에이전트입니다."""
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubAgentHandler)
+        self.requests: list[dict] = []
+        self.statuses: list[int] = []
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/policy"
+
+
+class StubAgentHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append({
+            "filename": re.search(rb'filename="([^"]+)"', body).group(1).decode(),
+            "hash": self.headers.get("X-Policy-Hash"),
+            "base_hash": self.headers.get("X-Policy-Base-Hash"),
+            "format": self.headers.get("X-Policy-Format")
+        })
+        code = self.server.statuses.pop(0) if self.server.statuses else 200
+        content = json.dumps({"applied": code == 200}).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    server = StubAgent()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    monkeypatch.setattr(policy_crud, "agent_client", AgentClient(
+        pool_size=2, connect_timeout_s=1, read_timeout_s=2, max_retries=0, backoff_s=0
+    ))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def compile_policy(paths: list[str], flags: list[str] = ["read"]) -> policy_crud.CompiledPolicy:
+    policy = policy_schema.Policy(
+        container_name="web",
+        raw_tp="on",
+        tracepoint_policy=policy_schema.TracepointPolicy(tracepoints=["sched_process_exec"]),
+        lsm_policies=policy_schema.LSMPolicies(
+            file=[policy_schema.LSMFilePolicy(path=path, flags=flags, uid=[0]) for path in paths],
+            network=[],
+            process=[]
+        )
+    )
+    policies = policy_schema.PolicyRes(policies=[
+        policy_schema.ContainerPolicy(api_version="v1", name="policy-1", policy=policy)
+    ])
+    return policy_crud.CompiledPolicy(policies, datetime.now())
+
+
+def make_target(endpoint: str, compiled: policy_crud.CompiledPolicy, base: policy_crud.CompiledPolicy | None = None,
+                policy_format: str = "yaml", delta: bool = True) -> policy_crud.PolicyTarget:
+    return policy_crud.PolicyTarget(
+        endpoint=endpoint,
+        format=policy_format,
+        delta=delta,
+        policy=compiled,
+        hash=compiled.hash,
+        document=compiled.document,
+        base_hash=base.hash if base else None,
+        base_document=base.document if base else None
+    )
+
+
+def test_full_push_without_applied_policy(agent):
+    compiled = compile_policy(["/etc/passwd"])
+
+    result = policy_crud.push_policy_target(make_target(agent.endpoint, compiled))
+
+    assert (result["status"], result["mode"], result["format"]) == ("success", "full", "yaml")
+    assert agent.requests == [{"filename": "policy.yaml", "hash": compiled.hash, "base_hash": None, "format": None}]
+
+
+def test_full_push_as_bundle(agent):
+    compiled = compile_policy(["/etc/passwd"])
+
+    result = policy_crud.push_policy_target(make_target(agent.endpoint, compiled, policy_format=policy_bundle.FORMAT))
+
+    assert (result["status"], result["format"]) == ("success", policy_bundle.FORMAT)
+    assert agent.requests[0]["filename"] == "policy.bundle"
+    assert agent.requests[0]["format"] == policy_bundle.FORMAT
+
+
+def test_unchanged_policy_is_skipped(agent):
+    compiled = compile_policy(["/etc/passwd"])
+
+    result = policy_crud.push_policy_target(make_target(agent.endpoint, compiled, base=compile_policy(["/etc/passwd"])))
+
+    assert result == {"status": "skipped", "mode": None}
+    assert agent.requests == []
+
+
+def test_delta_push(agent):
+    base, compiled = compile_policy(["/etc/passwd"]), compile_policy(["/etc/passwd", "/etc/shadow"])
+
+    result = policy_crud.push_policy_target(make_target(agent.endpoint, compiled, base=base))
+
+    assert (result["status"], result["mode"]) == ("success", "delta")
+    assert agent.requests == [
+        {"filename": "policy-delta.json", "hash": compiled.hash, "base_hash": base.hash, "format": None}
+    ]
+
+
+def test_no_delta_for_agent_without_capability(agent):
+    base, compiled = compile_policy(["/etc/passwd"]), compile_policy(["/etc/shadow"])
+
+    result = policy_crud.push_policy_target(make_target(agent.endpoint, compiled, base=base, delta=False))
+
+    assert (result["status"], result["mode"]) == ("success", "full")
+    assert [request["filename"] for request in agent.requests] == ["policy.yaml"]
+
+
+@pytest.mark.parametrize("code", [409, 412, 400, 500])
+def test_rejected_delta_falls_back_to_full_push(agent, code):
+    base, compiled = compile_policy(["/etc/passwd"]), compile_policy(["/etc/shadow"])
+    agent.statuses = [code]
+
+    result = policy_crud.push_policy_target(make_target(agent.endpoint, compiled, base=base))
+
+    assert (result["status"], result["mode"], result["attempts"]) == ("success", "full", 2)
+    assert [request["filename"] for request in agent.requests] == ["policy-delta.json", "policy.yaml"]
+
+
+def test_policy_that_cannot_be_bundled_is_sent_as_yaml(agent):
+    compiled = compile_policy(["/etc/passwd"], flags=[f"flag-{i}" for i in range(policy_bundle.MAX_FLAGS + 1)])
+
+    result = policy_crud.push_policy_target(make_target(agent.endpoint, compiled, policy_format=policy_bundle.FORMAT))
+
+    assert (result["status"], result["mode"], result["format"]) == ("success", "full", "yaml")
+    assert [request["filename"] for request in agent.requests] == ["policy.yaml"]
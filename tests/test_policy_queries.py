@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from crud import policy_crud
+from database import models
+
+
+def make_session(container_count: int) -> Session:
+    """정책 1 이 container_count 개의 컨테이너에 모든 종류의 규칙을 가진 SQLite 세션을 만듭니다."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(engine)
+
+    db = Session(engine)
+    db.add(models.Server(id=1, uuid="server-1", name="server-1"))
+    db.add(models.Policy(id=1, name="policy-1", api_version="v1"))
+    for container_id in range(1, container_count + 1):
+        db.add(models.Container(id=container_id, host_server=1, runtime="docker", name=f"container-{container_id}"))
+        db.add(models.RawTracePointPolicy(id=container_id, policy_id=1, container_id=container_id, state="on"))
+        db.add(models.TracepointPolicy(id=container_id, policy_id=1, container_id=container_id, tracepoint="tp"))
+        db.add(models.LsmFilePolicy(id=container_id, policy_id=1, container_id=container_id,
+                                    path="/etc", flags=["read"], uid=[0]))
+        db.add(models.LsmNetPolicy(id=container_id, policy_id=1, container_id=container_id,
+                                   ip="10.0.0.0/8", port=80, protocol=6, flags=["connect"], uid=[]))
+        db.add(models.LsmProcPolicy(id=container_id, policy_id=1, container_id=container_id,
+                                    comm="bash", flags=["exec"], uid=[]))
+    db.commit()
+    return db
+
+
+def count_statements(db: Session, func) -> tuple[int, object]:
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return len(statements), result
+
+
+@pytest.mark.parametrize("container_count", [1, 50])
+def test_get_policy_by_policy_id_query_count_is_constant(container_count):
+    db = make_session(container_count)
+
+    count, policy = count_statements(db, lambda: policy_crud.get_policy_by_policy_id(db, 1))
+
+    # 정책 1 + 규칙 테이블 5 + 컨테이너 이름 1
+    assert count == 7
+    assert len(policy.containers) == container_count
+    assert policy.containers[0].lsm_policies.file[0].path == "/etc"
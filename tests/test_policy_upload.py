@@ -0,0 +1,67 @@
+import io
+import json
+
+from crud import policy_crud
+from routes import policy_route
+
+POLICY_YAML = b"""api_version: v1
+name: upload-test
+containers:
+  - container_name: web
+    raw_tp: "on"
+    tracepoint_policy:
+      tracepoints: [sched_process_exec]
+    lsm_policies:
+      file:
+        - path: /etc/passwd
+          flags: [read]
+          uid: [0]
+        - path: /etc/passwd
+          flags: [read]
+          uid: [0]
+      network: []
+      process: []
+"""
+
+
+class FakeSession:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def fake_add_policy_rules(db, policy_id, containers):
+    """같은 key 의 파일 정책은 처음 것만 추가되고, 나머지는 add_policy_rules 와 같이 정책 모델로 실패 목록에 담습니다."""
+    failed = {}
+    for container in containers:
+        paths = set()
+        for file_policy in container.lsm_policies.file:
+            if file_policy.path in paths:
+                failed.setdefault(container.container_name, {
+                    "tracepoint": [], "lsm_file": [], "lsm_network": [], "lsm_process": []
+                })["lsm_file"].append(file_policy)
+            paths.add(file_policy.path)
+    return failed
+
+
+def test_stream_policy_upload_reports_duplicate_rule(monkeypatch):
+    monkeypatch.setattr(policy_route, "SessionLocal", FakeSession)
+    monkeypatch.setattr(policy_crud, "add_policy_rules", fake_add_policy_rules)
+
+    messages = [json.loads(line) for line in policy_route.stream_policy_upload(io.BytesIO(POLICY_YAML), 1)]
+
+    assert [message["event"] for message in messages] == ["batch", "done"]
+    assert messages[0]["failed"] == {
+        "web": {
+            "tracepoint": [],
+            "lsm_file": [{"path": "/etc/passwd", "flags": ["read"], "uid": [0]}],
+            "lsm_network": [],
+            "lsm_process": []
+        }
+    }
+    assert messages[1] == {"event": "done", "policy_id": 1, "total": 1, "errors": 0}
@@ -0,0 +1,105 @@
+import pytest
+
+from utils.tag_index import TagIndex, parse_tag_expression
+
+
+def make_index() -> TagIndex:
+    index = TagIndex()
+    index.begin_rebuild()
+    index.finish_rebuild(
+        [1, 2, 3, 4, 5],
+        [("prod", 1), ("prod", 2), ("prod", 3), ("web", 1), ("web", 4), ("api", 2), ("canary", 1)]
+    )
+    return index
+
+
+def query(index: TagIndex, expression: str) -> list[int]:
+    cnt, container_ids = index.query(parse_tag_expression(expression))
+    assert cnt == len(container_ids)
+    return container_ids
+
+
+@pytest.mark.parametrize("expression, expected", [
+    # NOT > AND > OR
+    ("web OR prod AND api", [1, 2, 4]),
+    ("(web OR prod) AND api", [2]),
+    ("NOT prod AND web", [4]),
+    ("NOT (prod AND web)", [2, 3, 4, 5]),
+    ("prod AND (web OR api) AND NOT canary", [2]),
+    ("prod and not canary or web", [1, 2, 3, 4]),
+])
+def test_precedence_and_parentheses(expression, expected):
+    assert query(make_index(), expression) == expected
+
+
+def test_not_is_evaluated_against_all_containers():
+    index = make_index()
+    # 태그가 없는 컨테이너 5 도 포함
+    assert query(index, "NOT prod") == [4, 5]
+    index.add_containers([6])
+    assert query(index, "NOT prod") == [4, 5, 6]
+
+
+def test_unknown_tag_matches_nothing():
+    index = make_index()
+    assert query(index, "missing") == []
+    assert query(index, "prod AND missing") == []
+    assert query(index, "NOT missing") == [1, 2, 3, 4, 5]
+
+
+def test_quoted_tag_and_paging():
+    index = make_index()
+    index.add_tags([3, 5], ["team a"])
+    assert query(index, '"team a"') == [3, 5]
+    assert index.query(parse_tag_expression("NOT canary"), offset=1, limit=2) == (4, [3, 4])
+
+
+def test_set_tags_replaces_tags():
+    index = make_index()
+    index.set_tags([1], ["api"])
+    assert query(index, "prod") == [2, 3]
+    assert query(index, "api") == [1, 2]
+    assert query(index, "canary") == []
+
+
+def test_updates_during_rebuild_are_replayed():
+    index = make_index()
+    index.begin_rebuild()
+    # DB 조회 중에 들어온 갱신 (조회 결과에는 반영되지 않음)
+    index.add_tags([7], ["new"])
+    index.set_tags([2], ["web"])
+    index.finish_rebuild([1, 2, 3], [("prod", 1), ("prod", 2)])
+
+    assert query(index, "new") == [7]
+    assert query(index, "web") == [2]
+    assert query(index, "prod") == [1]
+    assert query(index, "NOT prod") == [2, 3, 7]
+
+
+def test_aborted_rebuild_keeps_index():
+    index = make_index()
+    index.begin_rebuild()
+    index.abort_rebuild()
+    index.add_tags([5], ["web"])
+    assert query(index, "web") == [1, 4, 5]
+
+
+def test_bitset_size_follows_container_count_not_id():
+    index = TagIndex()
+    index.begin_rebuild()
+    index.finish_rebuild([10**12, 10**12 + 5], [("prod", 10**12 + 5)])
+    assert query(index, "NOT prod") == [10**12]
+    assert index.query(parse_tag_expression("prod OR NOT prod"))[0] == 2
+
+
+def test_results_stay_sorted_when_smaller_id_is_added():
+    index = make_index()
+    index.add_tags([10, 0], ["late"])
+    assert query(index, "late OR api") == [0, 2, 10]
+    assert index.query(parse_tag_expression("late OR api"), offset=1, limit=1) == (3, [2])
+
+
+@pytest.mark.parametrize("expression", ["", "prod AND", "(prod", "prod web", "NOT", "prod)", "(" * 2000 + "prod"])
+def test_invalid_expression(expression):
+    with pytest.raises(ValueError):
+        parse_tag_expression(expression)
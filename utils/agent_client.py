@@ -0,0 +1,92 @@
+import json
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core import config
+from utils import policy_bundle
+
+
+class AgentClient:
+    """
+    에이전트에 정책 yaml 을 전달하는 HTTP 클라이언트입니다.
+
+    하나의 requests.Session 으로 연결을 재사용(keep-alive)하며, 요청마다 연결/응답 timeout 을 적용합니다.
+    연결 실패, timeout, 5xx 응답은 backoff_s * 2^n 초 간격으로 max_retries 번까지 재시도하고, 4xx 응답은 재시도하지 않습니다.
+    """
+    def __init__(self, pool_size: int, connect_timeout_s: float, read_timeout_s: float,
+                 max_retries: int, backoff_s: float):
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._timeout = (connect_timeout_s, read_timeout_s)
+        self._max_retries = max_retries
+        self._backoff = backoff_s
+
+    def _post(self, endpoint: str, files: dict, headers: dict) -> dict:
+        started = time.monotonic()
+        result = {"status": "failed", "attempts": 0, "status_code": None, "response": None, "error": None}
+
+        for attempt in range(self._max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff * 2 ** (attempt - 1))
+            result["attempts"] = attempt + 1
+
+            try:
+                res = self._session.post(endpoint, files=files, headers=headers, timeout=self._timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+                continue
+
+            result["status_code"] = res.status_code
+            try:
+                result["response"] = res.json()
+            except ValueError:
+                result["response"] = res.text
+            if res.ok:
+                result["status"] = "success"
+                result["error"] = None
+                break
+
+            result["error"] = f"HTTP {res.status_code}"
+            if res.status_code < 500:
+                break
+
+        result["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    def post_policy(self, endpoint: str, yaml_content: str, policy_hash: str | None = None) -> dict:
+        """
+        정책을 전달하고 결과를 반환합니다. 실패해도 예외를 던지지 않습니다.
+        policy_hash 가 주어지면 X-Policy-Hash 헤더로 함께 보냅니다.
+
+        Returns:
+            dict: status("success" | "failed"), attempts, elapsed_ms, status_code, response, error
+        """
+        headers = {"X-Policy-Hash": policy_hash} if policy_hash else {}
+        return self._post(endpoint, {'files': ('policy.yaml', yaml_content, 'text/yaml')}, headers)
+
+    def post_policy_bundle(self, endpoint: str, bundle: bytes, policy_hash: str) -> dict:
+        """utils.policy_bundle 형식의 정책을 전달합니다. 결과 형식은 post_policy 와 같습니다."""
+        headers = {"X-Policy-Hash": policy_hash, "X-Policy-Format": policy_bundle.FORMAT}
+        return self._post(endpoint, {'files': ('policy.bundle', bundle, 'application/octet-stream')}, headers)
+
+    def post_policy_delta(self, endpoint: str, delta: dict, base_hash: str, policy_hash: str) -> dict:
+        """
+        base_hash 정책에서 바뀐 부분만 전달합니다. 결과 형식은 post_policy 와 같습니다.
+        에이전트에 적용된 정책이 base_hash 가 아니면 에이전트는 409 (또는 412) 로 응답하며, 호출한 쪽은 전체 정책을 다시 보냅니다.
+        """
+        headers = {"X-Policy-Hash": policy_hash, "X-Policy-Base-Hash": base_hash}
+        content = json.dumps(delta, separators=(",", ":"), ensure_ascii=False)
+        return self._post(endpoint, {'files': ('policy-delta.json', content, 'application/json')}, headers)
+
+
+agent_client = AgentClient(
+    pool_size=config.POLICY_APPLY_CONCURRENCY,
+    connect_timeout_s=config.AGENT_CONNECT_TIMEOUT_S,
+    read_timeout_s=config.AGENT_READ_TIMEOUT_S,
+    max_retries=config.AGENT_MAX_RETRIES,
+    backoff_s=config.AGENT_RETRY_BACKOFF_S
+)
@@ -0,0 +1,129 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class ApplyJob:
+    """
+    여러 서버에 정책을 전달하는 작업의 진행 상태입니다.
+
+    작업 상태는 queued -> running -> done (준비 단계에서 실패하면 failed) 로 바뀌며,
+    서버별 상태는 queued -> running -> success | failed | skipped 로 바뀝니다.
+    """
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.state = "queued"
+        self.error: str | None = None
+        self.created_at = datetime.now().astimezone()
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+        self.servers: dict[int, dict] = {}
+        self._lock = threading.Lock()
+
+    def update_server(self, server_id: int, **values):
+        with self._lock:
+            self.servers.setdefault(server_id, {"state": "queued", "attempts": 0}).update(values)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "state": self.state,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "servers": {server_id: dict(server) for server_id, server in self.servers.items()}
+            }
+
+
+class ApplyJobManager:
+    """
+    정책 전달 작업을 백그라운드 스레드에서 처리합니다.
+
+    prepare(request) 는 (server_id -> 전달 대상, server_id -> 실패 사유) 를 반환하며, 조회 작업은 여기서 끝냅니다.
+    push(server_id, target) 는 에이전트에 정책을 전달하고 status 를 포함한 결과 dict 를 반환합니다.
+    작업은 workers 개까지 동시에 준비되고, 에이전트 요청은 모든 작업을 합쳐 concurrency 개까지 동시에 보냅니다.
+    완료된 작업은 최근 max_jobs 개까지만 보관합니다. (작업 정보는 프로세스별로 보관됩니다)
+    """
+    def __init__(self, prepare: Callable, push: Callable[[int, object], dict],
+                 workers: int, concurrency: int, max_jobs: int):
+        self._prepare = prepare
+        self._push = push
+        self._max_jobs = max_jobs
+        self._jobs: OrderedDict[str, ApplyJob] = OrderedDict()
+        self._lock = threading.Lock()
+        self._job_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="apply-job")
+        self._push_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="apply-push")
+
+    def submit(self, request) -> ApplyJob:
+        job = ApplyJob(request)
+        with self._lock:
+            self._jobs[job.id] = job
+            # 오래된 완료 작업부터 제거
+            for job_id in [job_id for job_id, old in self._jobs.items() if old.state in ("done", "failed")]:
+                if len(self._jobs) <= self._max_jobs:
+                    break
+                del self._jobs[job_id]
+        self._job_executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> ApplyJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _push_one(self, job: ApplyJob, server_id: int, target):
+        job.update_server(server_id, state="running", started_at=datetime.now().astimezone())
+        try:
+            result = self._push(server_id, target)
+        except Exception as e:
+            logger.exception("Policy push to server %s failed", server_id)
+            result = {"status": "failed", "error": str(e)}
+        job.update_server(
+            server_id,
+            state=result.pop("status"),
+            finished_at=datetime.now().astimezone(),
+            **result
+        )
+
+    def _run(self, job: ApplyJob):
+        job.state = "running"
+        job.started_at = datetime.now().astimezone()
+        try:
+            targets, failures = self._prepare(job.request)
+        except Exception as e:
+            logger.exception("Policy apply job %s failed", job.id)
+            job.error = str(e)
+            job.state = "failed"
+            job.finished_at = datetime.now().astimezone()
+            return
+
+        for server_id, error in failures.items():
+            job.update_server(server_id, state="failed", error=error)
+        for server_id in targets:
+            job.update_server(server_id)
+
+        futures = [
+            self._push_executor.submit(self._push_one, job, server_id, target)
+            for server_id, target in targets.items()
+        ]
+        wait(futures)
+        job.state = "done"
+        job.finished_at = datetime.now().astimezone()
+
+    def stats(self) -> dict:
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {state: states.count(state) for state in ("queued", "running", "done", "failed")}
+
+    def shutdown(self):
+        # 대기 중인 작업은 취소하고 진행 중인 요청은 기다리지 않음
+        self._job_executor.shutdown(wait=False, cancel_futures=True)
+        self._push_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import math
+import threading
+from collections import deque
+from typing import Protocol
+
+
+class Event:
+    """
+    구독자에게 전달되는 이벤트입니다. data 는 처음 필요할 때 한 번만 JSON 으로 직렬화됩니다.
+    """
+    __slots__ = ("id", "name", "key", "payload", "_data", "projections")
+
+    def __init__(self, id: int, name: str, key: str, payload: dict):
+        self.id = id
+        self.name = name
+        self.key = key
+        self.payload = payload
+        self._data = None
+        # 같은 조건의 구독자끼리 공유하는 필터링 결과 (EventFilter.signature -> Event)
+        self.projections: dict = {}
+
+    @property
+    def data(self) -> str:
+        if self._data is None:
+            self._data = json.dumps(self.payload, separators=(",", ":"))
+        return self._data
+
+
+def format_sse(event: Event) -> str:
+    return f"id: {event.id}\nevent: {event.name}\ndata: {event.data}\n\n"
+
+
+SSE_KEEPALIVE = ": keepalive\n\n"
+# Last-Event-ID 이후의 이벤트를 모두 재전송할 수 없을 때 보내는 이벤트
+SSE_RESET = "event: reset\ndata: {}\n\n"
+
+
+class EventFilter(Protocol):
+    signature: tuple
+
+    def match(self, event: Event) -> bool:
+        ...
+
+    def project(self, event: Event) -> Event:
+        ...
+
+
+class Subscription:
+    """
+    구독자별 이벤트 큐입니다. offer 는 이벤트 루프 스레드에서만 호출됩니다.
+
+    min_interval 이 0 이면 큐가 가득 찼을 때 가장 오래된 이벤트를 버립니다.
+    min_interval 이 주어지면 key 별로 min_interval 초에 한 번만 전달하고, 그 사이의 이벤트는 최신 것만 남깁니다.
+    event_filter 가 주어지면 조건에 맞는 이벤트만 받고, 전달 직전에 필요한 필드만 남깁니다.
+    재전송(replay) 이벤트는 큐 크기와 관계없이 모두 먼저 전달하며, 이미 받은 id 이하의 이벤트는 무시합니다.
+    """
+    def __init__(self, maxsize: int, event_filter: EventFilter | None = None, min_interval: float = 0):
+        self._queue = deque(maxlen=maxsize)
+        self._replay: deque[Event] = deque()
+        # 재전송한 마지막 id. 이 이하의 이벤트는 이미 재전송했거나 클라이언트가 받은 것
+        self._replayed_until = 0
+        # Last-Event-ID 이후의 이벤트가 기록에 모두 남아 있었는지 여부
+        self.resumed = True
+        self._pending: dict[str, Event] = {}
+        self._last_sent: dict[str, float] = {}
+        self._ready = asyncio.Event()
+        self._filter = event_filter
+        self._min_interval = min_interval
+        self.dropped = 0
+        self.coalesced = 0
+
+    def offer(self, event: Event):
+        if event.id <= self._replayed_until:
+            return
+        if self._filter is not None and not self._filter.match(event):
+            return
+
+        if self._min_interval:
+            if event.key in self._pending:
+                self.coalesced += 1
+            self._pending[event.key] = event
+        else:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(event)
+        self._ready.set()
+
+    def _pop(self, now: float) -> tuple[Event | None, float | None]:
+        """전달할 수 있는 이벤트와, 없다면 다음 이벤트를 전달할 수 있는 시각을 반환합니다."""
+        if self._replay:
+            return self._replay.popleft(), None
+        if self._queue:
+            return self._queue.popleft(), None
+
+        next_due = None
+        for key in self._pending:
+            due = self._last_sent.get(key, -math.inf) + self._min_interval
+            if due <= now:
+                self._last_sent[key] = now
+                return self._pending.pop(key), None
+            next_due = due if next_due is None else min(next_due, due)
+        return None, next_due
+
+    async def get(self, timeout: float) -> Event | None:
+        """다음 이벤트를 반환합니다. timeout 초 동안 전달할 이벤트가 없으면 None 을 반환합니다."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            now = loop.time()
+            event, next_due = self._pop(now)
+            if event is not None:
+                return self._project(event)
+            if now >= deadline:
+                return None
+
+            wake = deadline if next_due is None else min(deadline, next_due)
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), wake - now)
+            except asyncio.TimeoutError:
+                pass
+
+    def replay(self, events: list[Event], last_event_id: int):
+        """last_event_id 이후의 이벤트를 다시 전달합니다."""
+        if self._min_interval:
+            # 전송 횟수 제한이 있으면 재전송 이벤트도 key 별 최신 것만 전달
+            for event in events:
+                self.offer(event)
+        else:
+            self._replay.extend(event for event in events if self._filter is None or self._filter.match(event))
+            if self._replay:
+                self._ready.set()
+        self._replayed_until = max([last_event_id] + [event.id for event in events])
+
+    def _project(self, event: Event) -> Event:
+        if self._filter is None:
+            return event
+
+        signature = self._filter.signature
+        if signature not in event.projections:
+            event.projections[signature] = self._filter.project(event)
+        return event.projections[signature]
+
+
+class Broadcaster:
+    """
+    모든 구독자에게 이벤트를 전달하는 pub/sub 브로드캐스터입니다.
+
+    publish 와 deliver 는 어느 스레드에서나 호출할 수 있으며, 구독자 큐에는 이벤트 루프 스레드에서 전달됩니다.
+    publish 는 이벤트 id 를 직접 발급하고, deliver 는 다른 곳(예: LISTEN/NOTIFY)에서 발급한 id 를 그대로 사용합니다.
+    최근 history_size 개의 이벤트를 보관하여, 재연결한 구독자에게 놓친 이벤트만 다시 전달합니다.
+    """
+    def __init__(self, queue_size: int, history_size: int = 0):
+        self._queue_size = queue_size
+        self._history: deque[Event] = deque(maxlen=history_size)
+        self._subscribers: set[Subscription] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def subscribe(self, event_filter: EventFilter | None = None, min_interval: float = 0,
+                  last_event_id: int | None = None) -> Subscription:
+        """
+        구독을 생성합니다. last_event_id 가 주어지면 그 이후의 보관된 이벤트를 먼저 전달합니다.
+        그 사이의 이벤트 일부가 이미 기록에서 밀려났다면 subscription.resumed 가 False 가 됩니다.
+        """
+        # 구독은 항상 이벤트 루프 안에서 생성되므로 이때 루프를 기억
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self._queue_size, event_filter, min_interval)
+        self._subscribers.add(subscription)
+
+        if last_event_id is not None:
+            with self._lock:
+                history = list(self._history)
+                next_id = self._next_id
+            # 기록의 첫 이벤트가 바로 다음 id 가 아니거나, 프로세스 재시작으로 id 가 되돌아간 경우
+            oldest_id = history[0].id if history else next_id
+            subscription.resumed = oldest_id <= last_event_id + 1 and last_event_id < next_id
+            if subscription.resumed:
+                subscription.replay([event for event in history if event.id > last_event_id], last_event_id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, name: str, key: str, payload: dict):
+        if not self._history.maxlen and not self._subscribers:
+            return
+        self._record(None, name, key, payload)
+
+    def deliver(self, event_id: int, name: str, key: str, payload: dict):
+        self._record(event_id, name, key, payload)
+
+    def _record(self, event_id: int | None, name: str, key: str, payload: dict):
+        with self._lock:
+            if event_id is None:
+                event_id = self._next_id
+            event = Event(event_id, name, key, payload)
+            self._next_id = max(self._next_id, event_id + 1)
+            self._history.append(event)
+        if self._subscribers and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Event):
+        for subscription in list(self._subscribers):
+            subscription.offer(event)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "history": len(self._history),
+            "last_event_id": self._next_id - 1,
+            "dropped": sum(subscription.dropped for subscription in self._subscribers),
+            "coalesced": sum(subscription.coalesced for subscription in self._subscribers)
+        }
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def bucket_bounds(bucket_keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """정렬된 버킷 키 배열에서 각 버킷의 시작 위치와 행 수를 반환합니다."""
+    if len(bucket_keys) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    starts = np.flatnonzero(np.r_[True, bucket_keys[1:] != bucket_keys[:-1]])
+    counts = np.diff(np.r_[starts, len(bucket_keys)])
+    return starts, counts
+
+
+def bucket_reduce(bucket_keys: np.ndarray, values: np.ndarray, function: str, q: float | None = None) -> np.ndarray:
+    """버킷 키 순으로 정렬된 (행, 지표) 배열을 버킷별로 집계합니다.
+
+    Args:
+        bucket_keys (np.ndarray): 행별 버킷 키 (오름차순 정렬)
+        values (np.ndarray): (행 수, 지표 수) 크기의 값 배열
+        function (str): "mean", "max", "quantile" 중 하나
+        q (float, optional): function 이 "quantile" 일 때의 분위수 (0~1). percentile_cont 와 같이 선형 보간합니다.
+
+    Returns:
+        np.ndarray: (버킷 수, 지표 수) 크기의 집계 결과
+    """
+    starts, counts = bucket_bounds(bucket_keys)
+    if len(starts) == 0:
+        return np.empty((0, values.shape[1]))
+
+    if function == "mean":
+        return np.add.reduceat(values, starts, axis=0) / counts[:, None]
+    if function == "max":
+        return np.maximum.reduceat(values, starts, axis=0)
+    if function != "quantile":
+        raise ValueError(f"Unknown function: {function}")
+
+    # 값에 (버킷 번호 x 값의 범위) 를 더해 정렬하면 모든 지표가 한 번에 버킷 구간 안에서 정렬됨
+    bucket_index = np.repeat(np.arange(len(starts)), counts)
+    low = values.min(axis=0)
+    span = values.max(axis=0) - low + 1
+    order = np.argsort((values - low) + bucket_index[:, None] * span, axis=0)
+    ordered = np.take_along_axis(values, order, axis=0)
+
+    position = starts + q * (counts - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    weight = (position - lower)[:, None]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * weight
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatBuffer:
+    """
+    heartbeat 를 메모리에 모아두었다가 주기적으로 일괄 저장하는 write-behind 버퍼입니다.
+
+    put 은 요청 처리 스레드에서, flush 는 이벤트 루프의 백그라운드 태스크에서 호출됩니다.
+    버퍼는 flush_interval_ms 마다 또는 batch_size 개가 쌓이면 비워집니다.
+
+    저장에 실패한 batch 는 버퍼 앞에 되돌려 flush_interval 부터 두 배씩 늘어나는 간격(최대 MAX_BACKOFF_S)으로
+    max_retries 번까지 다시 저장합니다. 되돌린 batch 때문에 버퍼가 maxsize 를 잠시 넘을 수 있지만,
+    그동안 put 은 거부되므로 버퍼는 maxsize + batch_size 를 넘지 않습니다.
+    재시도가 모두 실패하면 batch 를 반씩 나누어 저장하여 저장할 수 없는 heartbeat 만 버립니다.
+    """
+    MAX_BACKOFF_S = 30.0
+
+    def __init__(self, flush: Callable[[list], None], maxsize: int, flush_interval_ms: int, batch_size: int,
+                 max_retries: int = 5):
+        self._flush = flush
+        self._maxsize = maxsize
+        self._flush_interval = flush_interval_ms / 1000
+        self._batch_size = batch_size
+        self._max_retries = max_retries
+        # 버퍼 앞에 되돌린 batch 의 재시도 횟수
+        self._attempts = 0
+
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+
+        self._stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "flushed": 0,
+            "failed": 0,
+            "retried": 0,
+            "flush_count": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    def put(self, item) -> bool:
+        """버퍼에 추가합니다. 버퍼가 가득 찬 경우 False 를 반환합니다."""
+        with self._lock:
+            if len(self._items) >= self._maxsize:
+                self._stats["rejected"] += 1
+                return False
+            self._items.append(item)
+            self._stats["accepted"] += 1
+            full = len(self._items) >= self._batch_size
+
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    def _take(self) -> list:
+        with self._lock:
+            count = min(len(self._items), self._batch_size)
+            return [self._items.popleft() for _ in range(count)]
+
+    def _requeue(self, batch: list):
+        with self._lock:
+            self._items.extendleft(reversed(batch))
+
+    def _flush_split(self, batch: list) -> int:
+        """batch 를 반씩 나누어 저장하고, 혼자서도 저장에 실패한 heartbeat 수를 반환합니다."""
+        try:
+            self._flush(batch)
+            return 0
+        except Exception:
+            if len(batch) == 1:
+                logger.exception("Dropping heartbeat that could not be flushed")
+                return 1
+        middle = len(batch) // 2
+        return self._flush_split(batch[:middle]) + self._flush_split(batch[middle:])
+
+    def _backoff(self) -> float:
+        if not self._attempts:
+            return self._flush_interval
+        return min(self._flush_interval * 2 ** self._attempts, self.MAX_BACKOFF_S)
+
+    async def _flush_once(self, final: bool = False) -> int:
+        """
+        batch 하나를 저장하고 처리한 heartbeat 수를 반환합니다.
+        저장에 실패해 batch 를 버퍼에 되돌린 경우 0 을 반환합니다. final 이면 되돌리지 않고 바로 나누어 저장합니다.
+        """
+        batch = self._take()
+        if not batch:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._flush, batch)
+            self._stats["flushed"] += len(batch)
+            self._attempts = 0
+        except Exception:
+            if not final and self._attempts < self._max_retries:
+                self._attempts += 1
+                self._stats["retried"] += len(batch)
+                logger.exception("Failed to flush %d heartbeats, retrying in %.2fs (attempt %d/%d)",
+                                 len(batch), self._backoff(), self._attempts, self._max_retries)
+                self._requeue(batch)
+                return 0
+
+            # 재시도가 모두 실패하면 저장할 수 없는 heartbeat 만 골라 버림
+            self._attempts = 0
+            failed = await asyncio.to_thread(self._flush_split, batch)
+            self._stats["flushed"] += len(batch) - failed
+            self._stats["failed"] += failed
+        elapsed = (time.perf_counter() - started) * 1000
+
+        self._stats["flush_count"] += 1
+        self._stats["last_batch_size"] = len(batch)
+        self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+        self._stats["last_flush_ms"] = elapsed
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed)
+        self._stats["total_flush_ms"] += elapsed
+        return len(batch)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                if self._attempts:
+                    # 저장에 실패한 경우 batch_size 가 차도 기다림
+                    await asyncio.sleep(self._backoff())
+                else:
+                    await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            # batch_size 보다 많이 쌓였다면 연속해서 비움
+            while await self._flush_once() >= self._batch_size:
+                pass
+
+        # 종료 시 남은 heartbeat 를 모두 저장
+        while await self._flush_once(final=True):
+            pass
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """백그라운드 태스크를 멈추고 남아있는 heartbeat 를 모두 저장합니다."""
+        if self._task is None:
+            return
+
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._loop = None
+
+    def metrics(self) -> dict:
+        with self._lock:
+            queue_depth = len(self._items)
+
+        stats = dict(self._stats)
+        total_flush_ms = stats.pop("total_flush_ms")
+        return {
+            **stats,
+            "queue_depth": queue_depth,
+            "queue_capacity": self._maxsize,
+            "avg_flush_ms": total_flush_ms / stats["flush_count"] if stats["flush_count"] else 0.0
+        }
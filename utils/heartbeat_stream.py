@@ -0,0 +1,91 @@
+from utils.broadcaster import Event
+
+# 필드를 지정해도 항상 포함되는 필드
+ALWAYS_FIELDS = ("host_uuid", "timestamp")
+ALWAYS_CONTAINER_FIELDS = ("container_name",)
+
+
+def _field_tree(fields: list[str]) -> dict:
+    """"host.cpu", "containers.stats.cpu" 와 같은 필드 경로를 중첩 dict 로 변환합니다. 빈 dict 는 하위 필드 전체를 뜻합니다."""
+    tree = {}
+    for field in fields:
+        node = tree
+        parts = field.split(".")
+        for index, part in enumerate(parts):
+            if part in node and not node[part]:
+                # 상위 필드 전체가 이미 선택됨
+                break
+            if index == len(parts) - 1:
+                node[part] = {}
+            else:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def _project(value, tree: dict):
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: _project(value[key], sub_tree) for key, sub_tree in tree.items() if key in value}
+
+
+class HeartbeatFilter:
+    """
+    heartbeat 스트림 구독 조건입니다.
+
+    host_uuids 가 주어지면 해당 서버의 heartbeat 만 전달합니다.
+    container_names 나 container_keys((서버 uuid, 컨테이너 이름)) 가 주어지면
+    해당 컨테이너가 포함된 heartbeat 만 전달하고, containers 목록도 해당 컨테이너만 남깁니다.
+    fields 가 주어지면 지정한 필드만 남깁니다.
+    """
+    def __init__(self,
+                 host_uuids: set[str] | None = None,
+                 container_names: set[str] | None = None,
+                 container_keys: set[tuple[str, str]] | None = None,
+                 fields: list[str] | None = None):
+        self.host_uuids = host_uuids
+        self.filter_containers = container_names is not None or container_keys is not None
+        self.container_names = container_names or set()
+        self.container_keys = container_keys or set()
+
+        self.tree = None
+        if fields:
+            self.tree = _field_tree(list(ALWAYS_FIELDS) + fields)
+            if self.tree.get("containers"):
+                self.tree["containers"].update({field: {} for field in ALWAYS_CONTAINER_FIELDS})
+
+        # 조건이 같은 구독자는 이벤트별 필터링 결과를 공유
+        self.signature = (
+            frozenset(self.container_names) if self.filter_containers else None,
+            frozenset(self.container_keys) if self.filter_containers else None,
+            tuple(sorted(fields)) if fields else None
+        )
+
+    def _container_match(self, host_uuid: str, container: dict) -> bool:
+        name = container.get("container_name")
+        return name in self.container_names or (host_uuid, name) in self.container_keys
+
+    def match(self, event: Event) -> bool:
+        if self.host_uuids is not None and event.key not in self.host_uuids:
+            return False
+        if self.filter_containers:
+            return any(self._container_match(event.key, container) for container in event.payload.get("containers", []))
+        return True
+
+    def project(self, event: Event) -> Event:
+        if not self.filter_containers and self.tree is None:
+            return event
+
+        payload = event.payload
+        if self.filter_containers:
+            payload = dict(payload)
+            payload["containers"] = [
+                container for container in payload.get("containers", [])
+                if self._container_match(event.key, container)
+            ]
+        if self.tree is not None:
+            payload = _project(payload, self.tree)
+        return Event(event.id, event.name, event.key, payload)
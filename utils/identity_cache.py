@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from core import config
+
+
+class LRUCache:
+    """
+    크기가 제한된 thread-safe LRU 캐시입니다.
+    maxsize 를 넘으면 가장 오래 사용되지 않은 항목부터 제거합니다.
+    ttl_s 가 주어지면 저장한 지 ttl_s 초가 지난 항목은 없는 것으로 취급합니다.
+    """
+    def __init__(self, maxsize: int, ttl_s: float | None = None):
+        self._maxsize = maxsize
+        self._ttl = ttl_s
+        # key -> (value, 저장 시각)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self._ttl is not None and time.monotonic() - entry[1] > self._ttl):
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[0] if entry is not None else None
+
+    def pop_where(self, predicate: Callable[[Hashable, object], bool]):
+        with self._lock:
+            for key in [key for key, (value, _) in self._data.items() if predicate(key, value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "capacity": self._maxsize, "hits": self.hits, "misses": self.misses}
+
+
+# 다른 워커에서 삭제되거나 변경된 식별자는 IDENTITY_CACHE_TTL_S 안에 다시 조회됨
+# Server.uuid -> Server.id
+server_ids = LRUCache(config.IDENTITY_CACHE_SIZE, config.IDENTITY_CACHE_TTL_S)
+# (Container.host_server, Container.name) -> Container.id
+container_ids = LRUCache(config.IDENTITY_CACHE_SIZE, config.IDENTITY_CACHE_TTL_S)
+# Container.id -> 최신 InternalContainerId 의 (pid_id, mnt_id, cgroup_id)
+internal_ids = LRUCache(config.IDENTITY_CACHE_SIZE, config.IDENTITY_CACHE_TTL_S)
+
+
+def put_container(server_id: int, name: str, container_id: int):
+    container_ids.put((server_id, name), container_id)
+
+
+def invalidate_server(uuid: str, server_id: int | None = None):
+    """서버가 삭제된 경우 호출합니다. 서버에 속한 컨테이너 항목도 함께 제거합니다."""
+    server_ids.pop(uuid)
+    if server_id is None:
+        return
+
+    removed = set()
+    def belongs_to_server(key, value):
+        if key[0] == server_id:
+            removed.add(value)
+            return True
+        return False
+    container_ids.pop_where(belongs_to_server)
+    internal_ids.pop_where(lambda key, value: key in removed)
+
+
+def stats() -> dict:
+    return {
+        "server_ids": server_ids.stats(),
+        "container_ids": container_ids.stats(),
+        "internal_ids": internal_ids.stats()
+    }
@@ -0,0 +1,39 @@
+import asyncio
+import logging
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    동기 함수를 interval_s 초마다 스레드에서 실행하는 백그라운드 태스크입니다.
+    실행 중 발생한 예외는 기록만 하고 다음 주기에 다시 실행합니다.
+    """
+    def __init__(self, func: Callable[[], None], interval_s: float, name: str):
+        self._func = func
+        self._interval = interval_s
+        self._name = name
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._func)
+            except Exception:
+                logger.exception("Periodic task %s failed", self._name)
+            await asyncio.sleep(self._interval)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run(), name=self._name)
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,141 @@
+"""
+에이전트가 eBPF map 에 바로 적재할 수 있는 정책 bundle 형식입니다.
+
+모든 정수는 little-endian 이며, 파일은 header 와 zlib 으로 압축한 body 로 이루어집니다.
+
+header (12 byte)
+    magic "PBND" | u16 version | u16 flags (bit 0: zlib) | u32 압축 전 body 크기
+
+body 는 다음 section 이 순서대로 이어지며, 각 section 은 u32 개수와 고정 크기 record 배열입니다.
+    strings     u32 byte 크기 + UTF-8 문자열을 NUL 로 구분한 blob. 문자열 id 는 blob 안의 offset
+    flags       u32 문자열 id.            n 번째 flag 가 flag bitset 의 n 번째 bit (최대 64 개)
+    uid_sets    u32 개수 + u32 uid 배열.  rule 의 uid_set 은 이 section 의 index (0 은 빈 목록 = 모든 uid)
+    containers  u32 이름 | u32 raw_tp
+    tracepoints u32 container | u32 tracepoint 이름
+    files       u32 container | u64 path hash | u32 path | u64 flags | u32 uid_set
+    networks    u32 container | u8 family (4, 6, 0=해석 불가) | u8 prefix | u16 port | u16 protocol
+                | 16s 주소 (network byte order) | u32 ip 원문 | u64 flags | u32 uid_set
+    processes   u32 container | 16s comm (NUL 로 채움, 최대 15 byte) | u64 flags | u32 uid_set
+
+path hash 는 UTF-8 경로의 blake2b(digest_size=8) 를 u64 로 읽은 값입니다.
+"""
+import hashlib
+import ipaddress
+import struct
+import zlib
+
+from schema import policy_schema
+
+MAGIC = b"PBND"
+VERSION = 1
+FLAG_ZLIB = 1
+# InfoReq.policy_formats 에서 이 형식을 나타내는 이름
+FORMAT = "bundle-v1"
+
+_HEADER = struct.Struct("<4sHHI")
+_COUNT = struct.Struct("<I")
+_CONTAINER = struct.Struct("<II")
+_TRACEPOINT = struct.Struct("<II")
+_FILE = struct.Struct("<IQIQI")
+_NETWORK = struct.Struct("<IBBHH16sIQI")
+_PROCESS = struct.Struct("<I16sQI")
+
+# 커널의 TASK_COMM_LEN (NUL 포함)
+COMM_SIZE = 16
+MAX_FLAGS = 64
+
+
+def path_hash(path: str) -> int:
+    return int.from_bytes(hashlib.blake2b(path.encode(), digest_size=8).digest(), "little")
+
+
+class _Tables:
+    def __init__(self):
+        self.blob = bytearray()
+        self.strings: dict[str, int] = {}
+        self.flags: dict[str, int] = {}
+        self.uid_sets: dict[tuple[int, ...], int] = {(): 0}
+
+    def string(self, value: str) -> int:
+        offset = self.strings.get(value)
+        if offset is None:
+            offset = self.strings[value] = len(self.blob)
+            self.blob += value.encode() + b"\0"
+        return offset
+
+    def flag_bits(self, flags: list[str]) -> int:
+        bits = 0
+        for flag in flags:
+            bit = self.flags.get(flag)
+            if bit is None:
+                if len(self.flags) >= MAX_FLAGS:
+                    raise ValueError(f"policy bundle supports at most {MAX_FLAGS} distinct flags")
+                bit = self.flags[flag] = len(self.flags)
+                self.string(flag)
+            bits |= 1 << bit
+        return bits
+
+    def uid_set(self, uids: list[int]) -> int:
+        key = tuple(sorted(set(uids)))
+        index = self.uid_sets.get(key)
+        if index is None:
+            index = self.uid_sets[key] = len(self.uid_sets)
+        return index
+
+
+def _network_address(ip: str) -> tuple[int, int, bytes]:
+    try:
+        network = ipaddress.ip_network(ip.strip(), strict=False)
+    except ValueError:
+        return 0, 0, bytes(16)
+    return network.version, network.prefixlen, network.network_address.packed.ljust(16, b"\0")
+
+
+def _section(record: struct.Struct, rows: list[tuple]) -> bytes:
+    return _COUNT.pack(len(rows)) + b"".join(record.pack(*row) for row in rows)
+
+
+def build_bundle(container_policies: list[policy_schema.ContainerPolicy], compress_level: int = 6) -> bytes:
+    """ContainerPolicy 목록을 bundle 로 변환합니다. 같은 이름의 컨테이너는 하나로 합칩니다."""
+    tables = _Tables()
+    containers: dict[str, int] = {}
+    container_rows, tracepoints, files, networks, processes = [], [], [], [], []
+
+    for container_policy in container_policies:
+        policy = container_policy.policy
+        index = containers.get(policy.container_name)
+        if index is None:
+            index = containers[policy.container_name] = len(container_rows)
+            container_rows.append((tables.string(policy.container_name), tables.string(policy.raw_tp)))
+
+        for tracepoint in policy.tracepoint_policy.tracepoints:
+            tracepoints.append((index, tables.string(tracepoint)))
+        for rule in policy.lsm_policies.file:
+            files.append((
+                index, path_hash(rule.path), tables.string(rule.path),
+                tables.flag_bits(rule.flags), tables.uid_set(rule.uid)
+            ))
+        for rule in policy.lsm_policies.network:
+            family, prefix, address = _network_address(rule.ip)
+            networks.append((
+                index, family, prefix, rule.port, rule.protocol, address, tables.string(rule.ip),
+                tables.flag_bits(rule.flags), tables.uid_set(rule.uid)
+            ))
+        for rule in policy.lsm_policies.process:
+            comm = rule.comm.encode()[:COMM_SIZE - 1]
+            processes.append((index, comm, tables.flag_bits(rule.flags), tables.uid_set(rule.uid)))
+
+    uid_sets = sorted(tables.uid_sets.items(), key=lambda item: item[1])
+    body = b"".join([
+        _COUNT.pack(len(tables.blob)) + bytes(tables.blob),
+        _COUNT.pack(len(tables.flags)) + b"".join(_COUNT.pack(tables.strings[flag]) for flag in tables.flags),
+        _COUNT.pack(len(uid_sets)) + b"".join(
+            _COUNT.pack(len(uids)) + struct.pack(f"<{len(uids)}I", *uids) for uids, _ in uid_sets
+        ),
+        _section(_CONTAINER, container_rows),
+        _section(_TRACEPOINT, tracepoints),
+        _section(_FILE, files),
+        _section(_NETWORK, networks),
+        _section(_PROCESS, processes)
+    ])
+    return _HEADER.pack(MAGIC, VERSION, FLAG_ZLIB, len(body)) + zlib.compress(body, compress_level)
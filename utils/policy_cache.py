@@ -0,0 +1,102 @@
+import threading
+import time
+from itertools import chain
+from typing import Hashable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from utils.identity_cache import LRUCache
+
+# 변경된 테이블이 있는 세션에 남기는 표시 (commit 시 버전 증가)
+_CHANGED = "policy_cache_changed"
+
+
+class VersionedCache:
+    """
+    버전 카운터로 무효화되는 캐시입니다.
+
+    항목은 만들기 시작한 시점의 버전과 함께 저장되며, 이후 bump 로 버전이 바뀌었거나
+    ttl_s 가 지난 항목은 없는 것으로 취급합니다.
+    """
+    def __init__(self, maxsize: int, ttl_s: float):
+        self._cache = LRUCache(maxsize)
+        self._ttl = ttl_s
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+
+    def get(self, key: Hashable):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+
+        version, stored_at, value = entry
+        if version != self.version or time.monotonic() - stored_at > self._ttl:
+            return None
+        return value
+
+    def put(self, key: Hashable, value, version: int):
+        """version 은 값을 만들기 전에 읽은 버전입니다. 만드는 도중 변경이 있었다면 다음 조회 때 다시 만들어집니다."""
+        self._cache.put(key, (version, time.monotonic(), value))
+
+    def stats(self) -> dict:
+        return {"version": self.version, **self._cache.stats()}
+
+
+def _updated_columns(statement) -> set[str] | None:
+    values = getattr(statement, "_values", None)
+    if not values:
+        return None
+    return {getattr(column, "key", column) for column in values}
+
+
+def invalidate_on_change(cache: VersionedCache, watched: dict[str, set[str] | None]):
+    """
+    세션에서 watched 테이블이 변경된 트랜잭션이 commit 되면 cache 의 버전을 올립니다.
+
+    watched 는 테이블 이름 -> 컬럼 목록입니다. 컬럼 목록이 None 이면 모든 추가/수정/삭제를,
+    컬럼 목록이 주어지면 추가, 삭제와 해당 컬럼의 수정만 변경으로 취급합니다.
+    """
+    def is_change(table: str | None, columns: set[str] | None, insert: bool) -> bool:
+        if table not in watched:
+            return False
+        if watched[table] is None or insert:
+            return True
+        # 수정한 컬럼을 알 수 없으면 변경으로 취급
+        return columns is None or bool(columns & watched[table])
+
+    @event.listens_for(Session, "after_flush")
+    def after_flush(session: Session, flush_context):
+        changes = chain(
+            ((instance, None, True) for instance in session.new),
+            ((instance, {attr.key for attr in inspect(instance).attrs if attr.history.has_changes()}, False)
+             for instance in session.dirty),
+            ((instance, None, False) for instance in session.deleted)
+        )
+        for instance, columns, insert in changes:
+            if is_change(getattr(type(instance), "__tablename__", None), columns, insert):
+                session.info[_CHANGED] = True
+                return
+
+    @event.listens_for(Session, "do_orm_execute")
+    def do_orm_execute(state: ORMExecuteState):
+        if not (state.is_insert or state.is_update or state.is_delete):
+            return
+
+        table = getattr(getattr(state.statement, "table", None), "name", None)
+        columns = _updated_columns(state.statement) if state.is_update else None
+        if is_change(table, columns, state.is_insert):
+            state.session.info[_CHANGED] = True
+
+    @event.listens_for(Session, "after_commit")
+    def after_commit(session: Session):
+        if session.info.pop(_CHANGED, False):
+            cache.bump()
+
+    @event.listens_for(Session, "after_rollback")
+    def after_rollback(session: Session):
+        session.info.pop(_CHANGED, None)
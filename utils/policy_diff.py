@@ -0,0 +1,74 @@
+import hashlib
+import json
+from collections import Counter
+
+from schema import policy_schema
+
+# 컨테이너 정책 문서의 규칙 테이블
+RULE_TABLES = ("raw_tp", "tracepoint", "file", "network", "process")
+
+
+def _canonical(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def policy_document(policies: list[policy_schema.Policy]) -> dict:
+    """
+    컨테이너 정책 목록을 비교와 해시에 사용하는 문서로 변환합니다.
+
+    컨테이너 이름 -> {"raw_tp": [...], "tracepoint": [...], "file": [...], "network": [...], "process": [...]} 형태입니다.
+    한 컨테이너에 여러 정책이 적용되어 있으면 규칙을 합치며, 규칙은 정렬되어 있어
+    같은 정책이면 조회 순서와 관계없이 같은 문서가 됩니다.
+    """
+    document = {}
+    for policy in policies:
+        rules = document.setdefault(policy.container_name, {table: [] for table in RULE_TABLES})
+        rules["raw_tp"].append(policy.raw_tp)
+        rules["tracepoint"].extend(policy.tracepoint_policy.tracepoints)
+        rules["file"].extend(rule.model_dump() for rule in policy.lsm_policies.file)
+        rules["network"].extend(rule.model_dump() for rule in policy.lsm_policies.network)
+        rules["process"].extend(rule.model_dump() for rule in policy.lsm_policies.process)
+
+    for rules in document.values():
+        for table in RULE_TABLES:
+            rules[table].sort(key=_canonical)
+    return document
+
+
+def policy_hash(document: dict) -> str:
+    return hashlib.sha256(_canonical(document).encode()).hexdigest()
+
+
+def _diff_rules(base: list, current: list) -> dict:
+    base_counts = Counter(_canonical(rule) for rule in base)
+    current_counts = Counter(_canonical(rule) for rule in current)
+    return {
+        "added": [json.loads(rule) for rule in (current_counts - base_counts).elements()],
+        "removed": [json.loads(rule) for rule in (base_counts - current_counts).elements()]
+    }
+
+
+def diff_policy(base: dict, current: dict) -> dict:
+    """
+    두 정책 문서의 차이를 반환합니다.
+
+    Returns:
+        dict: {"removed": [삭제된 컨테이너 이름], "containers": {컨테이너 이름: {테이블: {"added": [...], "removed": [...]}}}}
+            변경이 없는 컨테이너와 테이블은 포함하지 않습니다.
+    """
+    empty = {table: [] for table in RULE_TABLES}
+    containers = {}
+    for name, policy in current.items():
+        base_policy = base.get(name, empty)
+        changes = {}
+        for table in RULE_TABLES:
+            rules = _diff_rules(base_policy[table], policy[table])
+            if rules["added"] or rules["removed"]:
+                changes[table] = rules
+        if changes:
+            containers[name] = changes
+
+    return {
+        "removed": sorted(name for name in base if name not in current),
+        "containers": containers
+    }
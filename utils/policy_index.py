@@ -0,0 +1,139 @@
+import ipaddress
+from collections import defaultdict
+
+from schema import policy_schema
+
+
+class PrefixTrie:
+    """
+    키(구성 요소의 시퀀스)별로 값을 저장하는 trie 입니다.
+    overlapping(key) 는 key 의 상위 키(접두사), 같은 키, 하위 키에 저장된 값을 반환합니다.
+    prefixes(key) 는 key 의 상위 키와 같은 키에 저장된 값을 짧은 키부터 반환합니다.
+    """
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: dict = {}
+        self.values: list = []
+
+    def insert(self, key, value):
+        node = self
+        for part in key:
+            node = node.children.setdefault(part, PrefixTrie())
+        node.values.append(value)
+
+    def prefixes(self, key) -> list:
+        found = list(self.values)
+        node = self
+        for part in key:
+            node = node.children.get(part)
+            if node is None:
+                break
+            found.extend(node.values)
+        return found
+
+    def overlapping(self, key) -> list:
+        found = []
+        node = self
+        for part in key:
+            found.extend(node.values)
+            node = node.children.get(part)
+            if node is None:
+                return found
+
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            found.extend(node.values)
+            stack.extend(node.children.values())
+        return found
+
+
+def path_key(path: str) -> tuple[str, ...]:
+    """"/etc/nginx/" 를 ("etc", "nginx") 로 변환합니다. 경로 구성 요소 단위로 상위/하위 경로를 판단합니다."""
+    return tuple(part for part in path.split("/") if part)
+
+
+def ip_key(ip: str) -> str:
+    """
+    IP 또는 CIDR 을 IP 버전과 네트워크 prefix 비트로 이루어진 문자열로 변환합니다.
+    두 CIDR 블록은 한 쪽의 키가 다른 쪽 키의 접두사일 때만 겹칩니다.
+    """
+    try:
+        network = ipaddress.ip_network(ip.strip(), strict=False)
+    except ValueError:
+        # 해석할 수 없는 값은 같은 문자열끼리만 겹치는 것으로 취급
+        return f"raw:{ip}\0"
+    bits = format(int(network.network_address), f"0{network.max_prefixlen}b")[:network.prefixlen]
+    return f"{network.version}{bits}"
+
+
+def _same_action(rule: policy_schema.LSMPolicy, other: policy_schema.LSMPolicy) -> bool:
+    return sorted(rule.flags) == sorted(other.flags) and sorted(rule.uid) == sorted(other.uid)
+
+
+class _ContainerIndex:
+    __slots__ = ("file", "network", "process")
+
+    def __init__(self):
+        self.file = PrefixTrie()
+        # (protocol, port) -> IP prefix trie
+        self.network: dict[tuple[int, int], PrefixTrie] = defaultdict(PrefixTrie)
+        self.process: dict[str, list] = defaultdict(list)
+
+
+class ConflictIndex:
+    """
+    컨테이너별로 기존 LSM 규칙을 색인하여 새 정책과 충돌하는 규칙을 찾습니다.
+
+    - file: 경로 구성 요소 trie. 같은 경로나 상위/하위 경로의 규칙
+    - network: (protocol, port) 별 IP prefix 비트 trie. 같은 protocol, port 이면서 IP 대역이 겹치는 규칙
+    - process: comm 해시 테이블. 같은 comm 의 규칙
+    대상이 겹치지만 flags 나 uid 가 다른 규칙을 충돌로 판단합니다. (같은 규칙은 충돌이 아닙니다)
+    규칙 하나는 trie 깊이만큼만 탐색하므로 기존 규칙 수가 늘어도 검사 시간이 거의 늘지 않습니다.
+    """
+    def __init__(self, container_policies: list[policy_schema.ContainerPolicy]):
+        self._containers: dict[str, _ContainerIndex] = defaultdict(_ContainerIndex)
+        for container_policy in container_policies:
+            policy = container_policy.policy
+            index = self._containers[policy.container_name]
+            for rule in policy.lsm_policies.file:
+                index.file.insert(path_key(rule.path), (container_policy.name, rule))
+            for rule in policy.lsm_policies.network:
+                index.network[(rule.protocol, rule.port)].insert(ip_key(rule.ip), (container_policy.name, rule))
+            for rule in policy.lsm_policies.process:
+                index.process[rule.comm].append((container_policy.name, rule))
+
+    def _conflicts(self, container_name: str, kind: str, rule, candidates: list) -> list[dict]:
+        return [
+            {
+                "container_name": container_name,
+                "type": kind,
+                "rule": rule,
+                "policy_name": policy_name,
+                "existing": existing
+            }
+            for policy_name, existing in candidates
+            if not _same_action(rule, existing)
+        ]
+
+    def check(self, policy: policy_schema.Policy, container_name: str | None = None) -> list[dict]:
+        """
+        policy 의 규칙과 충돌하는 기존 규칙을 반환합니다.
+        container_name 이 주어지면 policy.container_name 대신 해당 컨테이너의 규칙과 비교합니다.
+        """
+        container_name = container_name or policy.container_name
+        index = self._containers.get(container_name)
+        if index is None:
+            return []
+
+        conflicts = []
+        for rule in policy.lsm_policies.file:
+            conflicts += self._conflicts(container_name, "file", rule, index.file.overlapping(path_key(rule.path)))
+        for rule in policy.lsm_policies.network:
+            trie = index.network.get((rule.protocol, rule.port))
+            if trie is not None:
+                conflicts += self._conflicts(container_name, "network", rule, trie.overlapping(ip_key(rule.ip)))
+        for rule in policy.lsm_policies.process:
+            conflicts += self._conflicts(container_name, "process", rule, index.process.get(rule.comm, []))
+        return conflicts
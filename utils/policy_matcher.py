@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+from schema import policy_schema
+from utils.policy_index import PrefixTrie, ip_key, path_key
+
+# 이벤트 종류별 필수 필드
+EVENT_FIELDS = {
+    "file": ("path",),
+    "network": ("ip", "port", "protocol"),
+    "process": ("comm",),
+    "tracepoint": ("tracepoint",)
+}
+
+
+def _applies(rule: policy_schema.LSMPolicy, event: policy_schema.PolicyEvent) -> bool:
+    # uid, flags 가 비어 있는 규칙은 모든 uid, 모든 동작에 적용
+    if rule.uid and event.uid is not None and event.uid not in rule.uid:
+        return False
+    if rule.flags and event.flag is not None and event.flag not in rule.flags:
+        return False
+    return True
+
+
+class PolicyMatcher:
+    """
+    한 컨테이너에 적용된 정책을 이벤트 평가용으로 컴파일한 결과입니다.
+
+    - file: 경로 구성 요소 trie. 이벤트 경로와 같거나 상위 경로인 규칙 중 가장 깊은 규칙
+    - network: (protocol, port) 별 IP prefix 비트 trie. 이벤트 IP 를 포함하는 규칙 중 가장 긴 prefix 의 규칙
+    - process: comm 해시 테이블
+    - tracepoint: tracepoint 해시 테이블
+    uid 나 flag 가 주어진 이벤트는 해당 uid, flag 가 포함된 규칙(또는 uid, flags 가 비어 있는 규칙)만 일치합니다.
+    LSM 규칙과 일치하면 block, tracepoint 와 일치하면 trace, 일치하는 규칙이 없으면 allow 입니다.
+    """
+    def __init__(self, container_policies: list[policy_schema.ContainerPolicy]):
+        self._file = PrefixTrie()
+        self._network: dict[tuple[int, int], PrefixTrie] = defaultdict(PrefixTrie)
+        self._process: dict[str, list] = defaultdict(list)
+        self._tracepoint: dict[str, list] = defaultdict(list)
+
+        for container_policy in container_policies:
+            policy = container_policy.policy
+            name = container_policy.name
+            for rule in policy.lsm_policies.file:
+                self._file.insert(path_key(rule.path), (name, rule))
+            for rule in policy.lsm_policies.network:
+                self._network[(rule.protocol, rule.port)].insert(ip_key(rule.ip), (name, rule))
+            for rule in policy.lsm_policies.process:
+                self._process[rule.comm].append((name, rule))
+            for tracepoint in policy.tracepoint_policy.tracepoints:
+                self._tracepoint[tracepoint].append(name)
+
+    def _candidates(self, event: policy_schema.PolicyEvent) -> list:
+        if event.type == "file":
+            # 가장 구체적인 규칙을 먼저 확인
+            return self._file.prefixes(path_key(event.path))[::-1]
+        if event.type == "network":
+            trie = self._network.get((event.protocol, event.port))
+            return trie.prefixes(ip_key(event.ip))[::-1] if trie is not None else []
+        return self._process.get(event.comm, [])
+
+    def evaluate(self, event: policy_schema.PolicyEvent) -> dict:
+        if event.type == "tracepoint":
+            names = self._tracepoint.get(event.tracepoint)
+            if names:
+                return {"decision": "trace", "policy_name": names[0], "rule": event.tracepoint}
+            return {"decision": "allow", "policy_name": None, "rule": None}
+
+        for policy_name, rule in self._candidates(event):
+            if _applies(rule, event):
+                return {"decision": "block", "policy_name": policy_name, "rule": rule}
+        return {"decision": "allow", "policy_name": None, "rule": None}
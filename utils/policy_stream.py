@@ -0,0 +1,159 @@
+import re
+from textwrap import dedent
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, BinaryIO, Iterator
+
+from pydantic import ValidationError
+from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
+
+from schema import policy_schema
+
+# 임시 파일을 한 번에 읽는 크기
+READ_SIZE = 64 * 1024
+# 업로드를 메모리에 보관하는 최대 크기. 넘으면 디스크에 저장
+SPOOL_MAX_SIZE = 1024 * 1024
+
+_CONTAINERS_KEY = re.compile(r"^containers\s*:\s*(#.*)?$")
+
+
+class PolicyYamlSplitter:
+    """
+    정책 yaml 을 줄 단위로 읽으면서 containers 목록의 항목을 하나씩 잘라냅니다.
+
+    containers 는 블록 형식의 목록이어야 하며, 각 항목은 dedent 된 yaml 문자열로 반환합니다.
+    containers 밖의 최상위 줄(api_version, name 등)은 header_lines 에 모읍니다.
+    """
+    def __init__(self):
+        self.header_lines: list[str] = []
+        self._partial = b""
+        self._in_containers = False
+        self._item_indent: int | None = None
+        self._item: list[str] | None = None
+        self._index = 0
+
+    def _finish_item(self, items: list):
+        if self._item is not None:
+            items.append((self._index, dedent("".join(self._item))))
+            self._index += 1
+            self._item = None
+
+    def _line(self, line: str, items: list):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            if self._item is not None:
+                self._item.append(line)
+            return
+
+        indent = len(line) - len(line.lstrip(" "))
+        is_item = stripped == "-" or stripped.startswith("- ")
+
+        if not self._in_containers:
+            if indent == 0 and _CONTAINERS_KEY.match(stripped):
+                self._in_containers = True
+                self._item_indent = None
+            else:
+                self.header_lines.append(line)
+            return
+
+        if self._item_indent is None and is_item:
+            self._item_indent = indent
+
+        if self._item_indent is not None and indent == self._item_indent and is_item:
+            self._finish_item(items)
+            # "- " 를 공백으로 바꾸면 항목이 하나의 매핑이 됨
+            self._item = [line[:indent] + " " + line[indent + 1:]]
+        elif self._item_indent is not None and indent > self._item_indent:
+            self._item.append(line)
+        elif indent == 0:
+            # containers 가 끝나고 다음 최상위 키
+            self._finish_item(items)
+            self._in_containers = False
+            self.header_lines.append(line)
+        else:
+            raise ValueError(f"unsupported containers format: {stripped[:50]}")
+
+    def feed(self, chunk: bytes) -> list[tuple[int, str]]:
+        """읽은 데이터를 추가하고, 완성된 containers 항목 (순번, yaml) 목록을 반환합니다."""
+        items = []
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line.decode() + "\n", items)
+        return items
+
+    def close(self) -> list[tuple[int, str]]:
+        items = []
+        if self._partial:
+            self._line(self._partial.decode() + "\n", items)
+            self._partial = b""
+        self._finish_item(items)
+        return items
+
+    def header(self) -> dict:
+        header = YAML(typ="safe").load("".join(self.header_lines))
+        return header if isinstance(header, dict) else {}
+
+
+async def spool_policy_upload(chunks: AsyncIterator[bytes]) -> tuple[SpooledTemporaryFile, dict]:
+    """
+    업로드되는 정책 yaml 을 임시 파일(SPOOL_MAX_SIZE 를 넘으면 디스크)에 저장하면서 containers 를 제외한 최상위 필드를 읽습니다.
+    name 이 containers 뒤에 올 수 있으므로 정책을 만들기 전에 한 번 끝까지 읽습니다.
+
+    Returns:
+        tuple: (처음 위치로 되돌린 임시 파일, 최상위 필드)
+    """
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    splitter = PolicyYamlSplitter()
+    try:
+        async for chunk in chunks:
+            spool.write(chunk)
+            # containers 항목은 파싱하지 않고 버림
+            splitter.feed(chunk)
+        splitter.close()
+        header = splitter.header()
+    except Exception:
+        spool.close()
+        raise
+    
+    spool.seek(0)
+    return spool, header
+
+
+def _parse_item(index: int, text: str) -> tuple[policy_schema.Policy | None, list[str]]:
+    try:
+        return policy_schema.Policy.model_validate(YAML(typ="safe").load(text)), []
+    except YAMLError as e:
+        return None, [f"containers[{index}]: {e}"]
+    except ValidationError as e:
+        return None, [
+            f"containers[{index}].{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in e.errors()
+        ]
+
+
+def iter_policy_batches(file: BinaryIO, batch_size: int) -> Iterator[tuple[int, list[tuple[int, policy_schema.Policy]], list[str]]]:
+    """
+    정책 yaml 의 containers 항목을 읽는 대로 파싱하여 batch_size 개씩 반환합니다.
+
+    Yields:
+        tuple: (읽은 항목 수, [(순번, 컨테이너 정책)], 파싱에 실패한 항목의 오류 목록)
+    """
+    splitter = PolicyYamlSplitter()
+    read, batch, errors = 0, [], []
+    done = False
+    while not done:
+        chunk = file.read(READ_SIZE)
+        done = not chunk
+        for index, text in splitter.feed(chunk) if chunk else splitter.close():
+            policy, item_errors = _parse_item(index, text)
+            read += 1
+            if policy is None:
+                errors += item_errors
+            else:
+                batch.append((index, policy))
+            if read >= batch_size:
+                yield read, batch, errors
+                read, batch, errors = 0, [], []
+    if read:
+        yield read, batch, errors
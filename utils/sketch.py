@@ -0,0 +1,136 @@
+import math
+
+
+class QuantileSketch:
+    """
+    병합 가능한 분위수 스케치입니다. (DDSketch 방식의 로그 버킷)
+
+    값을 gamma = (1 + a) / (1 - a) 의 로그 구간으로 나누어 개수만 저장하므로,
+    어떤 분위수든 상대 오차 a 이내로 계산되고 두 스케치는 버킷 개수를 더하는 것만으로 병합됩니다.
+    """
+    RELATIVE_ACCURACY = 0.01
+    MIN_VALUE = 1e-9
+
+    _gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    _log_gamma = math.log(_gamma)
+
+    def __init__(self):
+        self.positive: dict[int, int] = {}
+        self.negative: dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        if value > self.MIN_VALUE:
+            index = self._index(value)
+            self.positive[index] = self.positive.get(index, 0) + count
+        elif value < -self.MIN_VALUE:
+            index = self._index(-value)
+            self.negative[index] = self.negative.get(index, 0) + count
+        else:
+            self.zero += count
+        self.count += count
+
+    def merge(self, other: "QuantileSketch"):
+        for index, count in other.positive.items():
+            self.positive[index] = self.positive.get(index, 0) + count
+        for index, count in other.negative.items():
+            self.negative[index] = self.negative.get(index, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+
+    def quantile(self, q: float) -> float | None:
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.positive))
+
+    def to_dict(self) -> dict:
+        return {
+            "p": {str(index): count for index, count in self.positive.items()},
+            "n": {str(index): count for index, count in self.negative.items()},
+            "z": self.zero
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls()
+        sketch.positive = {int(index): count for index, count in data.get("p", {}).items()}
+        sketch.negative = {int(index): count for index, count in data.get("n", {}).items()}
+        sketch.zero = data.get("z", 0)
+        sketch.count = sum(sketch.positive.values()) + sum(sketch.negative.values()) + sketch.zero
+        return sketch
+
+
+class MetricAggregate:
+    """
+    count, sum, min, max 와 분위수 스케치를 함께 보관하는 병합 가능한 집계값입니다.
+    """
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other: "MetricAggregate"):
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def mean(self) -> float | None:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> float | None:
+        # 스케치의 근사값이 실제 범위를 벗어나지 않도록 보정
+        value = self.sketch.quantile(q)
+        if value is None:
+            return None
+        return min(max(value, self.min), self.max)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "sketch": self.sketch.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MetricAggregate":
+        aggregate = cls()
+        aggregate.count = data["count"]
+        aggregate.sum = data["sum"]
+        aggregate.min = data["min"]
+        aggregate.max = data["max"]
+        aggregate.sketch = QuantileSketch.from_dict(data["sketch"])
+        return aggregate
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import queue
+import select
+import threading
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import Engine, text
+
+from utils.broadcaster import Broadcaster
+
+logger = logging.getLogger(__name__)
+
+# 이벤트 id 를 발급하는 시퀀스 (models.StreamEvent.id)
+EVENT_ID_SEQUENCE = '"streamEvent_id_seq"'
+
+# 여러 메시지를 순서대로 한 번에 NOTIFY (nextval 과 pg_notify 는 unnest 순서대로 평가됨)
+_NOTIFY_MANY = text(
+    f"SELECT pg_notify(:channel, '{{\"i\":' || nextval('{EVENT_ID_SEQUENCE}') || ',' || message) "
+    f"FROM unnest(CAST(:messages AS text[])) WITH ORDINALITY AS event(message, n) ORDER BY n"
+)
+_NOTIFY_REF = text(
+    f'WITH event AS ('
+    f'INSERT INTO "StreamEvent" (id, name, key, payload) '
+    f"VALUES (nextval('{EVENT_ID_SEQUENCE}'), :name, :key, CAST(:payload AS json)) RETURNING id"
+    f") SELECT pg_notify(:channel, '{{\"i\":' || event.id || ',' || :message) FROM event"
+)
+_DELETE_EXPIRED = text(
+    'DELETE FROM "StreamEvent" WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => :retention_s)'
+)
+
+
+class PgNotifyFanout:
+    """
+    PostgreSQL LISTEN/NOTIFY 로 모든 워커의 Broadcaster 에 이벤트를 전달합니다.
+
+    publish 는 {"i": id, "n": name, "k": key, "p": payload} 형태의 메시지를 NOTIFY 합니다.
+    메시지가 max_bytes 보다 크면 payload 를 StreamEvent 테이블에 저장하고 "p" 대신 "r" 만 보냅니다.
+    각 워커는 별도 스레드의 전용 연결로 LISTEN 하며, 받은 이벤트를 같은 id 로 broadcaster.deliver 에 전달합니다.
+
+    publish 는 이벤트를 큐에 넣기만 하며, 전송 스레드가 최대 batch_size 개씩 하나의 트랜잭션으로 NOTIFY 합니다.
+    큐가 가득 차거나 전송에 실패한 이벤트는 버리고 stats 에 집계합니다. (스트림 전달 실패가 heartbeat 수신에 영향을 주지 않음)
+    """
+    def __init__(self, engine: Engine, dsn: str, broadcaster: Broadcaster, channel: str, max_bytes: int,
+                 queue_size: int = 10000, batch_size: int = 500):
+        self._engine = engine
+        self._dsn = dsn
+        self._broadcaster = broadcaster
+        self._channel = channel
+        self._max_bytes = max_bytes
+        self._batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._publisher: threading.Thread | None = None
+        self._stats = {"published": 0, "dropped": 0, "failed": 0}
+
+    def publish(self, name: str, key: str, payload: dict) -> bool:
+        """이벤트를 전송 큐에 넣습니다. 큐가 가득 차면 이벤트를 버리고 False 를 반환합니다."""
+        try:
+            self._queue.put_nowait((name, key, payload))
+            return True
+        except queue.Full:
+            self._stats["dropped"] += 1
+            return False
+
+    def _notify(self, events: list[tuple[str, str, dict]]):
+        with self._engine.begin() as conn:
+            messages = []
+            def flush_messages():
+                if messages:
+                    conn.execute(_NOTIFY_MANY, {"channel": self._channel, "messages": list(messages)})
+                    messages.clear()
+
+            for name, key, payload in events:
+                # id 는 DB 에서 붙이므로 나머지 부분만 미리 직렬화
+                head = json.dumps({"n": name, "k": key}, separators=(",", ":"))[1:-1]
+                body = json.dumps(payload, separators=(",", ":"))
+                message = f'{head},"p":{body}}}'
+
+                # 앞에 붙는 {"i":<id>, 의 여유분 32 byte
+                if len(message.encode()) + 32 <= self._max_bytes:
+                    messages.append(message)
+                    continue
+
+                # 순서를 유지하기 위해 앞의 메시지를 먼저 보냄
+                flush_messages()
+                conn.execute(_NOTIFY_REF, {
+                    "channel": self._channel,
+                    "message": f'"r":1,{head}}}',
+                    "name": name,
+                    "key": key,
+                    "payload": body
+                })
+            flush_messages()
+
+    def _take(self, timeout: float) -> list:
+        try:
+            events = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(events) < self._batch_size:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _publish_loop(self):
+        # 종료 요청 후에도 큐에 남은 이벤트는 모두 보냄
+        while not self._stopping.is_set() or not self._queue.empty():
+            events = self._take(0.5)
+            if not events:
+                continue
+            try:
+                self._notify(events)
+                self._stats["published"] += len(events)
+            except Exception:
+                self._stats["failed"] += len(events)
+                logger.exception("Failed to publish %d stream events", len(events))
+
+    def stats(self) -> dict:
+        return {**self._stats, "publish_queue_depth": self._queue.qsize()}
+
+    def delete_expired(self, retention_s: int):
+        with self._engine.begin() as conn:
+            conn.execute(_DELETE_EXPIRED, {"retention_s": retention_s})
+
+    def _deliver(self, conn, notifies: list):
+        messages = [json.loads(notify.payload) for notify in notifies]
+
+        # 테이블에 저장된 payload 는 한 번에 조회
+        refs = [message["i"] for message in messages if "r" in message]
+        payloads = {}
+        if refs:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT id, payload FROM "StreamEvent" WHERE id = ANY(%s)', (refs,))
+                payloads = dict(cursor.fetchall())
+
+        for message in messages:
+            payload = payloads.get(message["i"]) if "r" in message else message["p"]
+            if payload is None:
+                # 보관 기간이 지나 삭제된 이벤트
+                continue
+            self._broadcaster.deliver(message["i"], message["n"], message["k"], payload)
+
+    def _listen(self):
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self._dsn)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self._channel}"')
+
+                while not self._stopping.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    notifies = list(conn.notifies)
+                    conn.notifies.clear()
+                    if notifies:
+                        self._deliver(conn, notifies)
+            except Exception:
+                logger.exception("Stream listener failed, reconnecting")
+                self._stopping.wait(1.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    async def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._listen, name="stream-listener", daemon=True)
+        self._thread.start()
+        self._publisher = threading.Thread(target=self._publish_loop, name="stream-publisher", daemon=True)
+        self._publisher.start()
+
+    async def stop(self):
+        if self._thread is None:
+            return
+
+        self._stopping.set()
+        await asyncio.to_thread(self._publisher.join, 5)
+        await asyncio.to_thread(self._thread.join, 5)
+        self._thread = None
+        self._publisher = None
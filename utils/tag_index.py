@@ -0,0 +1,267 @@
+import re
+import threading
+from typing import Iterable
+
+# 태그 이름은 공백과 괄호가 없는 문자열, 공백이나 키워드가 포함된 이름은 큰따옴표로 감쌈
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_KEYWORDS = {"AND", "OR", "NOT"}
+
+
+def _from_positions(positions: Iterable[int], size: int) -> int:
+    """bit 위치 목록으로 bitset 을 만듭니다. 위치마다 큰 정수를 새로 만들지 않도록 bytearray 에서 변환합니다."""
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_bits(bits: int, offset: int = 0, limit: int | None = None) -> list[int]:
+    """bitset 에서 켜진 bit 의 위치를 작은 값부터 offset 개 건너뛰고 limit 개 반환합니다."""
+    positions = []
+    if bits <= 0:
+        return positions
+
+    # 가장 낮은 bit 가 문자열의 앞에 오도록 뒤집어서 찾음 (bitset 의 길이는 색인된 컨테이너 수)
+    digits = bin(bits)[:1:-1]
+    position = digits.find("1")
+    while position != -1 and (limit is None or len(positions) < limit):
+        if offset:
+            offset -= 1
+        else:
+            positions.append(position)
+        position = digits.find("1", position + 1)
+    return positions
+
+
+def _tokenize(expression: str) -> list[tuple[str, str]]:
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if match is None:
+            raise ValueError(f"invalid tag expression at {position}: {expression[position:position + 20]}")
+        position = match.end()
+
+        lparen, rparen, quoted, word = match.groups()
+        if lparen:
+            tokens.append(("(", lparen))
+        elif rparen:
+            tokens.append((")", rparen))
+        elif quoted is not None:
+            tokens.append(("tag", re.sub(r"\\(.)", r"\1", quoted)))
+        elif word.upper() in _KEYWORDS:
+            tokens.append((word.upper(), word))
+        else:
+            tokens.append(("tag", word))
+    return tokens
+
+
+class _Parser:
+    """
+    태그 식을 (연산자, 피연산자...) 튜플로 변환합니다.
+
+        expr  := term (OR term)*
+        term  := factor (AND factor)*
+        factor:= NOT factor | "(" expr ")" | 태그
+    """
+    def __init__(self, expression: str):
+        self._tokens = _tokenize(expression)
+        self._position = 0
+
+    def _peek(self) -> str | None:
+        return self._tokens[self._position][0] if self._position < len(self._tokens) else None
+
+    def _take(self, kind: str) -> str:
+        if self._peek() != kind:
+            found = self._tokens[self._position][1] if self._position < len(self._tokens) else "end of expression"
+            raise ValueError(f"expected {kind} but found {found}")
+        value = self._tokens[self._position][1]
+        self._position += 1
+        return value
+
+    def parse(self) -> tuple:
+        if not self._tokens:
+            raise ValueError("empty tag expression")
+        node = self._expr()
+        if self._peek() is not None:
+            raise ValueError(f"unexpected {self._tokens[self._position][1]}")
+        return node
+
+    def _expr(self) -> tuple:
+        node = self._term()
+        while self._peek() == "OR":
+            self._take("OR")
+            node = ("OR", node, self._term())
+        return node
+
+    def _term(self) -> tuple:
+        node = self._factor()
+        while self._peek() == "AND":
+            self._take("AND")
+            node = ("AND", node, self._factor())
+        return node
+
+    def _factor(self) -> tuple:
+        kind = self._peek()
+        if kind == "NOT":
+            self._take("NOT")
+            return ("NOT", self._factor())
+        if kind == "(":
+            self._take("(")
+            node = self._expr()
+            self._take(")")
+            return node
+        return ("tag", self._take("tag"))
+
+
+def parse_tag_expression(expression: str) -> tuple:
+    """
+    "prod AND (web OR api) AND NOT canary" 형식의 태그 식을 파싱합니다.
+    우선순위는 NOT > AND > OR 이며, 키워드는 대소문자를 구분하지 않습니다.
+
+        Raises:
+            ValueError: 잘못된 식
+    """
+    try:
+        return _Parser(expression).parse()
+    except RecursionError:
+        raise ValueError("tag expression is nested too deeply")
+
+
+class TagIndex:
+    """
+    태그 -> 컨테이너 bitset 역색인입니다.
+
+    컨테이너 id 는 계속 커지므로 id 를 그대로 bit 위치로 쓰지 않고, 색인된 컨테이너마다 0 부터 차례로 위치를 붙입니다.
+    bitset 은 컨테이너 위치 번째 bit 가 켜진 파이썬 정수로, 크기는 색인된 컨테이너 수에 비례하며
+    AND/OR/NOT 을 정수 비트 연산으로 처리합니다.
+    NOT 의 기준이 되는 전체 집합은 색인을 만들 때 조회한 컨테이너와 이후 추가된 컨테이너입니다.
+
+    위치는 rebuild 때 id 순으로 붙이며, 이후 추가된 컨테이너는 뒤에 붙입니다.
+    기존 최대 id 보다 작은 id 가 추가되면 다음 rebuild 전까지는 결과를 id 순으로 다시 정렬합니다.
+
+    태그 변경 API 는 commit 후 set_tags/add_tags 로 색인을 바로 갱신하며, 다른 워커의 변경이나
+    다른 경로로 추가된 컨테이너는 주기적인 rebuild 로 반영됩니다.
+    rebuild 가 DB 를 조회하는 동안 들어온 갱신은 새 색인에 다시 적용합니다.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tags: dict[str, int] = {}
+        self._all = 0
+        # 컨테이너 id -> bit 위치, bit 위치 -> 컨테이너 id
+        self._positions: dict[int, int] = {}
+        self._ids: list[int] = []
+        # 위치 순서가 id 순서와 같은지 여부
+        self._ordered = True
+        # rebuild 중에 들어온 갱신 (rebuild 중이 아니면 None)
+        self._pending: list[tuple] | None = None
+        self.ready = False
+
+    def begin_rebuild(self):
+        with self._lock:
+            self._pending = []
+
+    def finish_rebuild(self, container_ids: Iterable[int], pairs: Iterable[tuple[str, int]]):
+        """
+        begin_rebuild 이후 조회한 전체 컨테이너 id 와 (태그 이름, 컨테이너 id) 쌍으로 색인을 다시 만듭니다.
+        """
+        ids = sorted(set(container_ids))
+        positions = {container_id: position for position, container_id in enumerate(ids)}
+        members: dict[str, list[int]] = {}
+        for name, container_id in pairs:
+            position = positions.get(container_id)
+            if position is not None:
+                members.setdefault(name, []).append(position)
+        tags = {name: _from_positions(tag_positions, len(ids)) for name, tag_positions in members.items()}
+
+        with self._lock:
+            pending, self._pending = self._pending or [], None
+            self._tags, self._positions, self._ids, self._ordered = tags, positions, ids, True
+            self._all = (1 << len(ids)) - 1
+            for operation, *args in pending:
+                operation(self, *args)
+            self.ready = True
+
+    def abort_rebuild(self):
+        with self._lock:
+            self._pending = None
+
+    def _apply(self, operation, *args):
+        with self._lock:
+            operation(self, *args)
+            if self._pending is not None:
+                self._pending.append((operation, *args))
+
+    def _bits(self, container_ids: Iterable[int]) -> int:
+        """컨테이너들의 bitset 을 반환합니다. 처음 보는 컨테이너는 위치를 새로 붙입니다."""
+        bits = 0
+        for container_id in container_ids:
+            position = self._positions.get(container_id)
+            if position is None:
+                if self._ids and container_id < self._ids[-1]:
+                    self._ordered = False
+                position = self._positions[container_id] = len(self._ids)
+                self._ids.append(container_id)
+                self._all |= 1 << position
+            bits |= 1 << position
+        return bits
+
+    def _add_containers(self, container_ids: list[int]):
+        self._bits(container_ids)
+
+    def _add_tags(self, container_ids: list[int], tags: list[str]):
+        bits = self._bits(container_ids)
+        for name in tags:
+            self._tags[name] = self._tags.get(name, 0) | bits
+
+    def _set_tags(self, container_ids: list[int], tags: list[str]):
+        bits = self._bits(container_ids)
+        for name in list(self._tags):
+            remaining = self._tags[name] & ~bits
+            if remaining:
+                self._tags[name] = remaining
+            else:
+                del self._tags[name]
+        self._add_tags(container_ids, tags)
+
+    def add_containers(self, container_ids: list[int]):
+        self._apply(TagIndex._add_containers, container_ids)
+
+    def add_tags(self, container_ids: list[int], tags: list[str]):
+        """컨테이너들에 태그를 추가합니다."""
+        self._apply(TagIndex._add_tags, container_ids, tags)
+
+    def set_tags(self, container_ids: list[int], tags: list[str]):
+        """컨테이너들의 태그를 tags 로 바꿉니다."""
+        self._apply(TagIndex._set_tags, container_ids, tags)
+
+    def _evaluate(self, node: tuple) -> int:
+        operator = node[0]
+        if operator == "tag":
+            return self._tags.get(node[1], 0)
+        if operator == "NOT":
+            return self._all & ~self._evaluate(node[1])
+        if operator == "AND":
+            return self._evaluate(node[1]) & self._evaluate(node[2])
+        return self._evaluate(node[1]) | self._evaluate(node[2])
+
+    def query(self, expression: tuple, offset: int = 0, limit: int | None = None) -> tuple[int, list[int]]:
+        """
+        파싱한 태그 식에 맞는 컨테이너를 찾습니다.
+
+            Returns:
+                tuple: (전체 컨테이너 수, id 순으로 offset 개 건너뛴 최대 limit 개의 컨테이너 id)
+        """
+        with self._lock:
+            bits = self._evaluate(expression)
+            if self._ordered:
+                container_ids = [self._ids[position] for position in iter_bits(bits, offset, limit)]
+            else:
+                container_ids = sorted(self._ids[position] for position in iter_bits(bits))
+                container_ids = container_ids[offset:None if limit is None else offset + limit]
+            return bits.bit_count(), container_ids
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ready": self.ready, "tags": len(self._tags), "containers": len(self._ids)}